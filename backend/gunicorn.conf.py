@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for the vibrafit API.
+
+Threaded workers let one process overlap requests that wait on PostgreSQL.
+Each thread keeps its own persistent connection (or borrows from the pool
+when DB_CONN_POOL=1), so WEB_CONCURRENCY * GUNICORN_THREADS is the most
+connections a deployment opens. Every value can be overridden from the
+environment.
+
+GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker serves the ASGI
+application instead, for the async dashboard views. Django then runs the
+sync DRF views on one thread per worker, so only pick it for a deployment
+that mostly serves /api/dashboard/.
+"""
+import os
+
+bind                = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers             = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class        = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads             = int(os.environ.get('GUNICORN_THREADS', 4))
+wsgi_app            = 'vibrafit_app.asgi:application' if 'uvicorn' in worker_class else 'vibrafit_app.wsgi:application'
+timeout             = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive           = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+# Recycle workers now and then to bound memory growth.
+max_requests        = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+accesslog           = '-'
@@ -0,0 +1,229 @@
+"""
+Adherence of clients to their plans, kept in ``AdherenceStats``.
+
+A day's completion is the sum of its ``DailyLog.completion_percentage``
+over the number of plans that day, so a planned day with no log counts as
+0. Days with neither a plan nor a log are rest days. They are left out of
+the means and don't break streaks. A day keeps a streak going when its
+completion reaches ``ADHERENCE['STREAK_MIN_COMPLETION']``. Today never
+breaks one, because there is still time to log it.
+
+``AdherenceStats.days`` holds the completion of every tracked day within the
+last ``WINDOW_DAYS``. The 7/30/90-day means are taken from it when read, so
+they roll over at midnight without a write and need no query. The current
+run and the longest streak ever are kept beside it.
+
+A write recomputes only the days it touches, with two indexed aggregates.
+The streak is extended or restarted in place when the change lands after
+the current run. Anything that rewrites history, such as an edit or a
+late log before the run's end, rebuilds the stats from the grouped history
+of the user. Both paths take a batch of users in a fixed number of queries.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import AdherenceStats, DailyLog, Plan
+
+WINDOW_DAYS = 90
+
+MEAN_WINDOWS = (7, 30, 90)
+
+STATS_FIELDS = ('days', 'streak_start', 'streak_end', 'streak_length', 'longest_streak', 'updated_at')
+
+
+def _qualifies(completion):
+    return completion is not None and completion >= settings.ADHERENCE['STREAK_MIN_COMPLETION']
+
+
+def _outcome(entry):
+    """True or False for a tracked day meeting the streak threshold or not, None for a rest day."""
+    return None if entry is None else _qualifies(entry[0])
+
+
+def completion_by_day(user_ids, **dates):
+    """
+    ``{user_id: {date: (completion, logs)}}`` of the tracked days of
+    ``user_ids``, optionally narrowed by ``date`` lookups.
+    """
+    logged = (
+        DailyLog.objects.filter(user_id__in=user_ids, **dates)
+        .values('user_id', 'date')
+        .annotate(total=Sum('completion_percentage'), logs=Count('id'))
+        .order_by()
+    )
+    planned = (
+        Plan.objects.filter(user_id__in=user_ids, **dates)
+        .values('user_id', 'date')
+        .annotate(plans=Count('id'))
+        .values_list('user_id', 'date', 'plans')
+        .order_by()
+    )
+    plans = {(user_id, day): count for user_id, day, count in planned}
+    days = defaultdict(dict)
+    for user_id, day in plans:
+        days[user_id][day] = (0.0, 0)
+    for row in logged:
+        expected = max(plans.get((row['user_id'], row['date']), 0), row['logs'])
+        days[row['user_id']][row['date']] = (row['total'] / expected, row['logs'])
+    return days
+
+
+def _window_start(today):
+    return today - timedelta(days=WINDOW_DAYS - 1)
+
+
+def _ring(days, today):
+    start = _window_start(today)
+    return {day.isoformat(): [completion, logs] for day, (completion, logs) in sorted(days.items()) if day >= start}
+
+
+def rebuild_many(user_ids, today=None):
+    """Recompute the stats of ``user_ids`` from their whole history, with one upsert."""
+    today = today or timezone.localdate()
+    now = timezone.now()
+    history = completion_by_day(user_ids)
+    stats = []
+    for user_id in user_ids:
+        days = history.get(user_id, {})
+        start = end = None
+        length = longest = 0
+        for day in sorted(day for day in days if day <= today):
+            if _qualifies(days[day][0]):
+                start = start if length else day
+                end, length = day, length + 1
+                longest = max(longest, length)
+            elif day < today:
+                start = end = None
+                length = 0
+        stats.append(AdherenceStats(user_id=user_id, days=_ring(days, today), streak_start=start, streak_end=end,
+                                    streak_length=length, longest_streak=longest, updated_at=now))
+    AdherenceStats.objects.bulk_create(stats, update_conflicts=True, unique_fields=['user'],
+                                       update_fields=STATS_FIELDS)
+    return stats
+
+
+def rebuild(user_id, today=None):
+    return rebuild_many([user_id], today)[0]
+
+
+def get_or_build(user_id):
+    stats = AdherenceStats.objects.filter(user_id=user_id).first()
+    if stats is not None:
+        return stats
+    # Reads inside a transaction stay on the primary, which a lagging replica
+    # may not have caught up with. Users from before AdherenceStats existed
+    # are backfilled by `manage.py rebuild_adherence` instead.
+    with transaction.atomic():
+        return rebuild(user_id)
+
+
+def _apply(stats, days, changed, today):
+    """
+    Fold the recomputed ``changed`` days into ``stats`` in place. Returns False
+    when the change reaches back into history and needs a rebuild instead.
+    """
+    ring = {date.fromisoformat(day): tuple(value) for day, value in stats.days.items()}
+    previous = {day: _outcome(ring.get(day)) for day in days}
+    for day in days:
+        if day in changed:
+            ring[day] = changed[day]
+        else:
+            ring.pop(day, None)
+
+    window_start = _window_start(today)
+    for day in days:
+        if day > today:
+            continue
+        was, now = previous[day], _outcome(ring.get(day))
+        end = stats.streak_end
+        settled_after = any(day < other < today or (other == today and _qualifies(ring[other][0])) for other in ring)
+        at_tail = (end is None or window_start <= end < day) and not settled_after
+        if not at_tail or (was is not None and day < today):
+            # A settled day changed: runs after it may split or merge.
+            if was != now:
+                return False
+        elif now:
+            broken = end is None or any(end < other < day and _outcome(ring[other]) is False for other in ring)
+            stats.streak_start = day if broken else stats.streak_start
+            stats.streak_length = 1 if broken else stats.streak_length + 1
+            stats.streak_end = day
+            stats.longest_streak = max(stats.longest_streak, stats.streak_length)
+        elif now is False and day < today:
+            stats.streak_start = stats.streak_end = None
+            stats.streak_length = 0
+
+    stats.days = _ring(ring, today)
+    return True
+
+
+def refresh_many(dates_by_user, create=True):
+    """
+    Fold changes to the plans and logs of each user on the given dates
+    into their stats. Without ``create``, users with no stats yet are left
+    alone. Deletions pass it so a cascading user delete doesn't recreate a row.
+    """
+    today = timezone.localdate()
+    to_date = DailyLog._meta.get_field('date').to_python
+    dates_by_user = {user_id: sorted({to_date(day) for day in days}) for user_id, days in dates_by_user.items() if days}
+    existing = {stats.user_id: stats for stats in AdherenceStats.objects.filter(user_id__in=list(dates_by_user))}
+
+    stale, incremental = [], {}
+    for user_id, days in dates_by_user.items():
+        if user_id not in existing:
+            if create:
+                stale.append(user_id)
+        elif days[0] < _window_start(today):
+            # The previous value of days outside the ring is unknown.
+            stale.append(user_id)
+        else:
+            incremental[user_id] = days
+
+    updated = []
+    if incremental:
+        changed = completion_by_day(list(incremental), date__in={day for days in incremental.values() for day in days})
+        for user_id, days in incremental.items():
+            if _apply(existing[user_id], days, changed.get(user_id, {}), today):
+                existing[user_id].updated_at = timezone.now()
+                updated.append(existing[user_id])
+            else:
+                stale.append(user_id)
+    if updated:
+        AdherenceStats.objects.bulk_update(updated, STATS_FIELDS)
+    if stale:
+        rebuild_many(stale, today)
+
+
+def refresh(user_id, dates, create=True):
+    refresh_many({user_id: dates}, create)
+
+
+def current_streak(stats, today):
+    """The current run, unless a settled day after it fell short or it left the ring."""
+    end = stats.streak_end
+    if end is None or end < _window_start(today):
+        return 0
+    for day, (completion, _) in stats.days.items():
+        if end < date.fromisoformat(day) < today and not _qualifies(completion):
+            return 0
+    return stats.streak_length
+
+
+def summary(stats, today=None):
+    """Means over the last 7/30/90 days and streaks of ``stats``, as of ``today``."""
+    today = today or timezone.localdate()
+    days = [(date.fromisoformat(day), completion, logs) for day, (completion, logs) in stats.days.items()]
+    result = {}
+    for window in MEAN_WINDOWS:
+        start = today - timedelta(days=window - 1)
+        # Today counts once something is logged for it.
+        values = [completion for day, completion, logs in days if start <= day < today or (day == today and logs)]
+        result[f'mean_{window}'] = round(sum(values) / len(values), 2) if values else None
+    result['current_streak'] = current_streak(stats, today)
+    result['longest_streak'] = stats.longest_streak
+    result['updated_at'] = stats.updated_at
+    return result
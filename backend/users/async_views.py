@@ -0,0 +1,121 @@
+"""
+Async (ASGI) read path for the dashboard screens.
+
+These are plain Django async views rather than DRF viewsets, which are
+sync-only: under an ASGI server they await the database through the async
+ORM instead of holding a worker thread for the whole request. Responses
+match the corresponding DRF endpoints.
+"""
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException
+
+from .authentication import CachedJWTAuthentication
+from .models import Goal, MetricRollup, Plan, Subscription
+from .permissions import acan_view_user_data
+from .replicas import replica_reads
+from .rollups import bucket_start
+from .serializers import GoalSerializer, MetricRollupSerializer, MetricSeriesQuerySerializer, PlanSerializer
+
+
+def _error(detail, status):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def jwt_required(view):
+    """Authenticate the bearer token and set ``request.user``, or answer 401."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            result = await CachedJWTAuthentication().aauthenticate(request)
+        except APIException as exc:
+            return _error(exc.detail, exc.status_code)
+        if result is None:
+            return _error("Authentication credentials were not provided.", 401)
+        request.user, request.auth = result
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def _target_user_id(request):
+    """The ``?user=`` the caller asks about (default: themselves), if they may see it."""
+    raw = request.GET.get('user')
+    if raw is None:
+        return request.user.pk
+    try:
+        user_id = int(raw)
+    except ValueError:
+        return None
+    return user_id if await acan_view_user_data(request.user, user_id) else None
+
+
+@require_GET
+@jwt_required
+@replica_reads
+async def metric_series(request):
+    """GET /api/dashboard/metrics/series/ — async twin of /api/metrics/series/."""
+    query = MetricSeriesQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return JsonResponse(query.errors, status=400)
+    params = query.validated_data
+
+    user_id = params.get('user', request.user.pk)
+    if not await acan_view_user_data(request.user, user_id):
+        return _error("You cannot view this user's metrics.", 403)
+
+    buckets = MetricRollup.objects.filter(user_id=user_id, type=params['type'], bucket=params['bucket'])
+    if 'from' in params:
+        buckets = buckets.filter(bucket_start__gte=bucket_start(params['from'], params['bucket']))
+    if 'to' in params:
+        buckets = buckets.filter(bucket_start__lte=params['to'])
+    rows = [bucket async for bucket in buckets.order_by('bucket_start').aiterator()]
+    return JsonResponse({
+        'type':    params['type'],
+        'bucket':  params['bucket'],
+        'results': MetricRollupSerializer(rows, many=True).data,
+    })
+
+
+@require_GET
+@jwt_required
+@replica_reads
+async def todays_plan(request):
+    """GET /api/dashboard/plans/today/?user= — the newest plan dated today."""
+    user_id = await _target_user_id(request)
+    if user_id is None:
+        return _error("You cannot view this user's plans.", 403)
+    plan = await Plan.objects.filter(user_id=user_id, date=timezone.localdate()).order_by('-id').afirst()
+    if plan is None:
+        return _error("No plan for today.", 404)
+    return JsonResponse(PlanSerializer(plan).data)
+
+
+@require_GET
+@jwt_required
+@replica_reads
+async def goal_list(request):
+    """
+    GET /api/dashboard/goals/?limit= — newest goals visible to the caller,
+    scoped like GoalViewSet, with the total count.
+    """
+    user = request.user
+    if user.role == 'client':
+        goals = Goal.objects.filter(user=user)
+    elif user.role == 'trainer':
+        client_ids = Subscription.objects.filter(trainer=user, status='active').values('client')
+        goals = Goal.objects.filter(user__in=client_ids)
+    else:
+        goals = Goal.objects.none()
+
+    try:
+        limit = min(int(request.GET.get('limit', settings.REST_FRAMEWORK['PAGE_SIZE'])), settings.API_MAX_PAGE_SIZE)
+    except ValueError:
+        return _error("limit must be an integer.", 400)
+
+    count = await goals.acount()
+    rows = [goal async for goal in goals.order_by('-created_at', '-id')[:max(limit, 0)].aiterator()]
+    return JsonResponse({'count': count, 'results': GoalSerializer(rows, many=True).data})
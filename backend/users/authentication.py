@@ -0,0 +1,183 @@
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.db import router
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+# Everything the permission classes read from ``request.user``. Other fields
+# stay deferred and are loaded from the database only if a view touches them.
+SNAPSHOT_FIELDS = ('id', 'role', 'is_active', 'is_staff')
+
+
+class UserSnapshotCache:
+    """
+    Thread-safe in-process LRU of user snapshots with a TTL, optionally
+    backed by a shared Django cache so other workers can reuse a lookup.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, cache_alias=None):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self.shared  = caches[cache_alias] if cache_alias else None
+        self._local  = OrderedDict()
+        self._lock   = threading.Lock()
+
+    @staticmethod
+    def _key(user_id):
+        return f'jwt-user:{user_id}'
+
+    def get(self, user_id):
+        values = self._recall(user_id)
+        if values is None and self.shared is not None:
+            values = self.shared.get(self._key(user_id))
+            if values is not None:
+                values = tuple(values)
+                self._remember(user_id, values)
+        return values
+
+    async def aget(self, user_id):
+        values = self._recall(user_id)
+        if values is None and self.shared is not None:
+            values = await self.shared.aget(self._key(user_id))
+            if values is not None:
+                values = tuple(values)
+                self._remember(user_id, values)
+        return values
+
+    def set(self, user_id, values):
+        self._remember(user_id, values)
+        if self.shared is not None:
+            self.shared.set(self._key(user_id), values, self.ttl)
+
+    async def aset(self, user_id, values):
+        self._remember(user_id, values)
+        if self.shared is not None:
+            await self.shared.aset(self._key(user_id), values, self.ttl)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._local.pop(user_id, None)
+        if self.shared is not None:
+            self.shared.delete(self._key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _recall(self, user_id):
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None:
+                return None
+            expires_at, values = entry
+            if expires_at <= time.monotonic():
+                del self._local[user_id]
+                return None
+            self._local.move_to_end(user_id)
+            return values
+
+    def _remember(self, user_id, values):
+        with self._lock:
+            self._local[user_id] = (time.monotonic() + self.ttl, values)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+
+_snapshot_cache = None
+
+
+def get_snapshot_cache():
+    global _snapshot_cache
+    if _snapshot_cache is None:
+        config = settings.JWT_USER_CACHE
+        _snapshot_cache = UserSnapshotCache(
+            maxsize=config['MAXSIZE'],
+            ttl=config['TTL'],
+            cache_alias=config.get('CACHE_ALIAS'),
+        )
+    return _snapshot_cache
+
+
+@receiver(setting_changed)
+def reset_snapshot_cache(setting, **kwargs):
+    global _snapshot_cache
+    if setting == 'JWT_USER_CACHE':
+        _snapshot_cache = None
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    ``JWTAuthentication`` that builds ``request.user`` from a cached
+    snapshot instead of loading the full ``User`` row on every request.
+
+    The snapshot is evicted whenever the user is saved or deleted (see
+    ``users.signals``); other workers' in-process copies expire after
+    ``JWT_USER_CACHE['TTL']`` seconds.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares against the password hash; not cached.
+            return super().get_user(validated_token)
+
+        user_id = self._user_id(validated_token)
+        cache = get_snapshot_cache()
+        values = cache.get(user_id)
+        if values is None:
+            values = self._snapshot_query(user_id).first()
+            if values is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(user_id, values)
+        return self._build_user(values)
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for async views, using the async ORM on a cache miss."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return await sync_to_async(super().get_user)(validated_token)
+
+        user_id = self._user_id(validated_token)
+        cache = get_snapshot_cache()
+        values = await cache.aget(user_id)
+        if values is None:
+            values = await self._snapshot_query(user_id).afirst()
+            if values is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            await cache.aset(user_id, values)
+        return self._build_user(values)
+
+    def _user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def _snapshot_query(self, user_id):
+        return User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values_list(*SNAPSHOT_FIELDS)
+
+    def _build_user(self, values):
+        user = User.from_db(router.db_for_read(User), SNAPSHOT_FIELDS, values)
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
@@ -0,0 +1,291 @@
+"""
+Reproducible API benchmark.
+
+``seed`` writes a synthetic dataset at a configurable scale with bulk
+inserts, ``run`` drives every scenario in ``SCENARIOS`` in-process through
+the full middleware/DRF stack and records latency, throughput and query
+counts, and ``compare`` checks a run against a saved baseline. The
+``benchmark`` management command wires these together.
+"""
+import statistics
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import adherence, jobs, rollups
+from .models import DailyLog, Goal, Metric, Plan, Subscription, TrainerProfile, TrainerReview, User
+from .search import search_vector
+
+BENCH_DOMAIN   = 'bench.vibrafit.local'
+BENCH_PASSWORD = 'bench-password'
+METRIC_TYPES   = ('weight', 'hr')
+SPECIALTIES    = ('strength training', 'yoga', 'marathon running', 'weight loss', 'mobility')
+PLAN_DAYS      = 14
+
+# ``path``/``data`` are callables of (ctx, i), ``i`` being the iteration
+# number, so write scenarios can keep their natural keys unique.
+Scenario = namedtuple('Scenario', 'name method url_name actor path data', defaults=(None,))
+
+
+def _url(url_name, *args, query=''):
+    def path(ctx, i):
+        return reverse(url_name, args=[ctx[a] for a in args]) + query
+    return path
+
+
+SCENARIOS = (
+    Scenario('users.list',              'get',    'user-list',               'admin',   _url('user-list')),
+    Scenario('users.retrieve',          'get',    'user-detail',             'client',  _url('user-detail', 'client')),
+    Scenario('users.export',            'get',    'user-export',             'client',
+             _url('user-export', 'client', query='?format=ndjson')),
+    Scenario('users.adherence',         'get',    'user-adherence',          'trainer', _url('user-adherence', 'client')),
+    Scenario('users.register',          'post',   'user-register',           None,      _url('user-register'),
+             lambda ctx, i: {'email': f'bench-new-{ctx["run"]}-{i}@{BENCH_DOMAIN}', 'password': BENCH_PASSWORD,
+                             'role': 'client'}),
+    Scenario('users.onboard',           'post',   'user-onboard',            'client',  _url('user-onboard', 'client'),
+             lambda ctx, i: {'name': 'Bench Client', 'country': 'NG', 'state': 'Lagos'}),
+    Scenario('users.profile_picture',   'patch',  'user-upload-profile-picture', 'client',
+             _url('user-upload-profile-picture'), lambda ctx, i: {'profilePictureUrl': f'https://cdn.example/{i}.png'}),
+    Scenario('subscriptions.list',      'get',    'subscription-list',       'trainer', _url('subscription-list')),
+    Scenario('subscriptions.retrieve',  'get',    'subscription-detail',     'client',
+             _url('subscription-detail', 'subscription')),
+    Scenario('goals.list',              'get',    'goal-list',               'trainer', _url('goal-list')),
+    Scenario('goals.retrieve',          'get',    'goal-detail',             'client',  _url('goal-detail', 'goal')),
+    Scenario('goals.create',            'post',   'goal-list',               'client',  _url('goal-list'),
+             lambda ctx, i: {'user': ctx['client'], 'description': 'Bench goal', 'target_value': '75kg',
+                             'target_date': str(ctx['today'] + timedelta(days=90)), 'status': 'active'}),
+    Scenario('plans.list',              'get',    'plan-list',               'trainer', _url('plan-list')),
+    Scenario('plans.retrieve',          'get',    'plan-detail',             'trainer', _url('plan-detail', 'plan')),
+    Scenario('plans.create',            'post',   'plan-list',               'trainer', _url('plan-list'),
+             lambda ctx, i: {'user': ctx['client'], 'date': str(ctx['today'] + timedelta(days=1 + i)),
+                             'nutrition_plan': 'Bench meals', 'exercise_plan': 'Bench workout'}),
+    Scenario('plans.batch',             'post',   'plan-batch',              'trainer', _url('plan-batch'),
+             lambda ctx, i: {'template': {'nutrition_plan': 'Bench meals', 'exercise_plan': 'Bench workout'},
+                             'users': ctx['roster'], 'start_date': str(ctx['today'] + timedelta(days=7 * (i + 1))),
+                             'end_date': str(ctx['today'] + timedelta(days=7 * (i + 1) + 6))}),
+    Scenario('daily_logs.list',         'get',    'dailylog-list',           'client',  _url('dailylog-list')),
+    Scenario('daily_logs.retrieve',     'get',    'dailylog-detail',         'client',
+             _url('dailylog-detail', 'dailylog')),
+    Scenario('daily_logs.bulk',         'post',   'dailylog-bulk',           'client',  _url('dailylog-bulk'),
+             lambda ctx, i: [{'plan': ctx['plan'], 'date': str(ctx['today']), 'actual_nutrition': 'ate',
+                              'actual_exercise': 'ran', 'completion_percentage': i % 100}]),
+    Scenario('metrics.list',            'get',    'metric-list',             'client',  _url('metric-list')),
+    Scenario('metrics.retrieve',        'get',    'metric-detail',           'client',  _url('metric-detail', 'metric')),
+    Scenario('metrics.create',          'post',   'metric-list',             'client',  _url('metric-list'),
+             lambda ctx, i: {'user': ctx['client'], 'type': 'weight', 'value': 80.0,
+                             'recorded_at': (ctx['now'] + timedelta(days=1, seconds=i)).isoformat()}),
+    Scenario('metrics.bulk',            'post',   'metric-bulk',             'client',  _url('metric-bulk'),
+             lambda ctx, i: [{'type': 'hr', 'value': 60 + j, 'recorded_at': (ctx['now'] + timedelta(minutes=i, seconds=j)).isoformat()}
+                             for j in range(50)]),
+    Scenario('metrics.latest',          'get',    'metric-latest',           'client',  _url('metric-latest')),
+    Scenario('metrics.rollups_rebuild', 'post',   'metric-rebuild-rollups',  'client',  _url('metric-rebuild-rollups'),
+             lambda ctx, i: {'types': ['weight']}),
+    Scenario('jobs.retrieve',           'get',    'job-detail',              'client',  _url('job-detail', 'job')),
+    Scenario('metrics.series',          'get',    'metric-series',           'client',
+             _url('metric-series', query='?type=weight&bucket=week')),
+    Scenario('trainers.search',         'get',    'trainer-search',          'client',
+             _url('trainer-search', query='?q=strength')),
+    Scenario('trainers.roster',         'get',    'trainer-roster',          'trainer', _url('trainer-roster')),
+    Scenario('reviews.list',            'get',    'trainerreview-list',      'client',  _url('trainerreview-list')),
+    Scenario('reviews.retrieve',        'get',    'trainerreview-detail',    'client',
+             _url('trainerreview-detail', 'review')),
+    Scenario('me.today',                'get',    'me-today',                'client',  _url('me-today')),
+    Scenario('dashboard.metric_series', 'get',    'dashboard-metric-series', 'client',
+             _url('dashboard-metric-series', query='?type=weight&bucket=day')),
+    Scenario('dashboard.todays_plan',   'get',    'dashboard-todays-plan',   'client',  _url('dashboard-todays-plan')),
+    Scenario('dashboard.goals',         'get',    'dashboard-goals',         'client',  _url('dashboard-goals')),
+    Scenario('auth.login',              'post',   'token_obtain_pair',       None,      _url('token_obtain_pair'),
+             lambda ctx, i: {'email': ctx['client_email'], 'password': BENCH_PASSWORD}),
+    Scenario('auth.refresh',            'post',   'token_refresh',           None,      _url('token_refresh'),
+             lambda ctx, i: {'refresh': ctx['refresh']}),
+)
+
+
+def seed(trainers=10, clients=100, metrics=200):
+    """
+    Create ``trainers`` trainers, ``clients`` clients spread over them with an
+    active subscription each, and per client ``metrics`` metrics, a fortnight
+    of plans and daily logs, goals and a review of their trainer.
+
+    Returns the context the scenarios resolve their ids and tokens from.
+    """
+    now = timezone.now().replace(microsecond=0)
+    today = timezone.localdate()
+    password = make_password(BENCH_PASSWORD)
+
+    def users(role, count):
+        return User.objects.bulk_create([
+            User(email=f'bench-{role}-{n}@{BENCH_DOMAIN}', role=role, password=password, name=f'Bench {role} {n}',
+                 country='NG', is_onboarded=True, is_staff=role == 'admin')
+            for n in range(count)
+        ])
+
+    admin, = users('admin', 1)
+    coaches = users('trainer', trainers)
+    members = users('client', clients)
+    TrainerProfile.objects.bulk_create([
+        TrainerProfile(user=coach, bio='Certified coach', certifications='NASM',
+                       specialties=f'{SPECIALTIES[n % len(SPECIALTIES)]}, {SPECIALTIES[(n + 2) % len(SPECIALTIES)]}')
+        for n, coach in enumerate(coaches)
+    ])
+    coach_of = {member.pk: coaches[n % trainers] for n, member in enumerate(members)}
+
+    Subscription.objects.bulk_create([
+        Subscription(client=member, trainer=coach_of[member.pk], status='active',
+                     start_date=today - timedelta(days=30), end_date=today + timedelta(days=335))
+        for member in members
+    ])
+    Goal.objects.bulk_create([
+        Goal(user=member, description=f'Goal {n}', target_value='75kg', status='active',
+             target_date=today + timedelta(days=30 * (n + 1)))
+        for member in members for n in range(3)
+    ])
+    plans = Plan.objects.bulk_create([
+        Plan(user=member, trainer=coach_of[member.pk], date=today - timedelta(days=day),
+             nutrition_plan='Meals', exercise_plan='Workout')
+        for member in members for day in range(PLAN_DAYS)
+    ], batch_size=1000)
+    DailyLog.objects.bulk_create([
+        DailyLog(user_id=plan.user_id, plan=plan, date=plan.date, actual_nutrition='Ate',
+                 actual_exercise='Trained', completion_percentage=(plan.pk * 37) % 101)
+        for plan in plans
+    ], batch_size=1000)
+    Metric.objects.bulk_create([
+        Metric(user=member, type=METRIC_TYPES[n % len(METRIC_TYPES)], value=60 + (n * 7) % 40,
+               recorded_at=now - timedelta(hours=6 * n))
+        for member in members for n in range(metrics)
+    ], batch_size=1000)
+    rollups.rebuild()
+    for member in members:
+        adherence.rebuild(member.pk)
+
+    reviews = TrainerReview.objects.bulk_create([
+        TrainerReview(trainer=coach_of[member.pk], client=member, rating=1 + n % 5)
+        for n, member in enumerate(members)
+    ])
+    for coach in coaches:
+        ratings = [review.rating for review in reviews if review.trainer_id == coach.pk]
+        TrainerProfile.objects.filter(user=coach).update(
+            rating_sum=sum(ratings), rating_count=len(ratings), rating=sum(ratings) / len(ratings) if ratings else 0.0,
+        )
+    if connection.vendor == 'postgresql':
+        TrainerProfile.objects.update(search_vector=search_vector())
+
+    client = members[0]
+    refresh = RefreshToken.for_user(client)
+    return {
+        'run':          int(time.time()),
+        'now':          now,
+        'today':        today,
+        'admin':        admin.pk,
+        'trainer':      coach_of[client.pk].pk,
+        'client':       client.pk,
+        'client_email': client.email,
+        'roster':       [member.pk for member in members if coach_of[member.pk] == coach_of[client.pk]],
+        'subscription': Subscription.objects.filter(client=client).values_list('pk', flat=True).first(),
+        'goal':         Goal.objects.filter(user=client).values_list('pk', flat=True).first(),
+        'plan':         Plan.objects.filter(user=client, date=today).values_list('pk', flat=True).first(),
+        'dailylog':     DailyLog.objects.filter(user=client).values_list('pk', flat=True).first(),
+        'metric':       Metric.objects.filter(user=client).values_list('pk', flat=True).first(),
+        'review':       TrainerReview.objects.filter(client=client).values_list('pk', flat=True).first(),
+        'refresh':      str(refresh),
+        'job':          jobs.enqueue('rollups.rebuild', {'user_id': client.pk}, created_by=client).pk,
+        'tokens': {
+            role: str(RefreshToken.for_user(User.objects.get(pk=pk)).access_token)
+            for role, pk in (('admin', admin.pk), ('trainer', coach_of[client.pk].pk), ('client', client.pk))
+        },
+    }
+
+
+def _percentile(values, q):
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+def run(ctx, scenarios=SCENARIOS, iterations=20, warmup=2):
+    """
+    Run each scenario ``iterations`` times (after ``warmup``) and summarise
+    it. Credential throttling is lifted, as every request comes from one
+    address.
+    """
+    results = {}
+    with override_settings(THROTTLING={**settings.THROTTLING, 'RATES': {}}):
+        for scenario in scenarios:
+            client = APIClient()
+            if scenario.actor:
+                client.credentials(HTTP_AUTHORIZATION=f'Bearer {ctx["tokens"][scenario.actor]}')
+
+            def request(i):
+                data = scenario.data(ctx, i) if scenario.data else None
+                response = getattr(client, scenario.method)(scenario.path(ctx, i), data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                return response
+
+            for i in range(warmup):
+                request(i)
+
+            durations, queries, errors, statuses = [], [], 0, set()
+            started = time.perf_counter()
+            for i in range(warmup, warmup + iterations):
+                with CaptureQueriesContext(connection) as captured:
+                    t0 = time.perf_counter()
+                    response = request(i)
+                    durations.append(time.perf_counter() - t0)
+                queries.append(len(captured))
+                statuses.add(response.status_code)
+                errors += response.status_code >= 400
+            elapsed = time.perf_counter() - started
+
+            durations.sort()
+            results[scenario.name] = {
+                'method':       scenario.method.upper(),
+                'url_name':     scenario.url_name,
+                'iterations':   iterations,
+                'rps':          round(iterations / elapsed, 2),
+                'mean_ms':      round(statistics.fmean(durations) * 1000, 3),
+                'p50_ms':       round(_percentile(durations, 0.5) * 1000, 3),
+                'p95_ms':       round(_percentile(durations, 0.95) * 1000, 3),
+                'p99_ms':       round(_percentile(durations, 0.99) * 1000, 3),
+                'queries':      max(queries),
+                'queries_min':  min(queries),
+                'status_codes': sorted(statuses),
+                'errors':       errors,
+            }
+    return results
+
+
+def uncovered_routes(scenarios=SCENARIOS):
+    """Named routes of ``users.urls`` that no scenario exercises."""
+    from . import urls
+
+    names = {pattern.name for pattern in urls.router.urls if pattern.name}
+    names |= {pattern.name for pattern in urls.urlpatterns if getattr(pattern, 'name', None)}
+    names -= {'api-root', 'api-metrics'}
+    return sorted(names - {scenario.url_name for scenario in scenarios})
+
+
+def compare(results, baseline, tolerance=0.25, noise_ms=1.0):
+    """
+    Regressions of ``results`` against a previous run's ``results``: more
+    queries than before, or a p95 more than ``tolerance`` (and ``noise_ms``)
+    slower. Scenarios missing from either side are ignored.
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if current['queries'] > before['queries']:
+            regressions.append(f"{name}: {before['queries']} -> {current['queries']} queries")
+        if current['p95_ms'] > before['p95_ms'] * (1 + tolerance) and current['p95_ms'] - before['p95_ms'] > noise_ms:
+            regressions.append(f"{name}: p95 {before['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms")
+    return regressions
@@ -0,0 +1,76 @@
+"""
+Maintenance of ``ClientDailySnapshot`` rows (the ``GET /api/me/today/`` payload).
+
+A snapshot is built the first time a client's day is read. After that every
+write that affects it recomputes just the section it touches, with one query
+for that section and one UPDATE. Days nobody has opened have no row, so
+writes for them cost one indexed existence check.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import serializers
+from .models import ClientDailySnapshot, DailyLog, Goal, LatestMetric, Plan
+
+SECTIONS = ('plans', 'daily_logs', 'open_goals', 'latest_metrics')
+
+# Goal.status is free text; anything else counts as open.
+CLOSED_GOAL_STATUSES = ('done', 'completed', 'achieved', 'cancelled', 'abandoned')
+
+
+def _plans(user_id, day):
+    plans = Plan.objects.filter(user_id=user_id, date=day).order_by('-id')
+    return serializers.PlanSerializer(plans, many=True).data
+
+
+def _daily_logs(user_id, day):
+    logs = DailyLog.objects.filter(user_id=user_id, date=day).order_by('-id')
+    return serializers.DailyLogSerializer(logs, many=True).data
+
+
+def _open_goals(user_id, day):
+    goals = (
+        Goal.objects.filter(user_id=user_id)
+        .exclude(status__in=CLOSED_GOAL_STATUSES)
+        .order_by('target_date', 'id')
+    )
+    return serializers.GoalSerializer(goals, many=True).data
+
+
+def _latest_metrics(user_id, day):
+    latest = LatestMetric.objects.filter(user_id=user_id).order_by('type')
+    return {row.pop('type'): row for row in serializers.LatestMetricSerializer(latest, many=True).data}
+
+
+BUILDERS = {
+    'plans':          _plans,
+    'daily_logs':     _daily_logs,
+    'open_goals':     _open_goals,
+    'latest_metrics': _latest_metrics,
+}
+
+
+def build(user_id, day, sections=SECTIONS):
+    return {section: BUILDERS[section](user_id, day) for section in sections}
+
+
+def get_or_build(user_id, day=None):
+    """The snapshot of ``user_id`` for ``day`` (default today), built if missing."""
+    day = day or timezone.localdate()
+    snapshot = ClientDailySnapshot.objects.filter(user_id=user_id, date=day).first()
+    if snapshot is not None:
+        return snapshot
+    try:
+        with transaction.atomic():
+            return ClientDailySnapshot.objects.create(user_id=user_id, date=day, **build(user_id, day))
+    except IntegrityError:
+        # A concurrent first read built it.
+        return ClientDailySnapshot.objects.get(user_id=user_id, date=day)
+
+
+def refresh(user_id, sections=SECTIONS, day=None):
+    """Recompute ``sections`` of the snapshot of ``user_id`` for ``day``, if there is one."""
+    day = day or timezone.localdate()
+    snapshots = ClientDailySnapshot.objects.filter(user_id=user_id, date=day)
+    if snapshots.exists():
+        snapshots.update(updated_at=timezone.now(), **build(user_id, day, sections))
@@ -0,0 +1,81 @@
+"""
+Streaming export of a user's full history (metrics, daily logs, plans, goals).
+
+Rows are read with ``.values_list().iterator(chunk_size=...)``, which uses a
+server-side cursor on PostgreSQL, and encoded one at a time, so memory use
+doesn't depend on how much history the user has.
+"""
+import csv
+import heapq
+import itertools
+import operator
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from . import metric_archive
+from .models import DailyLog, Goal, Metric, Plan
+
+# (kind, model, columns, ordering) in export order.
+EXPORTS = (
+    ('metric',    Metric,   ('id', 'type', 'value', 'recorded_at'), ('recorded_at', 'id')),
+    ('daily_log', DailyLog, ('id', 'plan_id', 'date', 'actual_nutrition', 'actual_exercise',
+                             'completion_percentage', 'notes'), ('date', 'id')),
+    ('plan',      Plan,     ('id', 'trainer_id', 'date', 'nutrition_plan', 'exercise_plan',
+                             'created_at', 'updated_at'), ('date', 'id')),
+    ('goal',      Goal,     ('id', 'description', 'target_value', 'target_date', 'status',
+                             'created_at', 'updated_at'), ('created_at', 'id')),
+)
+
+# One CSV header covering every kind; cells a kind doesn't have stay empty.
+CSV_COLUMNS = ['kind'] + list(dict.fromkeys(column for _, _, columns, _ in EXPORTS for column in columns))
+
+
+def iter_history(user_id):
+    """Yield ``(kind, row_dict)`` for every exported row of ``user_id``."""
+    chunk_size = settings.EXPORT_CHUNK_SIZE
+    for kind, model, columns, ordering in EXPORTS:
+        rows = model.objects.filter(user_id=user_id).order_by(*ordering).values_list(*columns)
+        rows = (dict(zip(columns, row)) for row in rows.iterator(chunk_size=chunk_size))
+        if model is Metric:
+            rows = heapq.merge(rows, _archived_metrics(user_id), key=operator.itemgetter('recorded_at'))
+        for row in rows:
+            yield kind, row
+
+
+def _archived_metrics(user_id):
+    # Blocks come a (UTC) month at a time, one per type, so each month's
+    # points are put in time order before merging with the raw rows.
+    points = metric_archive.iter_points(user_id)
+    for _, month in itertools.groupby(points, key=lambda point: (point[2].year, point[2].month)):
+        for _, type, recorded_at, value, _ in sorted(month, key=operator.itemgetter(2)):
+            # Archived points have no id; they are exported with an empty one.
+            yield {'id': None, 'type': type, 'value': value, 'recorded_at': recorded_at}
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def stream_csv(user_id):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for kind, row in iter_history(user_id):
+        yield writer.writerow([kind] + [_cell(row.get(column)) for column in CSV_COLUMNS[1:]])
+
+
+def stream_ndjson(user_id):
+    encoder = DjangoJSONEncoder()
+    for kind, row in iter_history(user_id):
+        yield encoder.encode({'kind': kind, **row}) + '\n'
@@ -0,0 +1,43 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+
+class QueryParamFilterBackend(BaseFilterBackend):
+    """
+    Filters a list by the query string, validated by the view's
+    ``filter_serializer_class`` (a ``ListFilterSerializer``). Bad values are
+    answered with a 400 while the queryset is still unevaluated.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        serializer_class = getattr(view, 'filter_serializer_class', None)
+        if serializer_class is None:
+            return queryset
+        params = serializer_class(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return params.filter_queryset(queryset)
+
+
+class StrictOrderingFilter(OrderingFilter):
+    """
+    ``?ordering=`` restricted to the view's ``ordering_fields``. Unlike
+    ``OrderingFilter``, unknown fields are a 400 rather than silently
+    dropped, and ``id`` is appended as a tie-breaker so cursor pagination
+    stays stable.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        params = request.query_params.get(self.ordering_param)
+        if not params:
+            ordering = list(self.get_default_ordering(view) or ())
+        else:
+            ordering = [param.strip() for param in params.split(',') if param.strip()]
+            allowed = {field for field, _ in self.get_valid_fields(queryset, view, {'request': request})}
+            invalid = [term for term in ordering if term.lstrip('-') not in allowed]
+            if invalid or not ordering:
+                raise ValidationError({
+                    self.ordering_param: [f"Invalid ordering; choose from: {', '.join(sorted(allowed))}."],
+                })
+        if ordering and not any(term.lstrip('-') == 'id' for term in ordering):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return tuple(ordering)
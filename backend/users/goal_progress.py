@@ -0,0 +1,122 @@
+"""
+Progress of goals with a typed target (``metric_type``/``target_numeric``/``direction``).
+
+For each goal the ``metric_type`` series starts at its baseline: the last
+value recorded at or before the goal was created, else the first one after.
+From that series the engine derives:
+
+* ``progress``: share of the distance from baseline to target covered by
+  the latest value, 0-100.
+* ``trend_slope``: least-squares slope in units per day.
+* ``projected_date``: when the trend line reaches the target, if it is
+  heading that way.
+
+The regression only needs the sums n, Σx, Σy, Σx², Σxy (x in days since the
+goal was created). They are kept in ``Goal.progress_state``, so a new metric
+updates every goal on its series in O(1) without rereading the history.
+Edits, deletions and anything that can move the baseline rebuild the state
+in a single pass over the series, archived part included.
+"""
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from . import metric_archive
+from .models import Goal
+
+# Projections further out than this are reported as none.
+MAX_PROJECTION_DAYS = 3650
+
+RESULT_FIELDS = ('baseline_value', 'current_value', 'progress', 'trend_slope', 'projected_date', 'progress_state')
+
+
+def is_typed(goal):
+    return bool(goal.metric_type) and goal.target_numeric is not None and bool(goal.direction)
+
+
+def typed_goals(user_id, types):
+    return Goal.objects.filter(user_id=user_id, metric_type__in=types, target_numeric__isnull=False).exclude(direction='')
+
+
+def _days(goal, moment):
+    return (moment - goal.created_at).total_seconds() / 86400
+
+
+def _add(goal, state, recorded_at, value):
+    x = _days(goal, recorded_at)
+    state['n']   += 1
+    state['sx']  += x
+    state['sy']  += value
+    state['sxx'] += x * x
+    state['sxy'] += x * value
+    if state['current_at'] is None or recorded_at >= datetime.fromisoformat(state['current_at']):
+        state['current_at'] = recorded_at.isoformat()
+        goal.current_value = value
+
+
+def _derive(goal, state):
+    sign = -1 if goal.direction == 'decrease' else 1
+    span = (goal.target_numeric - goal.baseline_value) * sign
+    moved = (goal.current_value - goal.baseline_value) * sign
+    goal.progress = 100.0 if span <= 0 else min(max(moved / span * 100, 0.0), 100.0)
+
+    n = state['n']
+    denominator = n * state['sxx'] - state['sx'] ** 2
+    goal.trend_slope = (n * state['sxy'] - state['sx'] * state['sy']) / denominator if n >= 2 and denominator > 1e-9 else None
+
+    goal.projected_date = None
+    if goal.progress < 100 and goal.trend_slope and goal.trend_slope * sign > 0:
+        remaining = (goal.target_numeric - goal.current_value) / goal.trend_slope
+        if remaining <= MAX_PROJECTION_DAYS:
+            reached = datetime.fromisoformat(state['current_at']) + timedelta(days=remaining)
+            goal.projected_date = timezone.localtime(reached).date()
+
+
+def _save(goal):
+    now = timezone.now()
+    goal.progress_updated_at = goal.updated_at = now
+    # update() rather than save(): no signals, so no recursion from post_save.
+    Goal.objects.filter(pk=goal.pk).update(
+        progress_updated_at=now, updated_at=now, **{field: getattr(goal, field) for field in RESULT_FIELDS}
+    )
+
+
+def recompute(goal):
+    """Rebuild ``goal``'s progress from its full series."""
+    for field in RESULT_FIELDS:
+        setattr(goal, field, None)
+    if is_typed(goal):
+        state = None
+        for recorded_at, value in metric_archive.series(goal.user_id, goal.metric_type):
+            if state is None or recorded_at <= goal.created_at:
+                # Each value up to the goal's creation supersedes the one before as baseline.
+                goal.baseline_value = value
+                state = dict(n=0, sx=0.0, sy=0.0, sxx=0.0, sxy=0.0, current_at=None, baseline_at=recorded_at.isoformat())
+            _add(goal, state, recorded_at, value)
+        if state is not None:
+            _derive(goal, state)
+            goal.progress_state = state
+    _save(goal)
+
+
+def record_metric(metric):
+    """Fold a newly created ``metric`` into the goals tracking its series."""
+    for goal in typed_goals(metric.user_id, [metric.type]):
+        state = goal.progress_state
+        if state is None:
+            recompute(goal)
+            continue
+        baseline_at = datetime.fromisoformat(state['baseline_at'])
+        if metric.recorded_at < baseline_at or (baseline_at < metric.recorded_at <= goal.created_at):
+            # An earlier value, or a later pre-goal one: the baseline may move.
+            recompute(goal)
+        elif metric.recorded_at > baseline_at:
+            _add(goal, state, metric.recorded_at, metric.value)
+            _derive(goal, state)
+            _save(goal)
+
+
+def refresh(user_id, types):
+    """Rebuild the goals of ``user_id`` tracking any of ``types``."""
+    for goal in typed_goals(user_id, types):
+        recompute(goal)
@@ -0,0 +1,175 @@
+"""
+Opt-in per-request instrumentation.
+
+``RequestMetricsMiddleware`` times each request, counts and times its SQL
+through a connection ``execute_wrapper`` and reports the result in a
+``Server-Timing`` header. ``InstrumentedViewMixin`` labels the request with
+its viewset action and adds serializer time. Samples are kept per route in
+an in-process rolling window and exposed by ``MetricsView`` (``/api/_metrics``)
+in the Prometheus text format.
+
+Enable with ``API_METRICS_ENABLED=1``; without the middleware the mixin does
+nothing.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# (metric name, sample index, help text); samples are
+# (wall seconds, query count, SQL seconds, serializer seconds).
+SERIES = (
+    ('vibrafit_request_duration_seconds',    0, "Wall time per view action."),
+    ('vibrafit_sql_queries',                 1, "SQL queries per view action."),
+    ('vibrafit_sql_duration_seconds',        2, "Total SQL time per view action."),
+    ('vibrafit_serializer_duration_seconds', 3, "Serializer time per view action."),
+)
+
+
+class RouteStats:
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count   = 0
+        self.totals  = [0.0] * len(SERIES)
+
+    def add(self, sample):
+        self.samples.append(sample)
+        self.count += 1
+        for i, value in enumerate(sample):
+            self.totals[i] += value
+
+
+class MetricsRegistry:
+    """Rolling per-(route, method) samples; quantiles cover the last ``window`` requests."""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, method, sample):
+        with self._lock:
+            stats = self._routes.get((route, method))
+            if stats is None:
+                stats = self._routes[(route, method)] = RouteStats(settings.API_METRICS_WINDOW)
+            stats.add(sample)
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+    def render_prometheus(self):
+        with self._lock:
+            snapshot = {
+                key: (list(stats.samples), stats.count, list(stats.totals))
+                for key, stats in sorted(self._routes.items())
+            }
+
+        lines = []
+        for name, index, help_text in SERIES:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} summary')
+            for (route, method), (samples, count, totals) in snapshot.items():
+                labels = f'route="{route}",method="{method}"'
+                values = sorted(sample[index] for sample in samples)
+                for q in QUANTILES:
+                    lines.append(f'{name}{{{labels},quantile="{q}"}} {_quantile(values, q):.6g}')
+                lines.append(f'{name}_sum{{{labels}}} {totals[index]:.6g}')
+                lines.append(f'{name}_count{{{labels}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _quantile(values, q):
+    """Nearest-rank quantile of sorted ``values``."""
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+registry = MetricsRegistry()
+
+
+class RequestRecorder:
+    """Per-request accumulator; also the ``execute_wrapper`` that times SQL."""
+
+    def __init__(self):
+        self.route           = None
+        self.queries         = 0
+        self.sql_time        = 0.0
+        self.serializer_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+
+    def timed(self, func):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.serializer_time += time.perf_counter() - started
+        return wrapper
+
+
+def get_recorder(request):
+    """The recorder of a Django or DRF request, or None when metrics are off."""
+    return getattr(getattr(request, '_request', request), '_metrics', None)
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = request._metrics = RequestRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall = time.perf_counter() - started
+
+        route = recorder.route
+        if route is None:
+            match = getattr(request, 'resolver_match', None)
+            route = match.view_name if match else 'unmatched'
+        registry.record(route, request.method, (wall, recorder.queries, recorder.sql_time, recorder.serializer_time))
+
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={wall * 1000:.1f}',
+            f'db;dur={recorder.sql_time * 1000:.1f};desc="{recorder.queries} queries"',
+            f'serializer;dur={recorder.serializer_time * 1000:.1f}',
+        ])
+        return response
+
+
+class InstrumentedViewMixin:
+    """
+    Labels the request's metrics with ``<basename>.<action>`` and times the
+    serializers the view builds through ``get_serializer``.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        recorder = get_recorder(request)
+        if recorder is not None:
+            basename = getattr(self, 'basename', None) or type(self).__name__
+            recorder.route = f'{basename}.{getattr(self, "action", None) or request.method.lower()}'
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        recorder = get_recorder(self.request)
+        if recorder is not None:
+            # Instance attributes shadow the methods for this serializer only.
+            serializer.to_representation = recorder.timed(serializer.to_representation)
+            serializer.is_valid = recorder.timed(serializer.is_valid)
+        return serializer
@@ -0,0 +1,227 @@
+"""
+Background jobs.
+
+Functions registered with ``@task`` are queued with ``enqueue`` (or
+``func.delay(**kwargs)``) and run later by ``manage.py run_worker``, so
+requests can answer 202 instead of doing slow work inline. Payloads must be
+JSON-serializable keyword arguments.
+
+The queue is a pluggable broker (``settings.JOBS['BROKER']``):
+``DatabaseBroker`` stores jobs in the ``Job`` table and is safe for any
+number of workers; ``InMemoryBroker`` keeps them in process for tests.
+Failures are retried with exponential backoff up to ``max_attempts``.
+"""
+import itertools
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class Task:
+    def __init__(self, func, name, max_attempts=None, backoff=None):
+        self.func         = func
+        self.name         = name
+        self.max_attempts = max_attempts
+        self.backoff      = backoff
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, created_by=None, **payload):
+        return enqueue(self.name, payload, created_by=created_by)
+
+
+def task(name=None, max_attempts=None, backoff=None):
+    """Register a function as a background task under ``name`` (default: its dotted path)."""
+    def decorator(func):
+        registered = Task(func, name or f'{func.__module__}.{func.__name__}', max_attempts, backoff)
+        _registry[registered.name] = registered
+        return registered
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _registry[name]
+    except KeyError:
+        raise LookupError(f"No task registered as {name!r}.")
+
+
+def enqueue(name, payload=None, created_by=None, delay=0):
+    """Queue task ``name`` with keyword arguments ``payload``; returns the ``Job``."""
+    registered = get_task(name)
+    return get_broker().enqueue(
+        name,
+        payload or {},
+        max_attempts=registered.max_attempts or settings.JOBS['MAX_ATTEMPTS'],
+        run_at=timezone.now() + timedelta(seconds=delay),
+        created_by=created_by,
+    )
+
+
+def retry_delay(job):
+    backoff = get_task(job.name).backoff if job.name in _registry else None
+    return (backoff if backoff is not None else settings.JOBS['BACKOFF']) * 2 ** (job.attempts - 1)
+
+
+def run_job(broker, job):
+    """Execute a claimed ``job`` and record the outcome with ``broker``."""
+    try:
+        result = get_task(job.name)(**job.payload)
+    except Exception as exc:
+        logger.exception("Job %s failed (attempt %s of %s)", job, job.attempts, job.max_attempts)
+        broker.fail(job, ''.join(traceback.format_exception_only(exc)).strip())
+    else:
+        broker.succeed(job, result)
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+class DatabaseBroker:
+    """
+    Jobs live in the ``Job`` table. A job is claimed with a conditional
+    UPDATE (``status='queued'`` -> ``'running'``), so concurrent workers never
+    run the same job twice, on any database backend.
+    """
+
+    def enqueue(self, name, payload, max_attempts, run_at, created_by=None):
+        return Job.objects.create(
+            name=name, payload=payload, max_attempts=max_attempts, run_at=run_at, created_by=created_by,
+        )
+
+    def get(self, job_id):
+        return Job.objects.filter(pk=job_id).first()
+
+    def claim(self, worker):
+        now = timezone.now()
+        # Jobs whose worker died mid-run go back on the queue once the lease
+        # expires, unless they have used up their attempts: the job itself may
+        # be what kills the worker.
+        expired = Job.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=settings.JOBS['LEASE']))
+        expired.filter(attempts__gte=F('max_attempts')).update(
+            status='failed', locked_by='', finished_at=now, last_error="Lease expired.",
+        )
+        expired.update(status='queued', locked_by='')
+
+        due = Job.objects.filter(status='queued', run_at__lte=now).order_by('run_at', 'id')
+        for job_id in due.values_list('id', flat=True)[:10]:
+            claimed = Job.objects.filter(pk=job_id, status='queued').update(
+                status='running', locked_at=now, locked_by=worker, attempts=F('attempts') + 1,
+            )
+            if claimed:
+                return Job.objects.get(pk=job_id)
+        return None
+
+    def _finish(self, job, **fields):
+        # Only the worker still holding the lease records an outcome; a run
+        # that outlived it must not overwrite the run that took over.
+        finished = Job.objects.filter(pk=job.pk, locked_by=job.locked_by, status='running').update(**fields)
+        if finished:
+            for field, value in fields.items():
+                setattr(job, field, value)
+        else:
+            logger.warning("Job %s lost its lease to another run; dropping its outcome", job)
+
+    def succeed(self, job, result):
+        self._finish(job, status='succeeded', result=result, finished_at=timezone.now(), last_error='')
+
+    def fail(self, job, error):
+        if job.attempts < job.max_attempts:
+            self._finish(job, status='queued', run_at=timezone.now() + timedelta(seconds=retry_delay(job)),
+                         locked_by='', last_error=error)
+        else:
+            self._finish(job, status='failed', finished_at=timezone.now(), last_error=error)
+
+
+class InMemoryBroker:
+    """Process-local queue of unsaved ``Job`` instances, for tests and local runs."""
+
+    def __init__(self):
+        self.jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def enqueue(self, name, payload, max_attempts, run_at, created_by=None):
+        job = Job(
+            id=next(self._ids), name=name, payload=payload, max_attempts=max_attempts, run_at=run_at,
+            created_by=created_by, created_at=timezone.now(),
+        )
+        with self._lock:
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def claim(self, worker):
+        now = timezone.now()
+        with self._lock:
+            due = sorted(
+                (job for job in self.jobs.values() if job.status == 'queued' and job.run_at <= now),
+                key=lambda job: (job.run_at, job.id),
+            )
+            if not due:
+                return None
+            job = due[0]
+            job.status, job.locked_at, job.locked_by = 'running', now, worker
+            job.attempts += 1
+            return job
+
+    def succeed(self, job, result):
+        job.status, job.result, job.finished_at, job.last_error = 'succeeded', result, timezone.now(), ''
+
+    def fail(self, job, error):
+        job.last_error = error
+        if job.attempts < job.max_attempts:
+            job.status, job.run_at = 'queued', timezone.now() + timedelta(seconds=retry_delay(job))
+        else:
+            job.status, job.finished_at = 'failed', timezone.now()
+
+
+def run_pending(broker=None, worker=None, limit=None):
+    """Run due jobs until none is left (or ``limit`` ran); returns how many ran."""
+    broker = broker or get_broker()
+    worker = worker or worker_id()
+    ran = 0
+    while limit is None or ran < limit:
+        job = broker.claim(worker)
+        if job is None:
+            break
+        run_job(broker, job)
+        ran += 1
+    return ran
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.JOBS['BROKER'])()
+    return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    global _broker
+    if setting == 'JOBS':
+        _broker = None
@@ -0,0 +1,50 @@
+"""
+Incremental maintenance of ``LatestMetric`` rows.
+
+A written metric replaces the current value only when it is at least as new,
+with one conditional UPDATE. Deleting or moving the current latest metric
+looks up its successor in the (user, type, recorded_at) index. That read is
+bounded too, however long the history.
+"""
+from django.db import IntegrityError, transaction
+
+from . import metric_archive
+from .models import LatestMetric, Metric
+
+
+def record(metric):
+    """Make ``metric`` the latest of its type unless a newer one is stored."""
+    lookup = dict(user_id=metric.user_id, type=metric.type)
+    changes = dict(value=metric.value, recorded_at=metric.recorded_at)
+    newer_or_same = LatestMetric.objects.filter(recorded_at__lte=metric.recorded_at, **lookup)
+    if newer_or_same.update(**changes) or LatestMetric.objects.filter(**lookup).exists():
+        return
+    try:
+        with transaction.atomic():
+            LatestMetric.objects.create(**lookup, **changes)
+    except IntegrityError:
+        # Another writer created the row first; keep whichever is newer.
+        newer_or_same.update(**changes)
+
+
+def recompute(user_id, type):
+    """Reload the latest ``type`` metric of ``user_id`` from the raw table and the archive."""
+    newest = (
+        Metric.objects.filter(user_id=user_id, type=type)
+        .order_by('-recorded_at')
+        .values('value', 'recorded_at')
+        .first()
+    )
+    archived = metric_archive.newest(user_id, type)
+    if archived is not None and (newest is None or archived['recorded_at'] > newest['recorded_at']):
+        newest = archived
+    if newest is None:
+        LatestMetric.objects.filter(user_id=user_id, type=type).delete()
+    else:
+        LatestMetric.objects.update_or_create(user_id=user_id, type=type, defaults=newest)
+
+
+def forget(metric):
+    """Handle the deletion of ``metric``: only the current latest needs a successor."""
+    if LatestMetric.objects.filter(user_id=metric.user_id, type=metric.type, recorded_at=metric.recorded_at).exists():
+        recompute(metric.user_id, metric.type)
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users import metric_archive
+
+
+class Command(BaseCommand):
+    help = "Downsample raw metrics of months older than METRIC_ARCHIVE['AFTER_DAYS'] into archive blocks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            help="Archive months that ended this many days ago (default: METRIC_ARCHIVE['AFTER_DAYS']).")
+        parser.add_argument('--resolution', type=int,
+                            help="Seconds per archived point (default: METRIC_ARCHIVE['RESOLUTION']).")
+        parser.add_argument('--user', type=int, help="Only archive this user's metrics.")
+
+    def handle(self, *args, **options):
+        days = options['older_than_days']
+        before = timezone.now() - timedelta(days=settings.METRIC_ARCHIVE['AFTER_DAYS'] if days is None else days)
+        samples, blocks = metric_archive.archive(before, user_id=options['user'], resolution=options['resolution'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {samples} samples into {blocks} blocks."))
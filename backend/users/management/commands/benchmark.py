@@ -0,0 +1,95 @@
+import json
+import platform
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.utils import timezone
+
+from users import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic dataset into a throwaway database (created like the test database, so the "
+        "configured one is never touched) and measure latency, throughput and query counts of every "
+        "users API endpoint plus login/refresh. Runs offline against SQLite or a local PostgreSQL. "
+        "Write the results with --output and compare a run against a saved one with --baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trainers', type=int, default=10, help="Trainers to seed.")
+        parser.add_argument('--clients', type=int, default=100, help="Clients to seed, spread over the trainers.")
+        parser.add_argument('--metrics', type=int, default=200, help="Metrics per client.")
+        parser.add_argument('--iterations', type=int, default=20, help="Measured requests per endpoint.")
+        parser.add_argument('--warmup', type=int, default=2, help="Unmeasured requests per endpoint.")
+        parser.add_argument('--only', action='append', default=[], help="Run only scenarios with this name prefix (repeatable).")
+        parser.add_argument('--output', help="Write the results as JSON to this file.")
+        parser.add_argument('--baseline', help="JSON results of an earlier run to compare against.")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help="Allowed relative p95 slowdown against the baseline (default 0.25).",
+        )
+        parser.add_argument('--keepdb', action='store_true', help="Keep the benchmark database afterwards.")
+
+    def handle(self, *args, **options):
+        if options['trainers'] < 1 or options['clients'] < 1:
+            raise CommandError("--trainers and --clients must be at least 1.")
+        scenarios = [
+            scenario for scenario in benchmark.SCENARIOS
+            if not options['only'] or scenario.name.startswith(tuple(options['only']))
+        ]
+        if not scenarios:
+            raise CommandError("--only matched no scenario.")
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+
+        settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, 'testserver']
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb'])
+        try:
+            # Only ``default`` points at the throwaway database; replica aliases would still reach the real ones.
+            with override_settings(DATABASE_REPLICAS=[]):
+                self.stdout.write("Seeding...")
+                ctx = benchmark.seed(options['trainers'], options['clients'], options['metrics'])
+                results = benchmark.run(ctx, scenarios, options['iterations'], options['warmup'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'database':   connection.vendor,
+                'django':     django.get_version(),
+                'python':     platform.python_version(),
+                'scale':      {key: options[key] for key in ('trainers', 'clients', 'metrics')},
+                'iterations': options['iterations'],
+                'uncovered':  benchmark.uncovered_routes(),
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+
+        self.stdout.write(f"{'scenario':<26} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8} {'errors':>7}")
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<26} {result['rps']:>8.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+                f"{result['queries']:>8} {result['errors']:>7}"
+            )
+        if report['meta']['uncovered']:
+            self.stdout.write(self.style.WARNING(f"Routes without a scenario: {', '.join(report['meta']['uncovered'])}"))
+
+        if baseline is not None:
+            regressions = benchmark.compare(results, baseline, options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(line)
+                raise CommandError(f"{len(regressions)} regression(s) against the baseline.")
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,184 @@
+import statistics
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from wsgiref.simple_server import WSGIServer
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import Metric, User
+
+LOADTEST_EMAIL = 'loadtest@vibrafit.local'
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class PooledWSGIServer(WSGIServer):
+    """
+    WSGI server with a fixed pool of handler threads, like gunicorn's gthread
+    worker. Threads (and so their database connections) outlive requests,
+    which is what makes CONN_MAX_AGE observable; a thread-per-request server
+    would open a fresh connection every time regardless.
+    """
+    request_queue_size = 128
+
+    def __init__(self, address, threads):
+        super().__init__(address, QuietRequestHandler)
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests/sec of an API endpoint. By default an in-process threaded WSGI server is "
+        "started once per --conn-max-age value against the configured database (SQLite or "
+        "PostgreSQL), so persistent connections can be compared with connect-per-request. "
+        "--server asgi adds an in-process uvicorn server to compare the async dashboard views. "
+        "Use --url to load an already running server (gunicorn, uvicorn) instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/metrics/?page_size=50', help="Request path, including query string.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per run.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent client threads.")
+        parser.add_argument('--server-threads', type=int, default=4, help="Handler threads of the in-process server.")
+        parser.add_argument(
+            '--conn-max-age', type=int, nargs='+', default=[0, 600],
+            help="CONN_MAX_AGE values to compare with the in-process server.",
+        )
+        parser.add_argument(
+            '--server', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi'],
+            help="In-process servers to run.",
+        )
+        parser.add_argument('--asgi-path', help="Path to load on the ASGI server (default: --path).")
+        parser.add_argument('--url', action='append', default=[], help="Base URL of a running server (repeatable).")
+        parser.add_argument('--seed-metrics', type=int, default=200, help="Metrics to create for the load-test user.")
+
+    def handle(self, *args, **options):
+        # Reads stay on ``default``: the seeded rows may not have reached a
+        # replica yet, and CONN_MAX_AGE is only varied for ``default``.
+        with override_settings(DATABASE_REPLICAS=[]):
+            token = self.prepare_user(options['seed_metrics'])
+            runs = []
+            if options['url']:
+                for base_url in options['url']:
+                    runs.append((base_url, self.run(base_url.rstrip('/') + options['path'], token, options)))
+            else:
+                settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, '127.0.0.1']
+                for server in options['server']:
+                    for conn_max_age in options['conn_max_age']:
+                        result = self.run_in_process(server, conn_max_age, token, options)
+                        runs.append((f"{server} CONN_MAX_AGE={conn_max_age}", result))
+
+        self.stdout.write(f"{'target':<32} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+        for label, result in runs:
+            self.stdout.write(
+                f"{label:<32} {result['rps']:>9.1f} {result['p50']:>8.2f} {result['p95']:>8.2f} {result['errors']:>7}"
+            )
+
+    def prepare_user(self, seed_metrics):
+        user, _ = User.objects.get_or_create(email=LOADTEST_EMAIL, defaults={'role': 'client'})
+        missing = seed_metrics - Metric.objects.filter(user=user).count()
+        if missing > 0:
+            start = timezone.now() - timedelta(days=missing)
+            Metric.objects.bulk_create(
+                [Metric(user=user, type='weight', value=80 - i * 0.01, recorded_at=start + timedelta(days=i))
+                 for i in range(missing)],
+                ignore_conflicts=True,
+            )
+        return str(RefreshToken.for_user(user).access_token)
+
+    def run_in_process(self, server, conn_max_age, token, options):
+        # Connections are created lazily per thread from this dict, so the
+        # fresh handler threads of each server pick up the new value.
+        connections.settings['default']['CONN_MAX_AGE'] = conn_max_age
+        if server == 'asgi':
+            return self.run_asgi(token, options)
+        server = PooledWSGIServer(('127.0.0.1', 0), options['server_threads'])
+        server.set_app(get_wsgi_application())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            host, port = server.server_address
+            return self.run(f"http://{host}:{port}{options['path']}", token, options)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def run_asgi(self, token, options):
+        try:
+            import uvicorn
+        except ImportError:
+            raise CommandError("--server asgi needs uvicorn installed.")
+        from django.core.asgi import get_asgi_application
+
+        config = uvicorn.Config(get_asgi_application(), host='127.0.0.1', port=0, lifespan='off', log_level='warning')
+        server = uvicorn.Server(config)
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            if not thread.is_alive():
+                raise CommandError("uvicorn failed to start.")
+            time.sleep(0.01)
+        try:
+            port = server.servers[0].sockets[0].getsockname()[1]
+            return self.run(f"http://127.0.0.1:{port}{options['asgi_path'] or options['path']}", token, options)
+        finally:
+            server.should_exit = True
+            thread.join()
+
+    def run(self, url, token, options):
+        headers = {'Authorization': f'Bearer {token}'}
+
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as resp:
+                    resp.read()
+                    ok = resp.status < 400
+            except Exception:
+                ok = False
+            return time.perf_counter() - started, ok
+
+        fetch(None)  # warm-up: imports, URL resolver, first connection
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            samples = list(pool.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(duration for duration, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        if errors == len(samples):
+            raise CommandError(f"Every request to {url} failed.")
+        return {
+            'rps':    len(samples) / elapsed,
+            'p50':    statistics.median(latencies) * 1000,
+            'p95':    latencies[int(len(latencies) * 0.95) - 1] * 1000,
+            'errors': errors,
+        }
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from users import partitions
+
+
+class Command(BaseCommand):
+    help = "Create upcoming Metric/DailyLog partitions and detach expired ones (PostgreSQL only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead', type=int,
+            help="Months to create partitions for beyond this one (default: PARTITIONS['MONTHS_AHEAD']).",
+        )
+        parser.add_argument('--skip-retention', action='store_true', help="Only create partitions.")
+        parser.add_argument('--drop', action='store_true', help="Drop expired partitions instead of detaching them.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write("Tables are only partitioned on PostgreSQL; nothing to do.")
+            return
+
+        months_ahead = options['months_ahead']
+        created = partitions.ensure_partitions(
+            settings.PARTITIONS['MONTHS_AHEAD'] if months_ahead is None else months_ahead,
+        )
+        for name in created:
+            self.stdout.write(f"Created {name}.")
+
+        if not options['skip_retention']:
+            removed = partitions.apply_retention(settings.PARTITIONS['RETENTION_MONTHS'], drop=options['drop'])
+            for name in removed:
+                self.stdout.write(f"{'Dropped' if options['drop'] else 'Detached'} {name}.")
+
+        self.stdout.write(self.style.SUCCESS("Partitions up to date."))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from users import adherence
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Build AdherenceStats for the clients that have none, such as those from before adherence "
+        "was tracked. --all rebuilds every client's from their plans and daily logs."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild the stats of this user id.")
+        parser.add_argument('--all', action='store_true', help="Rebuild clients that already have stats too.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Users rebuilt per round of queries.")
+
+    def handle(self, *args, **options):
+        if options['user'] is not None:
+            users = User.objects.filter(pk=options['user'])
+        else:
+            users = User.objects.filter(role='client')
+            if not options['all']:
+                users = users.filter(adherence__isnull=True)
+        user_ids = list(users.order_by('pk').values_list('pk', flat=True))
+        batch_size = options['batch_size']
+        for start in range(0, len(user_ids), batch_size):
+            adherence.rebuild_many(user_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Adherence stats rebuilt for {len(user_ids)} user(s)."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from users import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute MetricRollup rows from the raw Metric table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild rollups for this user id.")
+        parser.add_argument('--type', action='append', dest='types', help="Only rebuild this metric type (repeatable).")
+
+    def handle(self, *args, **options):
+        rollups.rebuild(user_id=options['user'], types=options['types'])
+        self.stdout.write(self.style.SUCCESS("Metric rollups rebuilt."))
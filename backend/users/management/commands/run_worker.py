@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users import jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (users.jobs) until interrupted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due instead of polling.")
+        parser.add_argument('--max-jobs', type=int, help="Exit after running this many jobs.")
+        parser.add_argument(
+            '--poll-interval', type=float,
+            help="Seconds to sleep when the queue is empty (default: JOBS['POLL_INTERVAL']).",
+        )
+
+    def handle(self, *args, **options):
+        broker = jobs.get_broker()
+        worker = jobs.worker_id()
+        poll_interval = options['poll_interval'] or settings.JOBS['POLL_INTERVAL']
+        ran = 0
+        self.stdout.write(f"Worker {worker} polling {type(broker).__name__}.")
+        try:
+            while options['max_jobs'] is None or ran < options['max_jobs']:
+                # Like the request cycle: drop broken or expired connections between jobs.
+                close_old_connections()
+                job = broker.claim(worker)
+                if job is None:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+                jobs.run_job(broker, job)
+                ran += 1
+                self.stdout.write(f"{job} after {job.attempts} attempt(s).")
+        except KeyboardInterrupt:
+            pass
+        finally:
+            close_old_connections()
+        self.stdout.write(self.style.SUCCESS(f"Ran {ran} job(s)."))
@@ -0,0 +1,324 @@
+"""
+Downsampled archive of old ``Metric`` samples.
+
+``archive()`` moves whole calendar months (UTC) of raw samples older than
+``METRIC_ARCHIVE['AFTER_DAYS']`` into one ``MetricArchiveBlock`` per
+(user, type, month). ``manage.py archive_metrics`` runs it daily (the
+``vibrafit-metric-archive`` cron service in render.yaml). Samples are averaged into one point per
+``RESOLUTION`` seconds, keeping the sample count so totals and means stay
+exact. Points are delta-encoded as varints (timestamp, value in
+thousandths, count), usually 4-6 bytes each. A raw row plus its index
+entries takes well over 100 bytes.
+
+Rollups, latest values and goal progress already account for archived
+samples, so the raw rows are deleted without signals. Readers that go back
+to the raw table read through this module instead:
+
+* ``MergedMetrics`` serves the metric list.
+* ``series()`` serves goal progress.
+* ``iter_points()`` serves rollup rebuilds.
+* ``newest()`` serves latest values.
+
+Each of them merges archived points with raw rows, ordered by time.
+
+A block holds no sample ids, so a resent sample can't be told apart from
+a new one. The metric serializers therefore reject writes that land in
+an archived month (see ``in_archived_month()``).
+"""
+import heapq
+import itertools
+import operator
+from collections import namedtuple
+from datetime import datetime, timezone as dt_timezone
+from functools import cmp_to_key
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.functions import TruncMonth
+
+from .models import Metric, MetricArchiveBlock
+
+FORMAT_VERSION = 1
+
+# Archived values are kept to three decimal places.
+SCALE = 1000
+
+Point = namedtuple('Point', 'timestamp value count')
+
+
+def _write_varint(n, out):
+    n = n << 1 if n >= 0 else (-n << 1) - 1  # zigzag: small negatives stay short
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return (n >> 1 if not n & 1 else -((n + 1) >> 1)), pos
+        shift += 7
+
+
+def encode(points):
+    """Pack ``Point``s sorted by timestamp (epoch seconds)."""
+    out = bytearray([FORMAT_VERSION])
+    _write_varint(len(points), out)
+    previous_ts = previous_value = 0
+    for point in points:
+        value = round(point.value * SCALE)
+        _write_varint(point.timestamp - previous_ts, out)
+        _write_varint(value - previous_value, out)
+        _write_varint(point.count, out)
+        previous_ts, previous_value = point.timestamp, value
+    return bytes(out)
+
+
+def decode(data):
+    data = bytes(data)
+    if data[0] != FORMAT_VERSION:
+        raise ValueError(f"Unknown archive block format {data[0]}.")
+    size, pos = _read_varint(data, 1)
+    points = []
+    timestamp = value = 0
+    for _ in range(size):
+        delta, pos = _read_varint(data, pos)
+        timestamp += delta
+        delta, pos = _read_varint(data, pos)
+        value += delta
+        count, pos = _read_varint(data, pos)
+        points.append(Point(timestamp, value / SCALE, count))
+    return points
+
+
+def downsample(points, resolution):
+    """Average ``points`` into one per ``resolution`` seconds, weighted by their counts."""
+    buckets = {}
+    for timestamp, value, count in points:
+        start = timestamp - timestamp % resolution
+        total, samples = buckets.get(start, (0.0, 0))
+        buckets[start] = (total + value * count, samples + count)
+    return [Point(start, total / samples, samples) for start, (total, samples) in sorted(buckets.items())]
+
+
+def _month_start(moment):
+    return moment.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(start):
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def in_archived_month(user_id, samples):
+    """For each ``(type, recorded_at)`` of ``samples``, whether ``user_id`` has archived its month."""
+    keys = [(type, _month_start(recorded_at)) for type, recorded_at in samples]
+    if not keys:
+        return []
+    blocks = MetricArchiveBlock.objects.filter(
+        user_id=user_id, type__in={type for type, _ in keys}, start__in={start for _, start in keys},
+    )
+    archived = set(blocks.values_list('type', 'start'))
+    return [key in archived for key in keys]
+
+
+def _archive_month(user_id, type, start, resolution):
+    with transaction.atomic():
+        rows = Metric.objects.filter(user_id=user_id, type=type, recorded_at__gte=start, recorded_at__lt=_next_month(start))
+        ids, points = [], []
+        for pk, recorded_at, value in rows.values_list('id', 'recorded_at', 'value').iterator():
+            ids.append(pk)
+            points.append(Point(int(recorded_at.timestamp()), value, 1))
+
+        block = MetricArchiveBlock.objects.select_for_update().filter(user_id=user_id, type=type, start=start).first()
+        samples = len(ids)
+        if block is not None:
+            # Late samples for an archived month are folded into its block.
+            resolution = max(resolution, block.resolution)
+            points.extend(decode(block.data))
+            samples += block.samples
+        points = downsample(points, resolution)
+        MetricArchiveBlock.objects.update_or_create(
+            user_id=user_id, type=type, start=start,
+            defaults=dict(end=_next_month(start), resolution=resolution, samples=samples,
+                          points=len(points), data=encode(points)),
+        )
+        for chunk in range(0, len(ids), 1000):
+            Metric.objects.filter(pk__in=ids[chunk:chunk + 1000])._raw_delete(Metric.objects.db)
+    return len(ids)
+
+
+def archive(before, user_id=None, resolution=None):
+    """
+    Archive the raw samples of every calendar month that ended by ``before``
+    (a datetime). Returns ``(samples archived, blocks written)``.
+    """
+    resolution = resolution or settings.METRIC_ARCHIVE['RESOLUTION']
+    raw = Metric.objects.filter(recorded_at__lt=_month_start(before))
+    if user_id is not None:
+        raw = raw.filter(user_id=user_id)
+    months = (
+        raw.annotate(month=TruncMonth('recorded_at', tzinfo=dt_timezone.utc))
+        .values_list('user_id', 'type', 'month')
+        .distinct()
+        .order_by()
+    )
+    samples = blocks = 0
+    for month_user_id, type, month in list(months):
+        samples += _archive_month(month_user_id, type, month, resolution)
+        blocks += 1
+    return samples, blocks
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, dt_timezone.utc)
+
+
+def iter_points(user_id=None, types=None, start=None, end=None):
+    """Yield ``(user_id, type, recorded_at, value, count)`` for archived points in ``[start, end)``."""
+    blocks = MetricArchiveBlock.objects.order_by('start')
+    if user_id is not None:
+        blocks = blocks.filter(user_id=user_id)
+    if types is not None:
+        blocks = blocks.filter(type__in=types)
+    if start is not None:
+        blocks = blocks.filter(end__gt=start)
+    if end is not None:
+        blocks = blocks.filter(start__lt=end)
+    for block in blocks.iterator(chunk_size=100):
+        for point in decode(block.data):
+            recorded_at = _to_datetime(point.timestamp)
+            if (start is None or recorded_at >= start) and (end is None or recorded_at < end):
+                yield block.user_id, block.type, recorded_at, point.value, point.count
+
+
+def series(user_id, type):
+    """Yield ``(recorded_at, value)`` of ``user_id``'s ``type`` history, raw and archived, oldest first."""
+    raw = (
+        Metric.objects.filter(user_id=user_id, type=type)
+        .order_by('recorded_at')
+        .values_list('recorded_at', 'value')
+        .iterator()
+    )
+    archived = ((recorded_at, value) for _, _, recorded_at, value, _ in iter_points(user_id, [type]))
+    return heapq.merge(raw, archived, key=operator.itemgetter(0))
+
+
+def newest(user_id, type):
+    """The newest archived point of ``user_id``'s ``type`` as ``{'value', 'recorded_at'}``, or None."""
+    block = MetricArchiveBlock.objects.filter(user_id=user_id, type=type).order_by('-start').first()
+    if block is None:
+        return None
+    point = decode(block.data)[-1]
+    return {'value': point.value, 'recorded_at': _to_datetime(point.timestamp)}
+
+
+_LOOKUPS = {'lt': operator.lt, 'lte': operator.le, 'gt': operator.gt, 'gte': operator.ge}
+
+# The block filter that keeps every block able to hold a point passing a
+# ``recorded_at`` lookup. Blocks cover ``[start, end)``.
+_BLOCK_LOOKUPS = {operator.lt: 'start__lt', operator.le: 'start__lte', operator.gt: 'end__gt', operator.ge: 'end__gt'}
+
+
+class MergedMetrics:
+    """
+    A ``Metric`` queryset plus the archived points of ``blocks``, for
+    ``CursorPagination``. It supports what the paginator calls, which is
+    ``order_by()``, comparison ``filter()``s and slicing.
+
+    Archived points come back as unsaved ``Metric`` instances with no id. When
+    they tie with raw rows on the ordering, they sort after them.
+    """
+
+    def __init__(self, metrics, blocks, start=None, end=None):
+        self.metrics  = metrics
+        self.blocks   = blocks
+        self.start    = start
+        self.end      = end
+        self.ordering = ('-recorded_at', '-id')
+        self.lookups  = []
+
+    def _clone(self, metrics, **changes):
+        clone = MergedMetrics(metrics, self.blocks, self.start, self.end)
+        clone.ordering, clone.lookups = self.ordering, list(self.lookups)
+        clone.__dict__.update(changes)
+        return clone
+
+    def order_by(self, *ordering):
+        return self._clone(self.metrics.order_by(*ordering), ordering=ordering)
+
+    def filter(self, **kwargs):
+        clone = self._clone(self.metrics.filter(**kwargs))
+        for lookup, value in kwargs.items():
+            field, op = lookup.rsplit('__', 1)
+            clone.lookups.append((field, _LOOKUPS[op], Metric._meta.get_field(field).to_python(value)))
+        return clone
+
+    def _compare(self, a, b):
+        for term in self.ordering:
+            field = term.lstrip('-')
+            left, right = getattr(a, field), getattr(b, field)
+            if field == 'id':
+                # Archived points have no id; they sort after raw rows on ties.
+                left, right = left or 0, right or 0
+            if left != right:
+                result = -1 if left < right else 1
+                return -result if term.startswith('-') else result
+        return 0
+
+    def _matches(self, metric):
+        return all(op(getattr(metric, field), value) for field, op, value in self.lookups if field != 'id')
+
+    def _points(self, blocks):
+        for block in blocks:
+            for point in decode(block.data):
+                metric = Metric(user_id=block.user_id, type=block.type, value=point.value,
+                                recorded_at=_to_datetime(point.timestamp))
+                if ((self.start is None or metric.recorded_at >= self.start)
+                        and (self.end is None or metric.recorded_at <= self.end) and self._matches(metric)):
+                    yield metric
+
+    def _archived(self, boundary=None):
+        """Archived points in order; with a ``boundary`` metric, only blocks that can precede it are read."""
+        key = cmp_to_key(self._compare)
+        blocks = self.blocks
+        if self.start is not None:
+            blocks = blocks.filter(end__gt=self.start)
+        if self.end is not None:
+            blocks = blocks.filter(start__lte=self.end)
+        for field, op, value in self.lookups:
+            # The cursor's position: blocks wholly on the far side of it are never decoded.
+            if field == 'recorded_at':
+                blocks = blocks.filter(**{_BLOCK_LOOKUPS[op]: value})
+        first = self.ordering[0]
+        if first.lstrip('-') != 'recorded_at':
+            yield from sorted(self._points(blocks.iterator(chunk_size=100)), key=key)
+            return
+
+        # Blocks of different users and types overlap in time: walk them in
+        # order and release a point once no later block can precede it.
+        descending = first.startswith('-')
+        if boundary is not None:
+            blocks = blocks.filter(**{'end__gt' if descending else 'start__lte': boundary.recorded_at})
+        pending, tiebreak = [], itertools.count()
+        for block in blocks.order_by('-end' if descending else 'start').iterator(chunk_size=100):
+            edge = block.end if descending else block.start
+            while pending and (pending[0][2].recorded_at >= edge if descending else pending[0][2].recorded_at < edge):
+                yield heapq.heappop(pending)[2]
+            for metric in self._points([block]):
+                heapq.heappush(pending, (key(metric), next(tiebreak), metric))
+        while pending:
+            yield heapq.heappop(pending)[2]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice) or index.stop is None:
+            raise TypeError("MergedMetrics only supports bounded slices.")
+        raw = list(self.metrics[:index.stop])
+        # A full slice of raw rows bounds which archived points can still make the cut.
+        archived = self._archived(raw[-1] if len(raw) == index.stop else None)
+        merged = heapq.merge(raw, archived, key=cmp_to_key(self._compare))
+        return list(itertools.islice(merged, index.start or 0, index.stop))
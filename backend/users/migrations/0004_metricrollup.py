@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 08:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_profilepictureurl'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=50)),
+                ('bucket', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('bucket_start', models.DateField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('min_value', models.FloatField()),
+                ('max_value', models.FloatField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'type', 'bucket', 'bucket_start'), name='uniq_metric_rollup_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_metricrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailylog',
+            index=models.Index(fields=['user', '-date'], name='dailylog_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(fields=['user', '-created_at'], name='goal_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='metric',
+            index=models.Index(fields=['user', 'type', '-recorded_at'], name='metric_user_type_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['trainer', '-date'], name='plan_trainer_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['user', '-date'], name='plan_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['trainer', 'client'], name='sub_active_trainer_client_idx'),
+        ),
+    ]
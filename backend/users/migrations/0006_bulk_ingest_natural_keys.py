@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 08:53
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def drop_duplicates(apps, schema_editor):
+    """Keep the newest row of each natural key so the constraints can be added."""
+    for model_name, key in [('Metric', ('user', 'type', 'recorded_at')), ('DailyLog', ('user', 'plan', 'date'))]:
+        model = apps.get_model('users', model_name)
+        for row in model.objects.values(*key).annotate(keep=Max('id'), n=Count('id')).filter(n__gt=1).order_by():
+            model.objects.filter(**{f: row[f] for f in key}).exclude(id=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_role_scoped_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='metric',
+            name='metric_user_type_recorded_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='dailylog',
+            constraint=models.UniqueConstraint(fields=('user', 'plan', 'date'), name='uniq_dailylog_user_plan_date'),
+        ),
+        migrations.AddConstraint(
+            model_name='metric',
+            constraint=models.UniqueConstraint(fields=('user', 'type', 'recorded_at'), name='uniq_metric_user_type_recorded'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 09:06
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX trainer_search_vector_idx ON users_trainerprofile USING gin (search_vector)'
+    )
+    vector = (
+        SearchVector('specialties', weight='A', config='english')
+        + SearchVector('certifications', weight='B', config='english')
+        + SearchVector('bio', weight='C', config='english')
+    )
+    apps.get_model('users', 'TrainerProfile').objects.update(search_vector=vector)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS trainer_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_goal_plan_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainerprofile',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='trainerprofile',
+            index=models.Index(fields=['-rating', '-id'], name='trainer_rating_idx'),
+        ),
+        # GIN isn't available on SQLite, so this index lives outside the model state.
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 09:17
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_trainer_reviews'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientDailySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('plans', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('daily_logs', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('open_goals', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('latest_metrics', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='uniq_snapshot_user_date')],
+            },
+        ),
+    ]
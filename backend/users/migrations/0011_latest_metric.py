@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 09:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+
+def backfill(apps, schema_editor):
+    Metric = apps.get_model('users', 'Metric')
+    LatestMetric = apps.get_model('users', 'LatestMetric')
+    newest = Metric.objects.annotate(
+        rank=Window(RowNumber(), partition_by=[F('user_id'), F('type')], order_by=F('recorded_at').desc()),
+    ).filter(rank=1)
+    LatestMetric.objects.bulk_create(
+        (LatestMetric(user_id=m.user_id, type=m.type, value=m.value, recorded_at=m.recorded_at) for m in newest.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_client_daily_snapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestMetric',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=50)),
+                ('value', models.FloatField()),
+                ('recorded_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='latest_metrics', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'type'), name='uniq_latest_metric_user_type')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-18 09:28
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goal',
+            name='baseline_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='current_value',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='direction',
+            field=models.CharField(blank=True, choices=[('decrease', 'Decrease'), ('increase', 'Increase')], max_length=8),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='metric_type',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='progress',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='progress_state',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='progress_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='projected_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='target_numeric',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='goal',
+            name='trend_slope',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
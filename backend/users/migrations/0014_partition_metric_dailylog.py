@@ -0,0 +1,86 @@
+from datetime import date, datetime
+
+from django.db import migrations
+
+# Table -> partition column. Kept here rather than imported from
+# users.partitions so the migration doesn't change if that module does.
+TABLES = {'users_metric': 'recorded_at', 'users_dailylog': 'date'}
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition(cursor, table, column):
+    """
+    Rebuild ``table`` as a table range-partitioned on ``column`` by month,
+    keeping its rows, ids, indexes and constraints. The primary key becomes
+    (id, column), since PostgreSQL requires the partition key in it. ids still
+    come from one sequence, so ``id`` alone stays unique.
+    """
+    new = f'{table}__partitioned'
+    # Writes wait until the copy is done instead of being lost with the old table.
+    cursor.execute(f'LOCK TABLE {table} IN SHARE MODE')
+
+    cursor.execute(
+        'SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i WHERE i.indrelid = %s::regclass '
+        'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)',
+        [table],
+    )
+    indexes = [definition for definition, in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('u', 'f', 'c')",
+        [table],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(f'SELECT min({column}), max(id) FROM {table}')
+    oldest, max_id = cursor.fetchone()
+
+    cursor.execute(f'CREATE TABLE {new} (LIKE {table}) PARTITION BY RANGE ({column})')
+    this_month = date.today().replace(day=1)
+    if isinstance(oldest, datetime):
+        oldest = oldest.date()
+    month = min(oldest, this_month).replace(day=1) if oldest else this_month
+    while month <= _add_months(this_month, MONTHS_AHEAD):
+        following = _add_months(month, 1)
+        cursor.execute(
+            f"CREATE TABLE {table}_p{month:%Y_%m} PARTITION OF {new} FOR VALUES FROM ('{month}') TO ('{following}')"
+        )
+        month = following
+    cursor.execute(f'CREATE TABLE {table}_default PARTITION OF {new} DEFAULT')
+    cursor.execute(f'INSERT INTO {new} SELECT * FROM {table}')
+
+    cursor.execute(f'DROP TABLE {table}')
+    cursor.execute(f'ALTER TABLE {new} RENAME TO {table}')
+    cursor.execute(f'CREATE SEQUENCE {table}_id_seq OWNED BY {table}.id')
+    cursor.execute(f"SELECT setval('{table}_id_seq', %s, false)", [(max_id or 0) + 1])
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{table}_id_seq')")
+    cursor.execute(f'ALTER TABLE {table} ADD PRIMARY KEY (id, {column})')
+    for name, definition in constraints:
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}')
+    for definition in indexes:
+        cursor.execute(definition)
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, column in TABLES.items():
+            _partition(cursor, table, column)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0013_goal_progress'),
+    ]
+
+    operations = [
+        # Only the physical layout changes, so there is nothing to undo for the ORM.
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 09:46
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_partition_metric_dailylog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricArchiveBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(max_length=50)),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('resolution', models.PositiveIntegerField()),
+                ('samples', models.PositiveIntegerField()),
+                ('points', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='metric_archive_blocks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'type', 'start'), name='uniq_metric_archive_block')],
+            },
+        ),
+    ]
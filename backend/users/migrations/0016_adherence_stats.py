@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 09:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_metric_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdherenceStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='adherence', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('days', models.JSONField(default=dict)),
+                ('streak_start', models.DateField(blank=True, null=True)),
+                ('streak_end', models.DateField(blank=True, null=True)),
+                ('streak_length', models.PositiveIntegerField(default=0)),
+                ('longest_streak', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,3 +1,6 @@
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 # Create your models here.
@@ -52,11 +55,39 @@ class TrainerProfile(models.Model):
     bio            = models.TextField(blank=True)
     certifications = models.TextField(blank=True)
     specialties    = models.TextField(blank=True)
+    # rating = rating_sum / rating_count, kept in step by users.ratings as
+    # reviews are written so reads never aggregate TrainerReview.
     rating         = models.FloatField(default=0.0)
+    rating_sum     = models.PositiveIntegerField(default=0)
+    rating_count   = models.PositiveIntegerField(default=0)
+    # Weighted tsvector of specialties/certifications/bio for trainer search.
+    # Maintained on PostgreSQL only (see users.search); NULL elsewhere.
+    search_vector  = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-rating', '-id'], name='trainer_rating_idx'),
+        ]
 
     def __str__(self):
         return f"TrainerProfile for {self.user.email}"
 
+class TrainerReview(models.Model):
+    trainer    = models.ForeignKey('User', related_name='reviews_received', on_delete=models.CASCADE)
+    client     = models.ForeignKey('User', related_name='reviews_written', on_delete=models.CASCADE)
+    rating     = models.PositiveSmallIntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
+    comment    = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trainer', 'client'], name='uniq_review_trainer_client'),
+        ]
+        indexes = [
+            models.Index(fields=['trainer', '-created_at'], name='review_trainer_created_idx'),
+        ]
+
 class Subscription(models.Model):
     client = models.ForeignKey('User', related_name='client_subscriptions', on_delete=models.CASCADE)
     trainer = models.ForeignKey('User', related_name='trainer_subscriptions', on_delete=models.CASCADE)
@@ -64,13 +95,50 @@ class Subscription(models.Model):
     end_date = models.DateField()
     status = models.CharField(max_length=20)
 
+    class Meta:
+        indexes = [
+            # Trainer -> active clients, and the (client, trainer) active check.
+            models.Index(
+                fields=['trainer', 'client'],
+                condition=models.Q(status='active'),
+                name='sub_active_trainer_client_idx',
+            ),
+        ]
+
 class Goal(models.Model):
+    DIRECTION_CHOICES = (
+        ('decrease', 'Decrease'),
+        ('increase', 'Increase'),
+    )
+
     user = models.ForeignKey('User', on_delete=models.CASCADE)
     description = models.TextField()
     target_value = models.CharField(max_length=255)
     target_date = models.DateField()
     status = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Typed target: reach ``target_numeric`` on the ``metric_type`` series,
+    # moving in ``direction``. Goals without one have no computed progress.
+    metric_type    = models.CharField(max_length=50, blank=True)
+    target_numeric = models.FloatField(null=True, blank=True)
+    direction      = models.CharField(max_length=8, choices=DIRECTION_CHOICES, blank=True)
+
+    # Cached by users.goal_progress as metrics arrive. ``progress_state``
+    # holds the running least-squares sums behind ``trend_slope``.
+    baseline_value      = models.FloatField(null=True, blank=True)
+    current_value       = models.FloatField(null=True, blank=True)
+    progress            = models.FloatField(null=True, blank=True)
+    trend_slope         = models.FloatField(null=True, blank=True)
+    projected_date      = models.DateField(null=True, blank=True)
+    progress_state      = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    progress_updated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='goal_user_created_idx'),
+        ]
 
 class Plan(models.Model):
     user = models.ForeignKey('User', related_name='user_plans', on_delete=models.CASCADE)
@@ -79,6 +147,13 @@ class Plan(models.Model):
     nutrition_plan = models.TextField()
     exercise_plan = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['trainer', '-date'], name='plan_trainer_date_idx'),
+            models.Index(fields=['user', '-date'], name='plan_user_date_idx'),
+        ]
 
 class DailyLog(models.Model):
     user = models.ForeignKey('User', on_delete=models.CASCADE)
@@ -89,8 +164,175 @@ class DailyLog(models.Model):
     completion_percentage = models.FloatField()
     notes = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-date'], name='dailylog_user_date_idx'),
+        ]
+        constraints = [
+            # Natural key used by the bulk ingestion upsert.
+            models.UniqueConstraint(fields=['user', 'plan', 'date'], name='uniq_dailylog_user_plan_date'),
+        ]
+
 class Metric(models.Model):
     user = models.ForeignKey('User', on_delete=models.CASCADE)
     type = models.CharField(max_length=50)
     value = models.FloatField()
     recorded_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Natural key used by the bulk ingestion upsert; its index also
+            # serves (user, type) history reads in either direction.
+            models.UniqueConstraint(fields=['user', 'type', 'recorded_at'], name='uniq_metric_user_type_recorded'),
+        ]
+
+
+class LatestMetric(models.Model):
+    """
+    The newest ``Metric`` of each type per user ("current weight").
+
+    Maintained by ``users.latest_metrics`` as metrics are written, so current
+    stats are one indexed lookup however long the history. There is no FK to
+    ``Metric``: (user, type, recorded_at) identifies the source row.
+    """
+    user        = models.ForeignKey('User', related_name='latest_metrics', on_delete=models.CASCADE)
+    type        = models.CharField(max_length=50)
+    value       = models.FloatField()
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'type'], name='uniq_latest_metric_user_type'),
+        ]
+
+
+class MetricRollup(models.Model):
+    """
+    Precomputed min/max/sum/count of a user's metric type per time bucket.
+
+    Maintained by ``users.rollups`` whenever a ``Metric`` changes so that
+    series reads never scan the raw ``Metric`` history.
+    """
+    BUCKET_CHOICES = (
+        ('day',   'Day'),
+        ('week',  'Week'),
+        ('month', 'Month'),
+    )
+
+    user         = models.ForeignKey('User', related_name='metric_rollups', on_delete=models.CASCADE)
+    type         = models.CharField(max_length=50)
+    bucket       = models.CharField(max_length=5, choices=BUCKET_CHOICES)
+    bucket_start = models.DateField()
+    count        = models.PositiveIntegerField(default=0)
+    total        = models.FloatField(default=0.0)
+    min_value    = models.FloatField()
+    max_value    = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'type', 'bucket', 'bucket_start'],
+                name='uniq_metric_rollup_bucket',
+            ),
+        ]
+
+    @property
+    def avg(self):
+        return self.total / self.count if self.count else None
+
+
+class MetricArchiveBlock(models.Model):
+    """
+    One calendar month (UTC) of a user's metric type, archived by
+    ``users.metric_archive``: the raw samples are downsampled to one point
+    per ``resolution`` seconds (mean value and sample count) and packed into
+    ``data``, delta-encoded. The raw ``Metric`` rows are deleted.
+    """
+    user       = models.ForeignKey('User', related_name='metric_archive_blocks', on_delete=models.CASCADE)
+    type       = models.CharField(max_length=50)
+    start      = models.DateTimeField()
+    end        = models.DateTimeField()
+    resolution = models.PositiveIntegerField()
+    samples    = models.PositiveIntegerField()
+    points     = models.PositiveIntegerField()
+    data       = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'type', 'start'], name='uniq_metric_archive_block'),
+        ]
+
+
+class ClientDailySnapshot(models.Model):
+    """
+    Everything the client home screen shows for one day, as ready-to-send
+    JSON: that day's plans and daily logs, open goals and the latest metric
+    of each type.
+
+    Built on first read by ``users.daily_snapshots`` and kept current by
+    signals while it exists, so ``GET /api/me/today/`` is one unique-key
+    lookup.
+    """
+    user           = models.ForeignKey('User', related_name='daily_snapshots', on_delete=models.CASCADE)
+    date           = models.DateField()
+    plans          = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    daily_logs     = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    open_goals     = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    latest_metrics = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    updated_at     = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='uniq_snapshot_user_date'),
+        ]
+
+
+class AdherenceStats(models.Model):
+    """
+    How closely a user keeps to their plans: per-day completion for the last
+    90 days, the current run of days meeting the streak threshold and the
+    longest run ever. Maintained by ``users.adherence`` as plans and daily
+    logs are written, so adherence reads never scan ``DailyLog``.
+    """
+    user           = models.OneToOneField('User', primary_key=True, related_name='adherence', on_delete=models.CASCADE)
+    days           = models.JSONField(default=dict)
+    streak_start   = models.DateField(null=True, blank=True)
+    streak_end     = models.DateField(null=True, blank=True)
+    streak_length  = models.PositiveIntegerField(default=0)
+    longest_streak = models.PositiveIntegerField(default=0)
+    updated_at     = models.DateTimeField(auto_now=True)
+
+
+class Job(models.Model):
+    """A unit of background work queued through ``users.jobs``."""
+    STATUS_CHOICES = (
+        ('queued',    'Queued'),
+        ('running',   'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed',    'Failed'),
+    )
+
+    name         = models.CharField(max_length=100)
+    payload      = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status       = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts     = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_at       = models.DateTimeField()
+    locked_at    = models.DateTimeField(null=True, blank=True)
+    locked_by    = models.CharField(max_length=100, blank=True)
+    result       = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    last_error   = models.TextField(blank=True)
+    created_by   = models.ForeignKey('User', null=True, blank=True, related_name='jobs', on_delete=models.SET_NULL)
+    created_at   = models.DateTimeField(auto_now_add=True)
+    finished_at  = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's "next due job" scan.
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
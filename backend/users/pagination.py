@@ -0,0 +1,26 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class TimeCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a model's natural time column.
+
+    Each viewset declares its own ``ordering`` (e.g. ``('-recorded_at', '-id')``);
+    the trailing ``id`` keeps cursors stable when several rows share a timestamp.
+    Clients may ask for a smaller or larger page with ``?page_size=``, capped
+    at ``settings.API_MAX_PAGE_SIZE``. Views with an ordering filter
+    (``users.filters.StrictOrderingFilter``) page on the ``?ordering=`` asked for.
+    """
+    ordering              = ('-id',)
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.API_MAX_PAGE_SIZE
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None)
+        if ordering and not any(hasattr(f, 'get_ordering') for f in getattr(view, 'filter_backends', [])):
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return super().get_ordering(request, queryset, view)
@@ -0,0 +1,139 @@
+"""
+Monthly range partitions of the largest tables, on PostgreSQL.
+
+Migration 0014 partitions ``users_metric`` by ``recorded_at`` and
+``users_dailylog`` by ``date``, one partition per calendar month (UTC) plus a
+``<table>_default`` partition for rows outside the created months. The ORM
+can't tell the difference.
+
+``manage.py manage_partitions`` (run daily by the ``vibrafit-partitions`` cron
+service in render.yaml) creates partitions ``MONTHS_AHEAD`` months in
+advance and applies the retention policy: a partition that lies entirely
+before the retention window is detached.
+Detaching only changes catalog metadata, unlike a DELETE, which scans and
+locks the live table. A detached partition stays in the database as a plain
+table, without its foreign keys, to archive (e.g. with pg_dump) unless it
+is dropped.
+
+On other databases nothing is partitioned and every function here is a no-op.
+"""
+import re
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import DailyLog, Metric
+
+# Model -> the column its table is partitioned on.
+PARTITIONED = {Metric: 'recorded_at', DailyLog: 'date'}
+
+
+def add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def is_partitioned(model):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [model._meta.db_table])
+        return cursor.fetchone() is not None
+
+
+def partitions(model):
+    """The monthly partitions of ``model``'s table, as ``{first day of month: table name}``."""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [table],
+        )
+        names = [name for name, in cursor.fetchall()]
+    pattern = re.compile(rf'{re.escape(table)}_p(\d{{4}})_(\d{{2}})')
+    return {
+        date(int(match[1]), int(match[2]), 1): name
+        for name in names
+        if (match := pattern.fullmatch(name))
+    }
+
+
+def create_partition(model, month):
+    table, column = model._meta.db_table, PARTITIONED[model]
+    qn = connection.ops.quote_name
+    name, default = qn(partition_name(table, month)), qn(f'{table}_default')
+    in_month = f'{qn(column)} >= %s AND {qn(column)} < %s'
+    bounds = [month, add_months(month, 1)]
+    create = f"CREATE TABLE {name} PARTITION OF {qn(table)} FOR VALUES FROM ('{bounds[0]}') TO ('{bounds[1]}')"
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {default} WHERE {in_month})', bounds)
+        if not cursor.fetchone()[0]:
+            cursor.execute(create)
+            return
+        # The new range may not overlap rows the default partition already holds; move them over.
+        cursor.execute(f'ALTER TABLE {qn(table)} DETACH PARTITION {default}')
+        cursor.execute(create)
+        cursor.execute(f'INSERT INTO {name} SELECT * FROM {default} WHERE {in_month}', bounds)
+        cursor.execute(f'DELETE FROM {default} WHERE {in_month}', bounds)
+        cursor.execute(f'ALTER TABLE {qn(table)} ATTACH PARTITION {default} DEFAULT')
+
+
+def ensure_partitions(months_ahead, today=None):
+    """Create the missing partitions from this month to ``months_ahead`` months out; returns their names."""
+    this_month = (today or date.today()).replace(day=1)
+    created = []
+    for model in PARTITIONED:
+        if not is_partitioned(model):
+            continue
+        existing = partitions(model)
+        for n in range(months_ahead + 1):
+            month = add_months(this_month, n)
+            if month not in existing:
+                create_partition(model, month)
+                created.append(partition_name(model._meta.db_table, month))
+    return created
+
+
+def _drop_foreign_keys(cursor, table):
+    """
+    Drop the FKs a detached partition keeps from its parent. Django cascades
+    deletes against the parent table only, so they would block deleting a
+    user or plan that still has rows in the detached table.
+    """
+    cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'", [table])
+    qn = connection.ops.quote_name
+    for constraint, in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(constraint)}')
+
+
+def apply_retention(retention_months, drop=False, today=None):
+    """
+    Detach (or ``drop``) the partitions that end before the retention window.
+    ``retention_months`` maps model names to a number of months, 0 keeping
+    everything. Returns the affected partition names.
+    """
+    this_month = (today or date.today()).replace(day=1)
+    qn = connection.ops.quote_name
+    removed = []
+    for model in PARTITIONED:
+        months = retention_months.get(model._meta.model_name, 0)
+        if not months or not is_partitioned(model):
+            continue
+        cutoff = add_months(this_month, -months)
+        for month, name in sorted(partitions(model).items()):
+            if month >= cutoff:
+                break
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {qn(model._meta.db_table)} DETACH PARTITION {qn(name)}')
+                if drop:
+                    cursor.execute(f'DROP TABLE {qn(name)}')
+                else:
+                    _drop_foreign_keys(cursor, name)
+            removed.append(name)
+    return removed
@@ -1,3 +1,4 @@
+from django.db.models import Q
 from rest_framework.permissions import BasePermission
 
 class IsAdmin(BasePermission):
@@ -11,3 +12,46 @@ class IsTrainer(BasePermission):
 class IsClient(BasePermission):
     def has_permission(self, request, view):
         return request.user.is_authenticated and request.user.role == 'client'
+
+
+def can_view_user_data(viewer, user_id):
+    """
+    Whether ``viewer`` may read the fitness data of user ``user_id``:
+    their own, an active client's if they're a trainer, or anyone's if admin.
+    """
+    from .models import Subscription
+
+    if viewer.pk == user_id:
+        return True
+    if viewer.role == 'admin' or viewer.is_staff:
+        return True
+    if viewer.role == 'trainer':
+        return Subscription.objects.filter(trainer=viewer, client_id=user_id, status='active').exists()
+    return False
+
+
+def visible_user_data(viewer, field='user'):
+    """
+    ``Q`` limiting rows whose ``field`` is a user to those ``viewer`` may
+    read, by the same rules as ``can_view_user_data``.
+    """
+    from .models import Subscription
+
+    if viewer.role == 'admin' or viewer.is_staff:
+        return Q()
+    visible = Q(**{field: viewer.pk})
+    if viewer.role == 'trainer':
+        clients = Subscription.objects.filter(trainer=viewer, status='active').values('client')
+        visible |= Q(**{f'{field}__in': clients})
+    return visible
+
+
+async def acan_view_user_data(viewer, user_id):
+    """Async counterpart of ``can_view_user_data`` for the async views."""
+    from .models import Subscription
+
+    if viewer.pk == user_id or viewer.role == 'admin' or viewer.is_staff:
+        return True
+    if viewer.role == 'trainer':
+        return await Subscription.objects.filter(trainer=viewer, client_id=user_id, status='active').aexists()
+    return False
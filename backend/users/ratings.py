@@ -0,0 +1,52 @@
+"""
+Incremental maintenance of ``TrainerProfile.rating`` from ``TrainerReview``.
+
+Every review write adjusts the trainer's running ``rating_sum`` and
+``rating_count`` with a single UPDATE built from ``F()`` expressions. The
+database applies it atomically against the current row, so concurrent
+reviews of one trainer can't lose each other's changes, and ``rating`` is
+derived from the new sum and count in the same statement.
+"""
+from django.db import transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import TrainerProfile, TrainerReview
+
+
+def _apply(trainer_id, delta_sum, delta_count):
+    new_sum   = F('rating_sum') + delta_sum
+    new_count = F('rating_count') + delta_count
+    TrainerProfile.objects.filter(user_id=trainer_id).update(
+        rating_sum=new_sum,
+        rating_count=new_count,
+        rating=Coalesce(Cast(new_sum, FloatField()) / NullIf(new_count, 0), Value(0.0)),
+    )
+
+
+def create_review(serializer):
+    with transaction.atomic():
+        review = serializer.save()
+        _apply(review.trainer_id, review.rating, 1)
+    return review
+
+
+def update_review(serializer):
+    with transaction.atomic():
+        # Lock the row so the delta is taken against the rating being replaced.
+        previous = TrainerReview.objects.select_for_update().get(pk=serializer.instance.pk).rating
+        review = serializer.save()
+        if review.rating != previous:
+            _apply(review.trainer_id, review.rating - previous, 0)
+    return review
+
+
+def delete_review(review):
+    with transaction.atomic():
+        # Lock the row so the rating taken back is the current one. A second
+        # delete of the same review (e.g. a double submit) waits here, then
+        # finds nothing to delete and leaves the totals alone.
+        rating = TrainerReview.objects.select_for_update().filter(pk=review.pk).values_list('rating', flat=True).first()
+        deleted, _ = TrainerReview.objects.filter(pk=review.pk).delete()
+        if deleted:
+            _apply(review.trainer_id, -rating, -1)
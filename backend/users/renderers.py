@@ -0,0 +1,22 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Selected with ``?format=ndjson`` or ``Accept: application/x-ndjson``.
+    Export views stream their own body; this only renders plain responses
+    such as errors.
+    """
+    media_type = 'application/x-ndjson'
+    format     = 'ndjson'
+    charset    = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data) + '\n'
+
+
+class CSVRenderer(NDJSONRenderer):
+    media_type = 'text/csv'
+    format     = 'csv'
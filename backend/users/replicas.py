@@ -0,0 +1,119 @@
+"""
+Read-replica routing.
+
+Replica aliases come from ``DATABASE_REPLICA_URLS`` (``settings.DATABASE_REPLICAS``).
+Queries go to the primary unless a request opted in: safe-method requests
+to views with ``ReplicaReadMixin`` (and async views decorated with
+``replica_reads``) pick one replica for the whole request, so all of its
+reads see the same point in time.
+
+A user who just wrote is pinned to the primary for
+``READ_REPLICAS['PIN_SECONDS']`` so they read their own writes despite
+replication lag. Pins live in a Django cache (``CACHE_ALIAS``), which
+must be shared between workers for the pin to follow the user. Reads
+inside ``transaction.atomic`` always stay on the primary.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+# Replica alias chosen for the current request, or None for the primary.
+_read_alias = ContextVar('replica_read_alias', default=None)
+
+
+def _cache():
+    return caches[settings.READ_REPLICAS['CACHE_ALIAS']]
+
+
+def _pin_key(user_id):
+    return f'db-pin:{user_id}'
+
+
+def pin(user_id):
+    """Send ``user_id``'s reads to the primary for the next ``PIN_SECONDS``."""
+    seconds = settings.READ_REPLICAS['PIN_SECONDS']
+    if settings.DATABASE_REPLICAS and seconds:
+        _cache().set(_pin_key(user_id), time.time() + seconds, seconds)
+
+
+def is_pinned(user_id):
+    return (_cache().get(_pin_key(user_id)) or 0) > time.time()
+
+
+async def ais_pinned(user_id):
+    return (await _cache().aget(_pin_key(user_id)) or 0) > time.time()
+
+
+def choose_replica():
+    return random.choice(settings.DATABASE_REPLICAS) if settings.DATABASE_REPLICAS else None
+
+
+@contextmanager
+def reading_from(alias):
+    """Route reads inside the block to ``alias`` (None: the primary)."""
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """Reads go to the request's replica, if it has one; writes and migrations to the primary."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # DatabaseCache entries (pins, throttle buckets) are read where they were just written.
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block or model._meta.app_label == 'django_cache':
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication.
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaReadMixin:
+    """
+    Serves GET/HEAD/OPTIONS from a replica unless the user is pinned to the
+    primary; a successful write pins them.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and settings.DATABASE_REPLICAS and not is_pinned(request.user.pk):
+            self._replica_token = _read_alias.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+        elif request.method not in SAFE_METHODS and response.status_code < 400 and request.user.is_authenticated:
+            pin(request.user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def replica_reads(view):
+    """``ReplicaReadMixin`` for async views; apply inside ``jwt_required``."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not settings.DATABASE_REPLICAS or await ais_pinned(request.user.pk):
+            return await view(request, *args, **kwargs)
+        with reading_from(choose_replica()):
+            return await view(request, *args, **kwargs)
+    return wrapper
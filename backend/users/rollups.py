@@ -0,0 +1,161 @@
+"""
+Incremental maintenance of ``MetricRollup`` rows.
+
+New metrics are folded into their day/week/month buckets with a single
+UPDATE per bucket. Updates and deletes can't be undone that way (min/max
+aren't reversible), so the affected buckets are recomputed from the raw
+``Metric`` rows they cover (plus any archived points, see
+``users.metric_archive``), which is bounded by the bucket width.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least, TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import metric_archive
+from .models import Metric, MetricRollup
+
+BUCKETS = ('day', 'week', 'month')
+
+TRUNC = {
+    'day':   TruncDay,
+    'week':  TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def _local_date(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
+
+
+def bucket_start(value, bucket):
+    """First day of the ``bucket`` containing ``value`` (a date or datetime)."""
+    day = _local_date(value)
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown bucket: {bucket}")
+
+
+def next_bucket(start, bucket):
+    """First day of the bucket following the one that starts on ``start``."""
+    if bucket == 'day':
+        return start + timedelta(days=1)
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    if bucket == 'month':
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    raise ValueError(f"Unknown bucket: {bucket}")
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def record_metric(metric):
+    """Fold a newly created ``metric`` into its rollup buckets."""
+    value = Value(float(metric.value), output_field=FloatField())
+    for bucket in BUCKETS:
+        lookup = dict(
+            user_id=metric.user_id,
+            type=metric.type,
+            bucket=bucket,
+            bucket_start=bucket_start(metric.recorded_at, bucket),
+        )
+        changes = dict(
+            count=F('count') + 1,
+            total=F('total') + value,
+            min_value=Least(F('min_value'), value),
+            max_value=Greatest(F('max_value'), value),
+        )
+        if MetricRollup.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                MetricRollup.objects.create(
+                    count=1, total=metric.value, min_value=metric.value, max_value=metric.value, **lookup
+                )
+        except IntegrityError:
+            # Another writer created the bucket first; fold into theirs.
+            MetricRollup.objects.filter(**lookup).update(**changes)
+
+
+def rebuild(user_id=None, types=None, start=None, end=None, batch_size=1000):
+    """
+    Recompute rollups from raw metrics.
+
+    ``start``/``end`` (datetimes or dates, inclusive) are widened to whole
+    buckets for each granularity, so only the buckets touching that span are
+    rewritten. With no arguments every rollup is rebuilt.
+    """
+    with transaction.atomic():
+        for bucket in BUCKETS:
+            metrics = Metric.objects.all()
+            rollups = MetricRollup.objects.filter(bucket=bucket)
+            if user_id is not None:
+                metrics = metrics.filter(user_id=user_id)
+                rollups = rollups.filter(user_id=user_id)
+            if types is not None:
+                metrics = metrics.filter(type__in=types)
+                rollups = rollups.filter(type__in=types)
+            if start is not None:
+                lo = bucket_start(start, bucket)
+                metrics = metrics.filter(recorded_at__gte=_start_of_day(lo))
+                rollups = rollups.filter(bucket_start__gte=lo)
+            if end is not None:
+                hi = next_bucket(bucket_start(end, bucket), bucket)
+                metrics = metrics.filter(recorded_at__lt=_start_of_day(hi))
+                rollups = rollups.filter(bucket_start__lt=hi)
+
+            rollups.delete()
+            archived = _archived_buckets(bucket, user_id, types,
+                                         _start_of_day(lo) if start is not None else None,
+                                         _start_of_day(hi) if end is not None else None)
+            rows = (
+                metrics.annotate(start=TRUNC[bucket]('recorded_at'))
+                .values('user_id', 'type', 'start')
+                .annotate(count=Count('id'), total=Sum('value'), min_value=Min('value'), max_value=Max('value'))
+                .order_by()
+            )
+            # Merging consumes ``archived``; what is left are buckets with no raw rows.
+            merged = [_merged_rollup(row, bucket, archived) for row in rows.iterator()]
+            merged.extend(
+                MetricRollup(user_id=key[0], type=key[1], bucket=bucket, bucket_start=key[2], **fields)
+                for key, fields in archived.items()
+            )
+            MetricRollup.objects.bulk_create(merged, batch_size=batch_size)
+
+
+def _archived_buckets(bucket, user_id, types, start, end):
+    """Rollup fields of the archived points in ``[start, end)``, keyed by (user_id, type, bucket_start)."""
+    buckets = {}
+    for point_user_id, type, recorded_at, value, count in metric_archive.iter_points(user_id, types, start, end):
+        key = (point_user_id, type, bucket_start(recorded_at, bucket))
+        fields = buckets.setdefault(key, dict(count=0, total=0.0, min_value=value, max_value=value))
+        fields['count'] += count
+        fields['total'] += value * count
+        fields['min_value'] = min(fields['min_value'], value)
+        fields['max_value'] = max(fields['max_value'], value)
+    return buckets
+
+
+def _merged_rollup(row, bucket, archived):
+    """The rollup of one raw aggregate ``row``, folding in (and consuming) archived points of the same bucket."""
+    key = (row['user_id'], row['type'], _local_date(row['start']))
+    fields = dict(count=row['count'], total=row['total'], min_value=row['min_value'], max_value=row['max_value'])
+    extra = archived.pop(key, None)
+    if extra is not None:
+        fields.update(
+            count=fields['count'] + extra['count'],
+            total=fields['total'] + extra['total'],
+            min_value=min(fields['min_value'], extra['min_value']),
+            max_value=max(fields['max_value'], extra['max_value']),
+        )
+    return MetricRollup(user_id=key[0], type=key[1], bucket=bucket, bucket_start=key[2], **fields)
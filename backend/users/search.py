@@ -0,0 +1,66 @@
+"""
+Ranked trainer search.
+
+On PostgreSQL, ``TrainerProfile.search_vector`` holds a weighted tsvector
+(specialties > certifications > bio) behind a GIN index, and queries are
+ranked with ``ts_rank``. Other backends (SQLite in tests) fall back to
+substring matching, scoring each matched term by the weight of the field it
+hit, so results come back in a comparable order.
+"""
+from functools import reduce
+from operator import add, or_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+from .models import TrainerProfile
+
+SEARCH_CONFIG = 'english'
+
+# (field, tsvector weight, fallback score)
+WEIGHTED_FIELDS = (
+    ('specialties',    'A', 1.0),
+    ('certifications', 'B', 0.4),
+    ('bio',            'C', 0.2),
+)
+
+
+def search_vector():
+    return reduce(add, (
+        SearchVector(field, weight=weight, config=SEARCH_CONFIG) for field, weight, _ in WEIGHTED_FIELDS
+    ))
+
+
+def update_search_vector(profile_id):
+    if connection.vendor == 'postgresql':
+        TrainerProfile.objects.filter(pk=profile_id).update(search_vector=search_vector())
+
+
+def search_trainers(q='', specialty='', country='', min_rating=None):
+    """
+    Active trainers matching the filters, annotated with ``relevance``
+    (0 when there is no free-text query).
+    """
+    trainers = TrainerProfile.objects.select_related('user').filter(user__is_active=True, user__role='trainer')
+    if specialty:
+        trainers = trainers.filter(specialties__icontains=specialty)
+    if country:
+        trainers = trainers.filter(user__country__iexact=country)
+    if min_rating is not None:
+        trainers = trainers.filter(rating__gte=min_rating)
+
+    if not q:
+        return trainers.annotate(relevance=Value(0.0, output_field=FloatField()))
+
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(q, search_type='websearch', config=SEARCH_CONFIG)
+        return trainers.filter(search_vector=query).annotate(relevance=SearchRank(F('search_vector'), query))
+
+    terms = q.split()
+    matches = [Q(**{f'{field}__icontains': term}) for term in terms for field, _, _ in WEIGHTED_FIELDS]
+    scores = [
+        Case(When(Q(**{f'{field}__icontains': term}), then=Value(score)), default=Value(0.0), output_field=FloatField())
+        for term in terms for field, _, score in WEIGHTED_FIELDS
+    ]
+    return trainers.filter(reduce(or_, matches)).annotate(relevance=reduce(add, scores))
@@ -1,5 +1,13 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import User, TrainerProfile, Subscription, Goal, Plan, DailyLog, Metric
+from rest_framework.settings import api_settings
+from . import adherence, daily_snapshots, goal_progress, latest_metrics, metric_archive, rollups
+from .models import (User, TrainerProfile, TrainerReview, Subscription, Goal, Plan, DailyLog, Metric, MetricRollup,
+                     ClientDailySnapshot, LatestMetric, Job, AdherenceStats)
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -58,14 +66,131 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 class GoalSerializer(serializers.ModelSerializer):
     class Meta:
         model = Goal
-        fields = ['id', 'user', 'description', 'target_value', 'target_date', 'status', 'created_at']
-        read_only_fields = ['created_at']
+        fields = [
+            'id', 'user', 'description', 'target_value', 'target_date', 'status',
+            'metric_type', 'target_numeric', 'direction',
+            'baseline_value', 'current_value', 'progress', 'trend_slope', 'projected_date', 'progress_updated_at',
+            'created_at', 'updated_at',
+        ]
+        read_only_fields = [
+            'baseline_value', 'current_value', 'progress', 'trend_slope', 'projected_date', 'progress_updated_at',
+            'created_at', 'updated_at',
+        ]
+
+    def validate(self, attrs):
+        # A tracked target needs all three of metric_type, target_numeric and direction.
+        tracked = {
+            field: attrs.get(field, getattr(self.instance, field, None))
+            for field in ('metric_type', 'target_numeric', 'direction')
+        }
+        given = [field for field, value in tracked.items() if value not in (None, '')]
+        if given and len(given) < len(tracked):
+            missing = [field for field in tracked if field not in given]
+            raise serializers.ValidationError({field: ['Required when tracking a metric target.'] for field in missing})
+        return attrs
 
 class PlanSerializer(serializers.ModelSerializer):
     class Meta:
         model = Plan
-        fields = ['id', 'user', 'trainer', 'date', 'nutrition_plan', 'exercise_plan', 'created_at']
-        read_only_fields = ['trainer', 'created_at']
+        fields = ['id', 'user', 'trainer', 'date', 'nutrition_plan', 'exercise_plan', 'created_at', 'updated_at']
+        read_only_fields = ['trainer', 'created_at', 'updated_at']
+
+
+class PlanBatchEntrySerializer(serializers.Serializer):
+    user           = serializers.IntegerField(source='user_id')
+    date           = serializers.DateField()
+    nutrition_plan = serializers.CharField()
+    exercise_plan  = serializers.CharField()
+
+
+class PlanTemplateSerializer(serializers.Serializer):
+    nutrition_plan = serializers.CharField()
+    exercise_plan  = serializers.CharField()
+
+
+class PlanBatchSerializer(serializers.Serializer):
+    """
+    Payload of ``POST /api/plans/batch/``: either explicit ``entries``, or a
+    ``template`` applied to each client in ``users`` for every day from
+    ``start_date`` to ``end_date``.
+
+    Entries are validated one by one and checked against the trainer's active
+    subscriptions in a single query. Rejected entries don't fail the batch;
+    they are collected in ``rejected`` with their position in the expanded
+    list. The rest are inserted by ``create`` in one transaction.
+    """
+    entries    = serializers.ListField(child=serializers.JSONField(), required=False, allow_empty=False)
+    template   = PlanTemplateSerializer(required=False)
+    users      = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+    start_date = serializers.DateField(required=False)
+    end_date   = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if ('entries' in attrs) == ('template' in attrs):
+            raise serializers.ValidationError("Provide either entries or a template.")
+
+        if 'template' in attrs:
+            missing = [name for name in ('users', 'start_date', 'end_date') if name not in attrs]
+            if missing:
+                raise serializers.ValidationError({name: ["Required with a template."] for name in missing})
+            if attrs['end_date'] < attrs['start_date']:
+                raise serializers.ValidationError({'end_date': ["Must not be before start_date."]})
+            days = (attrs['end_date'] - attrs['start_date']).days + 1
+            count = len(attrs['users']) * days
+        else:
+            count = len(attrs['entries'])
+
+        max_entries = settings.BULK_INGEST_MAX_ITEMS
+        if count > max_entries:
+            raise serializers.ValidationError(f"Ensure this batch has no more than {max_entries} entries.")
+
+        if 'template' in attrs:
+            raw = [
+                {'user': user_id, 'date': attrs['start_date'] + timedelta(days=offset), **attrs['template']}
+                for user_id in attrs['users'] for offset in range(days)
+            ]
+        else:
+            raw = attrs['entries']
+
+        self.rejected = []
+        valid = []
+        for index, item in enumerate(raw):
+            entry = PlanBatchEntrySerializer(data=item)
+            if entry.is_valid():
+                valid.append((index, entry.validated_data))
+            else:
+                self.rejected.append({'index': index, 'errors': entry.errors})
+
+        trainer = self.context['request'].user
+        clients = set(
+            Subscription.objects.filter(
+                trainer=trainer, status='active', client_id__in={item['user_id'] for _, item in valid},
+            ).values_list('client_id', flat=True)
+        )
+        accepted = []
+        for index, item in valid:
+            if item['user_id'] in clients:
+                accepted.append(item)
+            else:
+                self.rejected.append({'index': index, 'errors': {'user': ["Not an active client of this trainer."]}})
+        self.rejected.sort(key=lambda rejection: rejection['index'])
+        return {'entries': accepted}
+
+    def create(self, validated_data):
+        trainer = self.context['request'].user
+        plans = [Plan(trainer=trainer, **entry) for entry in validated_data['entries']]
+        with transaction.atomic():
+            Plan.objects.bulk_create(plans, batch_size=settings.BULK_INGEST_CHUNK_SIZE)
+            # bulk_create sends no signals.
+            today = timezone.localdate()
+            for user_id in {plan.user_id for plan in plans if plan.date == today}:
+                daily_snapshots.refresh(user_id, ['plans'])
+            dates_by_user = {}
+            for plan in plans:
+                dates_by_user.setdefault(plan.user_id, []).append(plan.date)
+            adherence.refresh_many(dates_by_user)
+        return plans
+
 
 class DailyLogSerializer(serializers.ModelSerializer):
     class Meta:
@@ -76,3 +201,352 @@ class MetricSerializer(serializers.ModelSerializer):
     class Meta:
         model = Metric
         fields = ['id', 'user', 'type', 'value', 'recorded_at']
+
+    def validate(self, attrs):
+        # An archived block can't tell a resent sample from a new one.
+        user, type, recorded_at = (attrs.get(field, getattr(self.instance, field, None))
+                                   for field in ('user', 'type', 'recorded_at'))
+        if metric_archive.in_archived_month(user.pk, [(type, recorded_at)])[0]:
+            raise serializers.ValidationError({'recorded_at': ["This month is archived."]})
+        return attrs
+
+
+class ClientDailySnapshotSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ClientDailySnapshot
+        fields = ['date', 'plans', 'daily_logs', 'open_goals', 'latest_metrics', 'updated_at']
+        read_only_fields = fields
+
+
+class ListFilterSerializer(serializers.Serializer):
+    """
+    Query-string filters of a list endpoint (see ``users.filters``).
+    ``Meta.lookups`` maps each field to the ORM lookup it filters on; when
+    ``range_field`` is set, ``from``/``to`` bound ``Meta.range_lookup``.
+    """
+    range_field = None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.range_field is not None:
+            fields['from'] = self.range_field(required=False)
+            fields['to']   = self.range_field(required=False)
+        return fields
+
+    def validate(self, attrs):
+        if 'from' in attrs and 'to' in attrs and attrs['from'] > attrs['to']:
+            raise serializers.ValidationError({'to': ["Must not be before from."]})
+        return attrs
+
+    def filter_queryset(self, queryset):
+        lookups = dict(self.Meta.lookups)
+        if self.range_field is not None:
+            lookups['from'] = f'{self.Meta.range_lookup}__gte'
+            lookups['to']   = f'{self.Meta.range_lookup}__lte'
+        return queryset.filter(**{lookups[name]: value for name, value in self.validated_data.items()})
+
+
+class MetricFilterSerializer(ListFilterSerializer):
+    """``GET /api/metrics/?type=&user=&from=&to=`` (ISO datetimes)."""
+    range_field = serializers.DateTimeField
+    type = serializers.CharField(max_length=50, required=False)
+    user = serializers.IntegerField(required=False)
+
+    class Meta:
+        lookups = {'type': 'type', 'user': 'user_id'}
+        range_lookup = 'recorded_at'
+
+
+class DailyLogFilterSerializer(ListFilterSerializer):
+    """``GET /api/daily-logs/?plan=&user=&from=&to=`` (dates)."""
+    range_field = serializers.DateField
+    plan = serializers.IntegerField(required=False)
+    user = serializers.IntegerField(required=False)
+
+    class Meta:
+        lookups = {'plan': 'plan_id', 'user': 'user_id'}
+        range_lookup = 'date'
+
+
+class PlanFilterSerializer(ListFilterSerializer):
+    """``GET /api/plans/?user=&from=&to=`` (dates)."""
+    range_field = serializers.DateField
+    user = serializers.IntegerField(required=False)
+
+    class Meta:
+        lookups = {'user': 'user_id'}
+        range_lookup = 'date'
+
+
+class MetricSeriesQuerySerializer(serializers.Serializer):
+    """Validates the query string of ``GET /api/metrics/series/``."""
+    type   = serializers.CharField(max_length=50)
+    bucket = serializers.ChoiceField(choices=MetricRollup.BUCKET_CHOICES, default='day')
+    user   = serializers.IntegerField(required=False)
+
+    def get_fields(self):
+        # ``from``/``to`` are Python keywords, so they can't be declared above.
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        fields['to']   = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        if 'from' in attrs and 'to' in attrs and attrs['from'] > attrs['to']:
+            raise serializers.ValidationError("'from' must not be after 'to'.")
+        return attrs
+
+class LatestMetricSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LatestMetric
+        fields = ['type', 'value', 'recorded_at']
+
+
+class LatestMetricQuerySerializer(serializers.Serializer):
+    """Validates the query string of ``GET /api/metrics/latest/``."""
+    user = serializers.IntegerField(required=False)
+    type = serializers.ListField(child=serializers.CharField(max_length=50), required=False)
+
+
+class MetricRollupSerializer(serializers.ModelSerializer):
+    avg = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = MetricRollup
+        fields = ['bucket_start', 'count', 'min_value', 'max_value', 'avg']
+
+
+class BulkUpsertListSerializer(serializers.ListSerializer):
+    """
+    List serializer for the bulk ingestion endpoints.
+
+    Items are validated one by one; invalid items don't fail the batch but are
+    collected in ``item_errors`` with their position in the request. Valid
+    items are upserted for the requesting user on the child's natural key
+    (``Meta.upsert_fields``) with chunked ``bulk_create`` calls.
+    """
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list):
+            message = self.error_messages['not_a_list'].format(input_type=type(data).__name__)
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='not_a_list')
+        if not data:
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [self.error_messages['empty']]}, code='empty')
+        if self.max_length is not None and len(data) > self.max_length:
+            message = self.error_messages['max_length'].format(max_length=self.max_length)
+            raise serializers.ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]}, code='max_length')
+
+        self.item_errors = []
+        valid = []
+        for index, item in enumerate(data):
+            try:
+                valid.append((index, self.run_child_validation(item)))
+            except serializers.ValidationError as exc:
+                self.item_errors.append({'index': index, 'errors': exc.detail})
+
+        valid = self.validate_items(valid)
+        self.item_errors.sort(key=lambda error: error['index'])
+        return [item for _, item in valid]
+
+    def validate_items(self, items):
+        """
+        Hook for checks that need one query over the whole batch. Receives
+        ``(index, validated_item)`` pairs and returns the ones that pass,
+        recording the rest in ``item_errors``.
+        """
+        return items
+
+    def create(self, validated_data):
+        user   = self.context['request'].user
+        meta   = self.child.Meta
+        unique = list(meta.upsert_fields)
+
+        # Last occurrence wins when a key repeats inside one request; a single
+        # upsert statement can't touch the same row twice.
+        latest = {tuple(item[f] for f in unique): item for item in validated_data}
+        objs = [meta.model(user=user, **item) for item in latest.values()]
+        update_fields = [field.source for field in self.child.fields.values() if field.source not in unique]
+
+        chunk_size = settings.BULK_INGEST_CHUNK_SIZE
+        with transaction.atomic():
+            for start in range(0, len(objs), chunk_size):
+                meta.model.objects.bulk_create(
+                    objs[start:start + chunk_size],
+                    update_conflicts=True,
+                    unique_fields=['user', *unique],
+                    update_fields=update_fields,
+                )
+            self.after_upsert(user, objs)
+        return objs
+
+    def after_upsert(self, user, objs):
+        """Keep derived data in step; ``bulk_create`` sends no signals."""
+
+
+class MetricBulkListSerializer(BulkUpsertListSerializer):
+    def after_upsert(self, user, objs):
+        if objs:
+            stamps = [obj.recorded_at for obj in objs]
+            rollups.rebuild(user.pk, {obj.type for obj in objs}, min(stamps), max(stamps))
+            newest = {}
+            for obj in objs:
+                if obj.type not in newest or obj.recorded_at > newest[obj.type].recorded_at:
+                    newest[obj.type] = obj
+            for obj in newest.values():
+                latest_metrics.record(obj)
+            # Upserts may overwrite history, so goal progress is rebuilt rather than folded in.
+            goal_progress.refresh(user.pk, newest.keys())
+            daily_snapshots.refresh(user.pk, ['latest_metrics', 'open_goals'])
+
+    def validate_items(self, items):
+        archived = metric_archive.in_archived_month(
+            self.context['request'].user.pk, [(item['type'], item['recorded_at']) for _, item in items],
+        )
+        valid = []
+        for (index, item), in_archive in zip(items, archived):
+            if in_archive:
+                self.item_errors.append({'index': index, 'errors': {'recorded_at': ["This month is archived."]}})
+            else:
+                valid.append((index, item))
+        return valid
+
+
+class MetricBulkItemSerializer(serializers.Serializer):
+    type        = serializers.CharField(max_length=50)
+    value       = serializers.FloatField()
+    recorded_at = serializers.DateTimeField()
+
+    class Meta:
+        model = Metric
+        upsert_fields = ['type', 'recorded_at']
+        list_serializer_class = MetricBulkListSerializer
+
+
+class DailyLogBulkListSerializer(BulkUpsertListSerializer):
+    def after_upsert(self, user, objs):
+        if any(obj.date == timezone.localdate() for obj in objs):
+            daily_snapshots.refresh(user.pk, ['daily_logs'])
+        adherence.refresh(user.pk, [obj.date for obj in objs])
+
+    def validate_items(self, items):
+        requested = {item['plan_id'] for _, item in items}
+        owned = set(
+            Plan.objects.filter(user=self.context['request'].user, id__in=requested).values_list('id', flat=True)
+        )
+        valid = []
+        for index, item in items:
+            if item['plan_id'] in owned:
+                valid.append((index, item))
+            else:
+                self.item_errors.append({'index': index, 'errors': {'plan': ["Plan not found."]}})
+        return valid
+
+
+class DailyLogBulkItemSerializer(serializers.Serializer):
+    plan                  = serializers.IntegerField(source='plan_id')
+    date                  = serializers.DateField()
+    actual_nutrition      = serializers.CharField(allow_blank=True)
+    actual_exercise       = serializers.CharField(allow_blank=True)
+    completion_percentage = serializers.FloatField(min_value=0, max_value=100)
+    notes                 = serializers.CharField(allow_blank=True, required=False, default='')
+
+    class Meta:
+        model = DailyLog
+        upsert_fields = ['plan_id', 'date']
+        list_serializer_class = DailyLogBulkListSerializer
+
+
+class AdherenceSerializer(serializers.Serializer):
+    """Reads ``adherence.summary()`` of an ``AdherenceStats``."""
+    mean_7         = serializers.FloatField(allow_null=True)
+    mean_30        = serializers.FloatField(allow_null=True)
+    mean_90        = serializers.FloatField(allow_null=True)
+    current_streak = serializers.IntegerField()
+    longest_streak = serializers.IntegerField()
+    updated_at     = serializers.DateTimeField()
+
+    def to_representation(self, stats):
+        return super().to_representation(adherence.summary(stats))
+
+
+class RosterEntrySerializer(serializers.Serializer):
+    """
+    One active client on a trainer's roster. Reads the annotations and
+    prefetches set up by ``TrainerViewSet.roster`` on a ``Subscription``.
+    """
+    subscription               = serializers.IntegerField(source='id')
+    client                     = UserSerializer()
+    latest_goal                = serializers.SerializerMethodField()
+    todays_plan                = serializers.SerializerMethodField()
+    last_completion_percentage = serializers.FloatField(source='last_completion', allow_null=True)
+    last_log_date              = serializers.DateField(allow_null=True)
+    latest_weight              = serializers.FloatField(allow_null=True)
+    latest_weight_at           = serializers.DateTimeField(allow_null=True)
+    adherence                  = serializers.SerializerMethodField()
+
+    def get_adherence(self, subscription):
+        try:
+            return AdherenceSerializer(subscription.client.adherence).data
+        except AdherenceStats.DoesNotExist:
+            return None
+
+    def get_latest_goal(self, subscription):
+        goals = subscription.client.latest_goals
+        return GoalSerializer(goals[0]).data if goals else None
+
+    def get_todays_plan(self, subscription):
+        plans = subscription.client.todays_plans
+        return PlanSerializer(plans[0]).data if plans else None
+
+
+class TrainerSearchQuerySerializer(serializers.Serializer):
+    """Validates the query string of ``GET /api/trainers/search/``."""
+    q          = serializers.CharField(required=False, allow_blank=True, max_length=200, default='')
+    specialty  = serializers.CharField(required=False, allow_blank=True, max_length=100, default='')
+    country    = serializers.CharField(required=False, allow_blank=True, max_length=100, default='')
+    min_rating = serializers.FloatField(required=False, min_value=0, max_value=5)
+
+class TrainerSearchResultSerializer(serializers.ModelSerializer):
+    name      = serializers.CharField(source='user.name', read_only=True)
+    country   = serializers.CharField(source='user.country', read_only=True)
+    relevance = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = TrainerProfile
+        fields = ['id', 'user', 'name', 'country', 'bio', 'certifications', 'specialties', 'rating', 'rating_count',
+                  'relevance']
+
+
+class TrainerReviewSerializer(serializers.ModelSerializer):
+    client   = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    reviewer = serializers.PrimaryKeyRelatedField(source='client', read_only=True)
+    trainer  = serializers.PrimaryKeyRelatedField(queryset=User.objects.filter(role='trainer'))
+
+    class Meta:
+        model = TrainerReview
+        fields = ['id', 'trainer', 'client', 'reviewer', 'rating', 'comment', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            if 'trainer' in attrs and attrs['trainer'] != self.instance.trainer:
+                raise serializers.ValidationError({'trainer': ["A review can't be moved to another trainer."]})
+            return attrs
+        if not Subscription.objects.filter(client=attrs['client'], trainer=attrs['trainer']).exists():
+            raise serializers.ValidationError("You can only review trainers you have subscribed to.")
+        return attrs
+
+
+class RollupRebuildSerializer(serializers.Serializer):
+    """Body of ``POST /api/metrics/rollups/rebuild/``."""
+    user  = serializers.IntegerField(required=False)
+    types = serializers.ListField(child=serializers.CharField(max_length=50), required=False, allow_empty=False)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'result', 'last_error',
+                  'created_at', 'finished_at']
+        read_only_fields = fields
+
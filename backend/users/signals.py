@@ -0,0 +1,142 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import adherence, daily_snapshots, goal_progress, latest_metrics, rollups
+from .authentication import get_snapshot_cache
+from .models import DailyLog, Goal, Metric, Plan, TrainerProfile, User
+from .search import update_search_vector
+
+
+@receiver(pre_save, sender=Metric)
+def remember_metric_position(sender, instance, **kwargs):
+    # Needed to fix up the bucket a metric is moved out of on update.
+    instance._previous_position = None
+    if instance.pk:
+        instance._previous_position = (
+            Metric.objects.filter(pk=instance.pk).values('user_id', 'type', 'recorded_at').first()
+        )
+
+
+@receiver(post_save, sender=Metric)
+def update_metric_rollups(sender, instance, created, **kwargs):
+    if created:
+        rollups.record_metric(instance)
+        return
+    previous = getattr(instance, '_previous_position', None)
+    if previous:
+        rollups.rebuild(previous['user_id'], [previous['type']], previous['recorded_at'], previous['recorded_at'])
+    rollups.rebuild(instance.user_id, [instance.type], instance.recorded_at, instance.recorded_at)
+
+
+@receiver(post_delete, sender=Metric)
+def remove_metric_from_rollups(sender, instance, **kwargs):
+    rollups.rebuild(instance.user_id, [instance.type], instance.recorded_at, instance.recorded_at)
+
+
+@receiver(post_save, sender=Metric)
+def update_latest_metric(sender, instance, created, **kwargs):
+    if created:
+        latest_metrics.record(instance)
+        return
+    # An edit may move the latest metric back in time or to another type.
+    previous = getattr(instance, '_previous_position', None)
+    if previous and (previous['user_id'], previous['type']) != (instance.user_id, instance.type):
+        latest_metrics.recompute(previous['user_id'], previous['type'])
+    latest_metrics.recompute(instance.user_id, instance.type)
+
+
+@receiver(post_delete, sender=Metric)
+def remove_latest_metric(sender, instance, **kwargs):
+    latest_metrics.forget(instance)
+
+
+@receiver(post_save, sender=Metric)
+def update_goal_progress(sender, instance, created, **kwargs):
+    if created:
+        goal_progress.record_metric(instance)
+        return
+    previous = getattr(instance, '_previous_position', None)
+    if previous and (previous['user_id'], previous['type']) != (instance.user_id, instance.type):
+        goal_progress.refresh(previous['user_id'], [previous['type']])
+    goal_progress.refresh(instance.user_id, [instance.type])
+
+
+@receiver(post_delete, sender=Metric)
+def remove_metric_from_goal_progress(sender, instance, **kwargs):
+    goal_progress.refresh(instance.user_id, [instance.type])
+
+
+@receiver(post_save, sender=Goal)
+def recompute_goal_progress(sender, instance, **kwargs):
+    # Registered before refresh_snapshot_goals so the snapshot sees the new progress.
+    if goal_progress.is_typed(instance) or instance.progress_state is not None:
+        goal_progress.recompute(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def evict_user_snapshot(sender, instance, **kwargs):
+    get_snapshot_cache().delete(instance.pk)
+
+
+@receiver(post_save, sender=TrainerProfile)
+def refresh_trainer_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'bio', 'certifications', 'specialties'} & set(update_fields):
+        update_search_vector(instance.pk)
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def refresh_snapshot_plans(sender, instance, created=False, **kwargs):
+    # An edit may move a plan off today, so only new rows are skipped by date.
+    if not created or instance.date == timezone.localdate():
+        daily_snapshots.refresh(instance.user_id, ['plans'])
+
+
+@receiver(post_save, sender=DailyLog)
+@receiver(post_delete, sender=DailyLog)
+def refresh_snapshot_daily_logs(sender, instance, created=False, **kwargs):
+    if not created or instance.date == timezone.localdate():
+        daily_snapshots.refresh(instance.user_id, ['daily_logs'])
+
+
+@receiver(pre_save, sender=Plan)
+@receiver(pre_save, sender=DailyLog)
+def remember_adherence_day(sender, instance, **kwargs):
+    # An edit may move a plan or log to another day, which then needs recounting.
+    instance._previous_day = None
+    if instance.pk:
+        instance._previous_day = sender.objects.filter(pk=instance.pk).values('user_id', 'date').first()
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_save, sender=DailyLog)
+def update_adherence(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_day', None)
+    if previous and previous['user_id'] != instance.user_id:
+        adherence.refresh(previous['user_id'], [previous['date']], create=False)
+    days = [instance.date]
+    if previous and previous['user_id'] == instance.user_id:
+        days.append(previous['date'])
+    adherence.refresh(instance.user_id, days)
+
+
+@receiver(post_delete, sender=Plan)
+@receiver(post_delete, sender=DailyLog)
+def remove_from_adherence(sender, instance, **kwargs):
+    adherence.refresh(instance.user_id, [instance.date], create=False)
+
+
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+def refresh_snapshot_goals(sender, instance, **kwargs):
+    daily_snapshots.refresh(instance.user_id, ['open_goals'])
+
+
+@receiver(post_save, sender=Metric)
+@receiver(post_delete, sender=Metric)
+def refresh_snapshot_metrics(sender, instance, **kwargs):
+    # Open goals carry their progress, which follows the metrics.
+    daily_snapshots.refresh(instance.user_id, ['latest_metrics', 'open_goals'])
+
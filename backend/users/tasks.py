@@ -0,0 +1,9 @@
+"""Background tasks (see ``users.jobs``); imported by ``UsersConfig.ready`` to register them."""
+from . import rollups
+from .jobs import task
+
+
+@task(name='rollups.rebuild')
+def rebuild_metric_rollups(user_id=None, types=None):
+    rollups.rebuild(user_id=user_id, types=types)
+    return {'user_id': user_id, 'types': types}
@@ -0,0 +1,60 @@
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.authentication import get_snapshot_cache
+from users.models import User
+
+
+def auth_header(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        get_snapshot_cache().clear()
+        self.user = User.objects.create_user(email='auth@x.com', password='pw', role='client')
+        self.url = reverse('subscription-list')
+
+    def test_second_request_skips_user_lookup(self):
+        self.client.get(self.url, **auth_header(self.user))
+        # Only the subscription list query remains.
+        with self.assertNumQueries(1):
+            resp = self.client.get(self.url, **auth_header(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_role_change_is_seen_immediately(self):
+        self.client.get(self.url, **auth_header(self.user))
+        self.user.role = 'trainer'
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('trainer-roster'), **auth_header(self.user)).status_code,
+                         status.HTTP_200_OK)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(self.url, **auth_header(self.user))
+        self.user.is_active = False
+        self.user.save()
+        resp = self.client.get(self.url, **auth_header(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_partial_user_saves_only_changed_fields(self):
+        self.client.get(self.url, **auth_header(self.user))
+        User.objects.filter(pk=self.user.pk).update(name='Ada')
+        resp = self.client.patch(reverse('user-upload-profile-picture'), {'profilePictureUrl': 'https://x/p.png'},
+                                 format='json', **auth_header(self.user))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.name, self.user.profilePictureUrl), ('Ada', 'https://x/p.png'))
+
+    @override_settings(
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+        JWT_USER_CACHE={'MAXSIZE': 1, 'TTL': 60, 'CACHE_ALIAS': 'default'},
+    )
+    def test_shared_cache_backs_the_local_lru(self):
+        other = User.objects.create_user(email='auth2@x.com', password='pw', role='client')
+        self.client.get(self.url, **auth_header(self.user))
+        self.client.get(self.url, **auth_header(other))  # evicts self.user from the one-slot LRU
+        with self.assertNumQueries(1):
+            self.client.get(self.url, **auth_header(self.user))
@@ -0,0 +1,29 @@
+from django.test import TestCase
+
+from users import benchmark
+
+
+class BenchmarkTests(TestCase):
+    def test_every_route_has_a_scenario(self):
+        self.assertEqual(benchmark.uncovered_routes(), [])
+
+    def test_scenarios_run_cleanly_on_a_small_seed(self):
+        ctx = benchmark.seed(trainers=2, clients=3, metrics=4)
+        results = benchmark.run(ctx, iterations=2, warmup=1)
+        self.assertEqual(set(results), {scenario.name for scenario in benchmark.SCENARIOS})
+        failed = {name: result['status_codes'] for name, result in results.items() if result['errors']}
+        self.assertEqual(failed, {})
+        # One page of raw rows plus the archive blocks it could merge with.
+        self.assertEqual(results['metrics.list']['queries'], 2)
+
+    def test_compare_flags_extra_queries_and_slowdowns(self):
+        baseline = {'a': {'queries': 2, 'p95_ms': 10.0}, 'b': {'queries': 1, 'p95_ms': 10.0}}
+        results = {
+            'a': {'queries': 3, 'p95_ms': 10.5},
+            'b': {'queries': 1, 'p95_ms': 20.0},
+            'c': {'queries': 9, 'p95_ms': 99.0},
+        }
+        self.assertEqual(benchmark.compare(results, baseline), [
+            "a: 2 -> 3 queries",
+            "b: p95 10.00 -> 20.00 ms",
+        ])
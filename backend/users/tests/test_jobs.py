@@ -0,0 +1,112 @@
+import io
+from datetime import timedelta
+
+from django.conf import settings
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from users import jobs
+from users.models import Job
+
+calls = []
+
+
+@jobs.task(name='tests.flaky', max_attempts=3, backoff=10)
+def flaky(fail_times=0):
+    calls.append(fail_times)
+    if len(calls) <= fail_times:
+        raise RuntimeError(f"boom {len(calls)}")
+    return {'calls': len(calls)}
+
+
+class BrokerContractMixin:
+    """Behaviour both brokers must share."""
+
+    def setUp(self):
+        calls.clear()
+        self.broker = jobs.get_broker()
+
+    def make_due(self, job):
+        job.run_at = timezone.now() - timedelta(seconds=1)
+        if job.pk and isinstance(self.broker, jobs.DatabaseBroker):
+            Job.objects.filter(pk=job.pk).update(run_at=job.run_at)
+
+    def test_success_stores_the_result(self):
+        job = flaky.delay()
+        self.assertEqual(jobs.run_pending(), 1)
+        job = self.broker.get(job.pk)
+        self.assertEqual((job.status, job.attempts, job.result), ('succeeded', 1, {'calls': 1}))
+
+    def test_failures_retry_with_backoff_then_give_up(self):
+        job = flaky.delay(fail_times=5)
+        before = timezone.now()
+        with self.assertLogs('users.jobs', 'ERROR'):
+            jobs.run_pending()
+        job = self.broker.get(job.pk)
+        self.assertEqual((job.status, job.attempts, job.last_error), ('queued', 1, 'RuntimeError: boom 1'))
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=10))
+        self.assertEqual(jobs.run_pending(), 0)  # not due yet
+
+        self.make_due(job)
+        with self.assertLogs('users.jobs', 'ERROR'):
+            jobs.run_pending()
+        job = self.broker.get(job.pk)
+        self.assertGreaterEqual(job.run_at, before + timedelta(seconds=20))
+
+        self.make_due(job)
+        with self.assertLogs('users.jobs', 'ERROR'):
+            jobs.run_pending()
+        job = self.broker.get(job.pk)
+        self.assertEqual((job.status, job.attempts), ('failed', 3))
+        self.assertEqual(len(calls), 3)
+
+    def test_unknown_tasks_are_rejected_at_enqueue(self):
+        with self.assertRaises(LookupError):
+            jobs.enqueue('tests.missing')
+
+
+@override_settings(JOBS={**settings.JOBS, 'BROKER': 'users.jobs.InMemoryBroker'})
+class InMemoryBrokerTests(BrokerContractMixin, TestCase):
+    pass
+
+
+@override_settings(JOBS={**settings.JOBS, 'BROKER': 'users.jobs.DatabaseBroker'})
+class DatabaseBrokerTests(BrokerContractMixin, TestCase):
+    def test_a_job_is_claimed_once_and_expired_leases_are_reclaimed(self):
+        job = flaky.delay()
+        self.assertEqual(self.broker.claim('a').pk, job.pk)
+        self.assertIsNone(self.broker.claim('b'))
+
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        reclaimed = self.broker.claim('b')
+        self.assertEqual((reclaimed.pk, reclaimed.locked_by, reclaimed.attempts), (job.pk, 'b', 2))
+
+    def test_expired_leases_give_up_after_max_attempts(self):
+        job = flaky.delay()
+        for worker in ('a', 'b', 'c'):
+            self.assertEqual(self.broker.claim(worker).pk, job.pk)
+            Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertIsNone(self.broker.claim('d'))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('failed', 3, "Lease expired."))
+
+    def test_a_run_that_lost_its_lease_keeps_its_outcome_to_itself(self):
+        flaky.delay()
+        stale = self.broker.claim('a')
+        Job.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        current = self.broker.claim('b')
+
+        with self.assertLogs('users.jobs', 'WARNING'):
+            self.broker.succeed(stale, {'stale': True})
+            self.broker.fail(stale, "RuntimeError: stale")
+        self.broker.succeed(current, {'calls': 1})
+        job = Job.objects.get(pk=current.pk)
+        self.assertEqual((job.status, job.result, job.locked_by), ('succeeded', {'calls': 1}, 'b'))
+
+    def test_worker_command_drains_the_queue(self):
+        flaky.delay()
+        flaky.delay()
+        call_command('run_worker', '--once', stdout=io.StringIO())
+        self.assertEqual(Job.objects.filter(status='succeeded').count(), 2)
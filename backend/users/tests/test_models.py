@@ -0,0 +1,331 @@
+import io
+from datetime import date, datetime, timedelta, timezone
+from unittest import mock, skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from django.utils.timezone import localdate
+
+from users import adherence, goal_progress, latest_metrics, metric_archive, rollups
+from users.models import (AdherenceStats, DailyLog, Goal, LatestMetric, Metric, MetricArchiveBlock, MetricRollup, Plan, Subscription,
+                          User)
+
+
+def at(day, hour=12):
+    return datetime(2025, 3, day, hour, tzinfo=timezone.utc)
+
+
+class MetricRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='roll@x.com', password='pw', role='client')
+
+    def rollup(self, bucket, start):
+        return MetricRollup.objects.get(user=self.user, type='weight', bucket=bucket, bucket_start=start)
+
+    def test_bucket_boundaries(self):
+        self.assertEqual(rollups.bucket_start(at(5), 'week'), date(2025, 3, 3))
+        self.assertEqual(rollups.bucket_start(at(5), 'month'), date(2025, 3, 1))
+        self.assertEqual(rollups.next_bucket(date(2025, 12, 1), 'month'), date(2026, 1, 1))
+
+    def test_create_folds_into_every_bucket(self):
+        Metric.objects.create(user=self.user, type='weight', value=80, recorded_at=at(3))
+        Metric.objects.create(user=self.user, type='weight', value=78, recorded_at=at(4))
+
+        week = self.rollup('week', date(2025, 3, 3))
+        self.assertEqual((week.count, week.min_value, week.max_value, week.avg), (2, 78, 80, 79))
+        self.assertEqual(self.rollup('day', date(2025, 3, 4)).count, 1)
+        self.assertEqual(self.rollup('month', date(2025, 3, 1)).total, 158)
+
+    def test_update_and_delete_recompute_affected_buckets(self):
+        low = Metric.objects.create(user=self.user, type='weight', value=70, recorded_at=at(3))
+        Metric.objects.create(user=self.user, type='weight', value=80, recorded_at=at(3, 15))
+
+        low.recorded_at = at(10)
+        low.save()
+        self.assertEqual(self.rollup('day', date(2025, 3, 3)).min_value, 80)
+        self.assertEqual(self.rollup('day', date(2025, 3, 10)).count, 1)
+
+        low.delete()
+        self.assertFalse(MetricRollup.objects.filter(bucket='day', bucket_start=date(2025, 3, 10)).exists())
+        self.assertEqual(self.rollup('month', date(2025, 3, 1)).count, 1)
+
+    def test_rebuild_matches_incremental_maintenance(self):
+        for day, value in [(1, 81), (2, 80.5), (9, 79), (31, 77)]:
+            Metric.objects.create(user=self.user, type='weight', value=value, recorded_at=at(day))
+        incremental = set(MetricRollup.objects.values_list('bucket', 'bucket_start', 'count', 'total', 'min_value', 'max_value'))
+
+        rollups.rebuild()
+        rebuilt = set(MetricRollup.objects.values_list('bucket', 'bucket_start', 'count', 'total', 'min_value', 'max_value'))
+        self.assertEqual(incremental, rebuilt)
+
+
+class LatestMetricTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='latest@x.com', password='pw', role='client')
+
+    def latest(self, type='weight'):
+        row = LatestMetric.objects.filter(user=self.user, type=type).values_list('value', 'recorded_at').first()
+        return row and (row[0], row[1].day)
+
+    def test_only_newer_metrics_replace_the_latest(self):
+        Metric.objects.create(user=self.user, type='weight', value=80, recorded_at=at(5))
+        Metric.objects.create(user=self.user, type='weight', value=82, recorded_at=at(2))
+        self.assertEqual(self.latest(), (80, 5))
+        Metric.objects.create(user=self.user, type='weight', value=79, recorded_at=at(6))
+        self.assertEqual(self.latest(), (79, 6))
+        self.assertEqual(LatestMetric.objects.count(), 1)
+
+    def test_delete_and_edit_fall_back_to_the_next_newest(self):
+        old = Metric.objects.create(user=self.user, type='weight', value=82, recorded_at=at(2))
+        new = Metric.objects.create(user=self.user, type='weight', value=80, recorded_at=at(5))
+
+        old.delete()
+        self.assertEqual(self.latest(), (80, 5))
+        Metric.objects.create(user=self.user, type='weight', value=81, recorded_at=at(3))
+        new.type = 'bodyfat'
+        new.save()
+        self.assertEqual(self.latest(), (81, 3))
+        self.assertEqual(self.latest('bodyfat'), (80, 5))
+
+        Metric.objects.filter(user=self.user, type='weight').get().delete()
+        self.assertIsNone(self.latest())
+
+
+class GoalProgressTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='progress@x.com', password='pw', role='client')
+        goal = Goal.objects.create(user=self.user, description='Cut', target_value='80 kg', target_date='2025-06-01',
+                                   status='open', metric_type='weight', target_numeric=80, direction='decrease')
+        Goal.objects.filter(pk=goal.pk).update(created_at=at(10))
+
+    def goal(self):
+        return Goal.objects.get(user=self.user)
+
+    def weigh(self, day, value):
+        return Metric.objects.create(user=self.user, type='weight', value=value, recorded_at=at(day))
+
+    def test_incremental_updates_match_a_full_recompute(self):
+        for day, value in [(8, 90), (12, 88), (14, 86), (16, 84), (3, 95)]:
+            self.weigh(day, value)
+        goal = self.goal()
+        self.assertEqual((goal.baseline_value, goal.current_value, goal.progress), (90, 84, 60))
+        self.assertAlmostEqual(goal.trend_slope, -26 / 35)
+        self.assertEqual(goal.projected_date, date(2025, 3, 21))
+
+        goal_progress.recompute(goal)
+        rebuilt = self.goal()
+        for field in ('baseline_value', 'current_value', 'progress', 'trend_slope', 'projected_date'):
+            self.assertAlmostEqual(getattr(rebuilt, field), getattr(goal, field))
+        for key in ('n', 'sx', 'sy', 'sxx', 'sxy'):
+            self.assertAlmostEqual(rebuilt.progress_state[key], goal.progress_state[key])
+
+    def test_baseline_moves_with_history_edits(self):
+        late = self.weigh(12, 88)
+        self.assertEqual((self.goal().baseline_value, self.goal().progress), (88, 0))
+        self.weigh(9, 90)
+        self.assertEqual((self.goal().baseline_value, self.goal().progress), (90, 20))
+        self.assertEqual(self.goal().projected_date, date(2025, 3, 24))
+
+        late.value = 92
+        late.save()
+        self.assertEqual(self.goal().progress, 0)
+        late.delete()
+        self.assertEqual((self.goal().current_value, self.goal().trend_slope), (90, None))
+
+    def test_a_value_before_a_post_goal_baseline_becomes_the_baseline(self):
+        self.weigh(12, 90)
+        self.weigh(11, 100)
+        goal = self.goal()
+        self.assertEqual((goal.baseline_value, goal.current_value, goal.progress_state['n']), (100, 90, 2))
+
+    def test_other_series_and_untyped_goals_are_left_alone(self):
+        Metric.objects.create(user=self.user, type='bodyfat', value=20, recorded_at=at(12))
+        self.assertIsNone(self.goal().progress_state)
+
+        self.weigh(12, 88)
+        goal = self.goal()
+        goal.metric_type, goal.target_numeric, goal.direction = '', None, ''
+        goal.save()
+        goal = self.goal()
+        self.assertEqual((goal.progress, goal.progress_state), (None, None))
+
+
+class MetricArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='archive@x.com', password='pw', role='client')
+        # Ten hours of per-minute heart rate in January, one reading in March.
+        Metric.objects.bulk_create(
+            Metric(user=self.user, type='hr', value=60 + minute % 7 + 0.25, recorded_at=at(1, 8).replace(month=1) + timedelta(minutes=minute))
+            for minute in range(600)
+        )
+        Metric.objects.create(user=self.user, type='hr', value=70, recorded_at=at(2))
+        rollups.rebuild()
+
+    def test_encoding_round_trips_to_three_decimals(self):
+        points = [metric_archive.Point(1_700_000_000, 81.2346, 3), metric_archive.Point(1_700_003_600, -2.5, 1),
+                  metric_archive.Point(1_700_007_200, 1e6, 12)]
+        decoded = metric_archive.decode(metric_archive.encode(points))
+        self.assertEqual([(p.timestamp, p.count) for p in decoded], [(p.timestamp, p.count) for p in points])
+        for archived, original in zip(decoded, points):
+            self.assertAlmostEqual(archived.value, original.value, delta=0.5 / metric_archive.SCALE)
+
+    def test_old_months_are_compacted_and_still_counted(self):
+        january = MetricRollup.objects.get(user=self.user, type='hr', bucket='month', bucket_start=date(2025, 1, 1))
+
+        self.assertEqual(metric_archive.archive(at(5)), (600, 1))
+        self.assertEqual(Metric.objects.filter(user=self.user).count(), 1)
+        block = MetricArchiveBlock.objects.get(user=self.user)
+        self.assertEqual((block.samples, block.points, block.resolution), (600, 10, 3600))
+        # Order-of-magnitude smaller than the ~100+ bytes a raw row and its index entries take.
+        self.assertLess(len(block.data) / block.samples, 1)
+
+        rollups.rebuild()
+        rebuilt = MetricRollup.objects.get(user=self.user, type='hr', bucket='month', bucket_start=date(2025, 1, 1))
+        self.assertEqual(rebuilt.count, 600)
+        self.assertAlmostEqual(rebuilt.avg, january.avg, places=3)
+
+        Metric.objects.filter(user=self.user).delete()
+        latest_metrics.recompute(self.user.pk, 'hr')
+        self.assertEqual(LatestMetric.objects.get(user=self.user).recorded_at, datetime(2025, 1, 1, 17, tzinfo=timezone.utc))
+
+    def test_late_samples_fold_into_the_existing_block(self):
+        metric_archive.archive(at(5))
+        Metric.objects.create(user=self.user, type='hr', value=100, recorded_at=datetime(2025, 1, 20, tzinfo=timezone.utc))
+        self.assertEqual(metric_archive.archive(at(5)), (1, 1))
+        block = MetricArchiveBlock.objects.get(user=self.user)
+        self.assertEqual((block.samples, block.points), (601, 11))
+
+    def test_raw_rows_in_an_archived_month_can_be_edited_and_deleted(self):
+        metric_archive.archive(at(5))
+        late = Metric.objects.create(user=self.user, type='hr', value=100, recorded_at=datetime(2025, 1, 20, tzinfo=timezone.utc))
+        january = dict(user=self.user, type='hr', bucket='month', bucket_start=date(2025, 1, 1))
+
+        late.value = 40
+        late.save()
+        rollup = MetricRollup.objects.get(**january)
+        self.assertEqual((rollup.count, rollup.min_value), (601, 40))
+
+        late.delete()
+        rollups.rebuild(user_id=self.user.pk)
+        self.assertEqual(MetricRollup.objects.get(**january).count, 600)
+
+    def test_cursor_lookups_skip_blocks_past_the_page(self):
+        Metric.objects.create(user=self.user, type='hr', value=65, recorded_at=datetime(2025, 2, 10, tzinfo=timezone.utc))
+        metric_archive.archive(at(5))
+        merged = metric_archive.MergedMetrics(Metric.objects.filter(user=self.user),
+                                              MetricArchiveBlock.objects.filter(user=self.user))
+        february = datetime(2025, 2, 1, tzinfo=timezone.utc)
+
+        with mock.patch.object(metric_archive, 'decode', wraps=metric_archive.decode) as decode:
+            page = merged.filter(recorded_at__lt=february)[:2]
+        self.assertEqual([metric.recorded_at.hour for metric in page], [17, 16])
+        self.assertEqual(decode.call_count, 1)
+
+        with mock.patch.object(metric_archive, 'decode', wraps=metric_archive.decode) as decode:
+            page = merged.order_by('recorded_at', 'id').filter(recorded_at__gte=february)[:2]
+        self.assertEqual([metric.value for metric in page], [65, 70])
+        self.assertEqual(decode.call_count, 1)
+
+
+class AdherenceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='adhere@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='adheret@x.com', password='pw', role='trainer')
+        self.today = localdate()
+        self.plans = {
+            ago: Plan.objects.create(user=self.user, trainer=self.trainer, date=self.today - timedelta(days=ago),
+                                     nutrition_plan='n', exercise_plan='e')
+            for ago in range(6)
+        }
+
+    def log(self, ago, completion):
+        return DailyLog.objects.create(user=self.user, plan=self.plans[ago], date=self.plans[ago].date,
+                                       actual_nutrition='n', actual_exercise='e', completion_percentage=completion)
+
+    def stats(self):
+        return AdherenceStats.objects.get(user=self.user)
+
+    def test_incremental_updates_match_a_rebuild(self):
+        # Day 3 ago is logged last, splitting a run that was already counted.
+        for ago, completion in [(5, 90), (4, 85), (2, 95), (1, 100), (3, 20)]:
+            self.log(ago, completion)
+        stats = self.stats()
+        summary = adherence.summary(stats)
+        self.assertEqual((summary['current_streak'], summary['longest_streak']), (2, 2))
+        # Today is planned but not logged yet, so it isn't counted.
+        self.assertEqual(summary['mean_7'], 78)
+
+        rebuilt = adherence.rebuild(self.user.pk)
+        for field in ('days', 'streak_start', 'streak_end', 'streak_length', 'longest_streak'):
+            self.assertEqual(getattr(rebuilt, field), getattr(stats, field))
+
+    def test_a_missed_day_ends_the_streak_once_it_is_over(self):
+        self.log(1, 100)
+        self.assertEqual(adherence.summary(self.stats())['current_streak'], 1)
+        summary = adherence.summary(self.stats(), today=self.today + timedelta(days=1))
+        self.assertEqual((summary['current_streak'], summary['longest_streak'], summary['mean_7']), (0, 1, 16.67))
+
+    def test_removing_a_plan_turns_its_day_into_a_rest_day(self):
+        for ago, completion in [(5, 90), (4, 85), (3, 20), (2, 95), (1, 100)]:
+            self.log(ago, completion)
+        self.plans[3].delete()
+        summary = adherence.summary(self.stats())
+        self.assertEqual((summary['current_streak'], summary['longest_streak']), (4, 4))
+
+        self.user.delete()
+        self.assertFalse(AdherenceStats.objects.exists())
+
+    def test_backfill_builds_missing_stats_in_batches(self):
+        for ago, completion in [(2, 95), (1, 100)]:
+            self.log(ago, completion)
+        others = [User.objects.create_user(email=f'adhere{n}@x.com', password='pw', role='client') for n in range(2)]
+        # As if they predate AdherenceStats.
+        AdherenceStats.objects.all().delete()
+
+        call_command('rebuild_adherence', '--batch-size', '2', stdout=io.StringIO())
+        self.assertEqual(set(AdherenceStats.objects.values_list('user_id', flat=True)),
+                         {self.user.pk, *(other.pk for other in others)})
+        self.assertEqual(self.stats().streak_length, 2)
+
+
+@skipUnless(connection.vendor == 'postgresql', "Query plans are only asserted on PostgreSQL.")
+class QueryPlanIndexTests(TestCase):
+    """
+    Guards the composite indexes in 0005_role_scoped_indexes: each hot
+    queryset must be answerable from its index. Sequential scans are
+    disabled so the planner's choice doesn't depend on table size.
+    """
+
+    def setUp(self):
+        self.client_user = User.objects.create_user(email='qp@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='qptrn@x.com', password='pw', role='trainer')
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_active_subscription_check(self):
+        qs = Subscription.objects.filter(client=self.client_user, trainer=self.trainer, status='active')
+        self.assertUsesIndex(qs, 'sub_active_trainer_client_idx')
+
+    def test_trainer_plans_by_date(self):
+        self.assertUsesIndex(Plan.objects.filter(trainer=self.trainer).order_by('-date'), 'plan_trainer_date_idx')
+
+    def test_client_plans_by_date(self):
+        self.assertUsesIndex(Plan.objects.filter(user=self.client_user).order_by('-date'), 'plan_user_date_idx')
+
+    def test_client_goals_by_created_at(self):
+        qs = Goal.objects.filter(user=self.client_user).order_by('-created_at')
+        self.assertUsesIndex(qs, 'goal_user_created_idx')
+
+    def test_daily_logs_by_date(self):
+        qs = DailyLog.objects.filter(user=self.client_user).order_by('-date')
+        self.assertUsesIndex(qs, 'dailylog_user_date_idx')
+
+    def test_metric_history_by_type(self):
+        qs = Metric.objects.filter(user=self.client_user, type='weight').order_by('-recorded_at')
+        self.assertUsesIndex(qs, 'uniq_metric_user_type_recorded')
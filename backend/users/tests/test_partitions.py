@@ -0,0 +1,70 @@
+import io
+from datetime import date, datetime, timezone
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from users import partitions
+from users.models import Metric, User
+
+
+class MonthArithmeticTests(SimpleTestCase):
+    def test_add_months_crosses_years(self):
+        self.assertEqual(partitions.add_months(date(2025, 11, 1), 3), date(2026, 2, 1))
+        self.assertEqual(partitions.add_months(date(2025, 1, 1), -1), date(2024, 12, 1))
+        self.assertEqual(partitions.partition_name('users_metric', date(2025, 3, 1)), 'users_metric_p2025_03')
+
+
+@skipUnless(connection.vendor != 'postgresql', "Covers the fallback on databases without partitioning.")
+class PartitionNoopTests(TestCase):
+    def test_command_is_a_noop(self):
+        out = io.StringIO()
+        call_command('manage_partitions', stdout=out)
+        self.assertIn("nothing to do", out.getvalue())
+        self.assertFalse(partitions.is_partitioned(Metric))
+        self.assertEqual(partitions.ensure_partitions(3), [])
+        self.assertEqual(partitions.apply_retention({'metric': 1}), [])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Tables are only partitioned on PostgreSQL.")
+class PartitionMaintenanceTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='parts@x.com', password='pw', role='client')
+
+    def test_future_months_are_created_and_default_rows_moved(self):
+        far = date.today().replace(day=1)
+        far = partitions.add_months(far, 24)
+        metric = Metric.objects.create(user=self.user, type='weight', value=80,
+                                       recorded_at=datetime(far.year, far.month, 2, tzinfo=timezone.utc))
+        self.assertNotIn(far, partitions.partitions(Metric))
+
+        self.assertIn(partitions.partition_name('users_metric', far), partitions.ensure_partitions(24))
+        self.assertIn(far, partitions.partitions(Metric))
+        self.assertEqual(Metric.objects.get(pk=metric.pk).value, 80)
+        self.assertEqual(partitions.ensure_partitions(24), [])
+
+    def test_retention_detaches_whole_old_months(self):
+        Metric.objects.create(user=self.user, type='weight', value=90,
+                              recorded_at=datetime(2020, 1, 15, tzinfo=timezone.utc))
+        partitions.create_partition(Metric, date(2020, 1, 1))
+        partitions.create_partition(Metric, date(2020, 2, 1))
+
+        removed = partitions.apply_retention({'metric': 1}, drop=True, today=date(2020, 3, 10))
+        self.assertEqual(removed, ['users_metric_p2020_01'])
+        self.assertFalse(Metric.objects.filter(recorded_at__year=2020).exists())
+        self.assertIn(date(2020, 2, 1), partitions.partitions(Metric))
+
+    def test_detached_rows_do_not_block_deleting_their_user(self):
+        Metric.objects.create(user=self.user, type='weight', value=90,
+                              recorded_at=datetime(2020, 1, 15, tzinfo=timezone.utc))
+        partitions.create_partition(Metric, date(2020, 1, 1))
+
+        self.assertEqual(partitions.apply_retention({'metric': 1}, today=date(2020, 3, 10)), ['users_metric_p2020_01'])
+        self.user.delete()
+        with connection.cursor() as cursor:
+            # Deferred FK checks run at commit; make them run now.
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute('SELECT count(*) FROM users_metric_p2020_01')
+            self.assertEqual(cursor.fetchone()[0], 1)
@@ -0,0 +1,97 @@
+import os
+import tempfile
+
+from django.core.cache import caches
+from django.db import connection, connections, transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils.timezone import localdate
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.models import AdherenceStats, DailyLog, Goal, Plan, User
+from users.replicas import reading_from
+
+REPLICA = 'stand_in_replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    The replica is a second SQLite file copied from the primary mid-test, so
+    rows written afterwards are "not replicated yet" and show which database
+    served a read.
+    """
+
+    # Resolved in setUpClass, once the replica alias is registered.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmp.name, 'replica.sqlite3')
+        connections.settings[REPLICA] = {**connection.settings_dict, 'NAME': cls.path, 'TEST': {'MIRROR': 'default'}}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest("The stand-in replica is a SQLite copy of the primary.")
+        caches['default'].clear()
+        self.member = User.objects.create_user(email='replica@x.com', password='pw', role='client')
+        self.goal(description='replicated')
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM INTO %s', [self.path])
+        self.goal(description='lagging')
+
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.member).access_token}')
+
+    def tearDown(self):
+        connections[REPLICA].close()
+        os.remove(self.path)
+
+    def goal(self, **fields):
+        return Goal.objects.create(user=self.member, target_value='70', target_date='2099-01-01', status='open', **fields)
+
+    def listed(self):
+        resp = self.api.get(reverse('goal-list'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return sorted(goal['description'] for goal in resp.data['results'])
+
+    def test_reads_use_the_replica_until_the_user_writes(self):
+        self.assertEqual(self.listed(), ['replicated'])
+
+        resp = self.api.post(reverse('goal-list'), {'user': self.member.id, 'description': 'mine', 'target_value': '1',
+                                                    'target_date': '2099-01-01', 'status': 'open'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.listed(), ['lagging', 'mine', 'replicated'])
+
+        caches['default'].clear()  # the pin expires
+        self.assertEqual(self.listed(), ['replicated'])
+
+    def test_missing_adherence_stats_are_built_from_the_primary(self):
+        trainer = User.objects.create_user(email='replicat@x.com', password='pw', role='trainer')
+        plan = Plan.objects.create(user=self.member, trainer=trainer, date=localdate(), nutrition_plan='n',
+                                   exercise_plan='e')
+        DailyLog.objects.create(user=self.member, plan=plan, date=plan.date, actual_nutrition='n',
+                                actual_exercise='e', completion_percentage=100)
+        AdherenceStats.objects.all().delete()
+
+        resp = self.api.get(reverse('user-adherence', args=[self.member.id]))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['current_streak'], 1)
+
+    def test_reads_inside_transactions_stay_on_the_primary(self):
+        with reading_from(REPLICA):
+            self.assertEqual(Goal.objects.count(), 1)
+            with transaction.atomic():
+                self.assertEqual(Goal.objects.count(), 2)
+        self.assertEqual(Goal.objects.count(), 2)
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from users import throttling
+from users.models import User
+
+RATES = {
+    'login':    {'ip': '5/min', 'email': '2/min'},
+    'register': {'ip': '1/min', 'email': '5/min'},
+}
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_bucket_refills_at_its_rate(self):
+        self.assertEqual(throttling.parse_rate('2/min'), (2, 60))
+        bucket, wait = throttling._take(None, 2, 60, now=0)
+        bucket, wait = throttling._take(bucket, 2, 60, now=0)
+        self.assertEqual(wait, 0)
+        bucket, wait = throttling._take(bucket, 2, 60, now=0)
+        self.assertEqual(wait, 30)
+        # Half a token is back after 15s; the rest arrives 15s later.
+        bucket, wait = throttling._take(bucket, 2, 60, now=15)
+        self.assertEqual(wait, 15)
+        self.assertEqual(throttling._take(bucket, 2, 60, now=30)[1], 0)
+
+
+@override_settings(THROTTLING={'STORE': 'users.throttling.LocalMemoryStore', 'CACHE_ALIAS': 'default', 'RATES': RATES})
+class CredentialThrottlingTests(APITestCase):
+    def setUp(self):
+        throttling.get_store().clear()
+        User.objects.create_user(email='limit@x.com', password='pass1234', role='client')
+        self.login = reverse('token_obtain_pair')
+
+    def test_login_is_limited_per_email_with_retry_after(self):
+        for _ in range(2):
+            resp = self.client.post(self.login, {'email': 'Limit@x.com ', 'password': 'wrong'}, format='json')
+            self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+        resp = self.client.post(self.login, {'email': 'limit@x.com', 'password': 'pass1234'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        # A token at 2/min is back after 30s, less the time the first attempts took.
+        self.assertAlmostEqual(int(resp['Retry-After']), 30, delta=2)
+
+        resp = self.client.post(self.login, {'email': 'other@x.com', 'password': 'wrong'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_is_limited_per_address(self):
+        for n in range(5):
+            self.client.post(self.login, {'email': f'spray{n}@x.com', 'password': 'wrong'}, format='json')
+        resp = self.client.post(self.login, {'email': 'limit@x.com', 'password': 'pass1234'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        resp = self.client.post(self.login, {'email': 'limit@x.com', 'password': 'pass1234'}, format='json',
+                                REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_forwarded_for_does_not_pick_a_fresh_address_bucket(self):
+        for num_proxies in (None, 0, 1):
+            throttling.get_store().clear()
+            with self.subTest(num_proxies=num_proxies), \
+                    override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': num_proxies}):
+                codes = [
+                    self.client.post(self.login, {'email': f'spoof{n}@x.com', 'password': 'wrong'}, format='json',
+                                     HTTP_X_FORWARDED_FOR=f'198.51.100.{n}, 203.0.113.7').status_code
+                    for n in range(6)
+                ]
+                self.assertEqual(codes, [status.HTTP_401_UNAUTHORIZED] * 5 + [status.HTTP_429_TOO_MANY_REQUESTS])
+
+    def test_registration_is_limited_but_other_user_actions_are_not(self):
+        url = reverse('user-register')
+        resp = self.client.post(url, {'email': 'new1@x.com', 'password': 'pass1234', 'role': 'client'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        resp = self.client.post(url, {'email': 'new2@x.com', 'password': 'pass1234', 'role': 'client'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertFalse(User.objects.filter(email='new2@x.com').exists())
+
+        self.client.force_authenticate(User.objects.get(email='new1@x.com'))
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse('user-list')).status_code, status.HTTP_200_OK)
+
+    @override_settings(THROTTLING={'STORE': 'users.throttling.CacheStore', 'CACHE_ALIAS': 'default', 'RATES': RATES})
+    def test_cache_store_shares_buckets(self):
+        # The configured cache is shared, not one per process.
+        self.assertNotIsInstance(caches['default'], LocMemCache)
+        throttling.get_store().clear()
+        for _ in range(2):
+            self.client.post(self.login, {'email': 'limit@x.com', 'password': 'wrong'}, format='json')
+        # Another worker's store reads the same buckets.
+        throttling.reset_store(setting='THROTTLING')
+        resp = self.client.post(self.login, {'email': 'limit@x.com', 'password': 'pass1234'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
@@ -1,8 +1,19 @@
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
-from users.models import User, TrainerProfile, Subscription, Plan, Goal
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta, timezone
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import localdate
+from users.models import User, TrainerProfile, TrainerReview, Subscription, Plan, Goal, Metric, MetricRollup, DailyLog, ClientDailySnapshot, MetricArchiveBlock
 from rest_framework_simplejwt.tokens import RefreshToken
+from users import jobs, metric_archive, ratings
+from users.instrumentation import registry
 
 def get_token_for_user(user):
     refresh = RefreshToken.for_user(user)
@@ -62,8 +73,8 @@ class SubscriptionTests(APITestCase):
         url = reverse('subscription-list')
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 1)
-        self.assertEqual(resp.data[0]['client'], self.client_user.id)
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(resp.data['results'][0]['client'], self.client_user.id)
 
     def test_trainer_list_their_subscriptions(self):
         token = get_token_for_user(self.trainer)
@@ -72,8 +83,8 @@ class SubscriptionTests(APITestCase):
         url = reverse('subscription-list')
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 1)
-        self.assertEqual(resp.data[0]['trainer'], self.trainer.id)
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(resp.data['results'][0]['trainer'], self.trainer.id)
 
 class PlanTests(APITestCase):
     def setUp(self):
@@ -112,3 +123,762 @@ class PlanTests(APITestCase):
         }
         resp = self.client.post(url, data, format='json')
         self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+class PlanBatchTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(email='pbt@x.com', password='pw', role='trainer')
+        self.clients = [User.objects.create_user(email=f'pb{n}@x.com', password='pw', role='client') for n in range(3)]
+        for client in self.clients[:2]:
+            Subscription.objects.create(client=client, trainer=self.trainer,
+                                        start_date='2025-01-01', end_date='2025-12-31', status='active')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.trainer)}')
+        self.url = reverse('plan-batch')
+
+    def test_template_over_a_week_for_the_roster_in_fixed_queries(self):
+        payload = {
+            'template': {'nutrition_plan': 'Greens', 'exercise_plan': 'Squats'},
+            'users': [c.id for c in self.clients],
+            'start_date': '2025-03-03',
+            'end_date': '2025-03-09',
+        }
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(self.url, payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(resp.data['created']), 14)
+        self.assertEqual([r['index'] for r in resp.data['rejected']], list(range(14, 21)))
+        self.assertEqual(Plan.objects.filter(trainer=self.trainer).count(), 14)
+        self.assertEqual(Plan.objects.filter(user=self.clients[2]).count(), 0)
+        # Plus the adherence stats of the clients: a read, the two day aggregates and one upsert.
+        self.assertLessEqual(len(queries), 9)
+
+    def test_entries_report_invalid_and_foreign_rows(self):
+        entries = [
+            {'user': self.clients[0].id, 'date': '2025-03-01', 'nutrition_plan': 'A', 'exercise_plan': 'B'},
+            {'user': self.clients[1].id, 'date': 'soon', 'nutrition_plan': 'A', 'exercise_plan': 'B'},
+            {'user': self.clients[2].id, 'date': '2025-03-01', 'nutrition_plan': 'A', 'exercise_plan': 'B'},
+        ]
+        resp = self.client.post(self.url, {'entries': entries}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([p['user'] for p in resp.data['created']], [self.clients[0].id])
+        self.assertEqual([r['index'] for r in resp.data['rejected']], [1, 2])
+        self.assertIn('date', resp.data['rejected'][0]['errors'])
+
+        resp = self.client.post(self.url, {'entries': entries[2:]}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_needs_exactly_one_mode_and_a_trainer(self):
+        self.assertEqual(self.client.post(self.url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.clients[0])}')
+        resp = self.client.post(self.url, {'entries': [{}]}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+class PaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='pg@x.com', password='pw', role='client')
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        Metric.objects.bulk_create([
+            Metric(user=self.user, type=('weight', 'hr')[i % 2], value=80 + i,
+                   recorded_at=start + timedelta(hours=i // 2))
+            for i in range(7)
+        ])
+        token = get_token_for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_cursor_walks_metrics_newest_first_without_gaps(self):
+        url = reverse('metric-list') + '?page_size=3'
+        seen = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(resp.data['results']), 3)
+            seen.extend(resp.data['results'])
+            url = resp.data['next']
+        self.assertEqual(len(seen), 7)
+        self.assertEqual(len({m['id'] for m in seen}), 7)
+        stamps = [m['recorded_at'] for m in seen]
+        self.assertEqual(stamps, sorted(stamps, reverse=True))
+
+    @override_settings(API_MAX_PAGE_SIZE=2)
+    def test_page_size_is_capped(self):
+        resp = self.client.get(reverse('metric-list') + '?page_size=100')
+        self.assertEqual(len(resp.data['results']), 2)
+        self.assertIsNotNone(resp.data['next'])
+
+class MetricSeriesTests(APITestCase):
+    def setUp(self):
+        self.client_user = User.objects.create_user(email='ser@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='sertrn@x.com', password='pw', role='trainer')
+        for day, value in [(3, 80), (4, 79), (11, 78)]:
+            Metric.objects.create(user=self.client_user, type='weight', value=value,
+                                  recorded_at=datetime(2025, 3, day, 8, tzinfo=timezone.utc))
+
+    def test_weekly_series(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.client_user)}')
+        resp = self.client.get(reverse('metric-series'), {'type': 'weight', 'bucket': 'week', 'from': '2025-03-05'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(b['bucket_start'], b['count'], b['min_value'], b['max_value'], b['avg']) for b in resp.data['results']],
+            [('2025-03-03', 2, 79, 80, 79.5), ('2025-03-10', 1, 78, 78, 78)],
+        )
+
+    def test_trainer_needs_active_subscription(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.trainer)}')
+        params = {'type': 'weight', 'user': self.client_user.id}
+        self.assertEqual(self.client.get(reverse('metric-series'), params).status_code, status.HTTP_403_FORBIDDEN)
+
+        Subscription.objects.create(client=self.client_user, trainer=self.trainer,
+                                    start_date='2025-01-01', end_date='2025-12-31', status='active')
+        resp = self.client.get(reverse('metric-series'), params)
+        self.assertEqual(len(resp.data['results']), 3)
+
+    def test_rejects_bad_bucket(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.client_user)}')
+        resp = self.client.get(reverse('metric-series'), {'type': 'weight', 'bucket': 'year'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+class BulkIngestTests(APITestCase):
+    def setUp(self):
+        self.client_user = User.objects.create_user(email='bulk@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='bulktrn@x.com', password='pw', role='trainer')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.client_user)}')
+
+    def test_json_array_with_per_item_errors(self):
+        samples = [
+            {'type': 'hr', 'value': 60 + i, 'recorded_at': f'2025-03-01T10:{i:02d}:00Z'} for i in range(5)
+        ]
+        samples.insert(2, {'type': 'hr', 'value': 'fast'})
+        resp = self.client.post(reverse('metric-bulk'), samples, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['accepted'], 5)
+        self.assertEqual([e['index'] for e in resp.data['errors']], [2])
+        self.assertEqual(set(resp.data['errors'][0]['errors']), {'value', 'recorded_at'})
+        self.assertEqual(Metric.objects.filter(user=self.client_user).count(), 5)
+        self.assertEqual(MetricRollup.objects.get(bucket='day', type='hr').count, 5)
+
+    def test_ndjson_upserts_on_natural_key(self):
+        body = (
+            '{"type": "weight", "value": 80, "recorded_at": "2025-03-01T07:00:00Z"}\n'
+            '\n'
+            '{"type": "weight", "value": 79, "recorded_at": "2025-03-02T07:00:00Z"}\n'
+        )
+        for _ in range(2):
+            resp = self.client.generic('POST', reverse('metric-bulk'), body, content_type='application/x-ndjson')
+            self.assertEqual(resp.data['accepted'], 2)
+
+        resend = '{"type": "weight", "value": 78.5, "recorded_at": "2025-03-02T07:00:00Z"}'
+        self.client.generic('POST', reverse('metric-bulk'), resend, content_type='application/x-ndjson')
+        self.assertEqual(
+            list(Metric.objects.filter(user=self.client_user).order_by('recorded_at').values_list('value', flat=True)),
+            [80, 78.5],
+        )
+        self.assertEqual(MetricRollup.objects.get(bucket='month').min_value, 78.5)
+
+    def test_malformed_ndjson_is_rejected(self):
+        resp = self.client.generic('POST', reverse('metric-bulk'), '{"type": ', content_type='application/x-ndjson')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_daily_logs_reject_foreign_plans(self):
+        other = User.objects.create_user(email='bulkother@x.com', password='pw', role='client')
+        mine = Plan.objects.create(user=self.client_user, trainer=self.trainer, date='2025-03-01',
+                                   nutrition_plan='n', exercise_plan='e')
+        theirs = Plan.objects.create(user=other, trainer=self.trainer, date='2025-03-01',
+                                     nutrition_plan='n', exercise_plan='e')
+        logs = [
+            {'plan': plan.id, 'date': '2025-03-01', 'actual_nutrition': 'n', 'actual_exercise': 'e',
+             'completion_percentage': 90}
+            for plan in (mine, theirs)
+        ]
+        resp = self.client.post(reverse('dailylog-bulk'), logs, format='json')
+        self.assertEqual(resp.data['accepted'], 1)
+        self.assertEqual(resp.data['errors'], [{'index': 1, 'errors': {'plan': ['Plan not found.']}}])
+        self.assertEqual(DailyLog.objects.get().plan, mine)
+
+class TrainerRosterTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(email='rost@x.com', password='pw', role='trainer')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.trainer)}')
+        self.today = localdate()
+
+    def add_client(self, n):
+        client = User.objects.create_user(email=f'rostcli{n}@x.com', password='pw', role='client', name=f'Client {n}')
+        Subscription.objects.create(client=client, trainer=self.trainer,
+                                    start_date='2025-01-01', end_date='2099-12-31', status='active')
+        Goal.objects.create(user=client, description='old', target_value='75', target_date='2025-06-01', status='open')
+        Goal.objects.create(user=client, description='new', target_value='72', target_date='2025-09-01', status='open')
+        plan = Plan.objects.create(user=client, trainer=self.trainer, date=self.today,
+                                   nutrition_plan='n', exercise_plan='e')
+        DailyLog.objects.create(user=client, plan=plan, date=self.today - timedelta(days=1), actual_nutrition='n',
+                                actual_exercise='e', completion_percentage=40)
+        DailyLog.objects.create(user=client, plan=plan, date=self.today, actual_nutrition='n',
+                                actual_exercise='e', completion_percentage=85)
+        for day, value in [(1, 80), (2, 79)]:
+            Metric.objects.create(user=client, type='weight', value=value,
+                                  recorded_at=datetime(2025, 3, day, tzinfo=timezone.utc))
+        return client
+
+    def test_roster_entry(self):
+        client = self.add_client(1)
+        Subscription.objects.create(client=self.add_client(2), trainer=self.trainer,
+                                    start_date='2025-01-01', end_date='2099-12-31', status='cancelled')
+        resp = self.client.get(reverse('trainer-roster'))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data), 2)
+        entry = resp.data[0]
+        self.assertEqual(entry['client']['id'], client.id)
+        self.assertEqual(entry['latest_goal']['description'], 'new')
+        self.assertEqual(entry['todays_plan']['date'], self.today.isoformat())
+        self.assertEqual(entry['last_completion_percentage'], 85)
+        self.assertEqual(entry['latest_weight'], 79)
+        self.assertEqual((entry['adherence']['mean_7'], entry['adherence']['current_streak']), (62.5, 1))
+
+    def test_query_count_is_independent_of_roster_size(self):
+        self.add_client(1)
+        self.client.get(reverse('trainer-roster'))  # warm the authentication cache
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(reverse('trainer-roster'))
+        for n in range(2, 6):
+            self.add_client(n)
+        with self.assertNumQueries(len(small)):
+            resp = self.client.get(reverse('trainer-roster'))
+        self.assertEqual(len(resp.data), 5)
+
+    def test_clients_cannot_read_a_roster(self):
+        client = self.add_client(1)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(client)}')
+        self.assertEqual(self.client.get(reverse('trainer-roster')).status_code, status.HTTP_403_FORBIDDEN)
+
+class AsyncDashboardTests(APITestCase):
+    def setUp(self):
+        self.client_user = User.objects.create_user(email='dash@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='dashtrn@x.com', password='pw', role='trainer')
+        Subscription.objects.create(client=self.client_user, trainer=self.trainer,
+                                    start_date='2025-01-01', end_date='2099-12-31', status='active')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.trainer)}')
+
+    def test_requires_token(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('dashboard-goals')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_goal_list_matches_viewset_scoping(self):
+        for n in range(3):
+            Goal.objects.create(user=self.client_user, description=f'g{n}', target_value='1',
+                                target_date='2025-09-01', status='open')
+        resp = self.client.get(reverse('dashboard-goals'), {'limit': 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        body = resp.json()
+        self.assertEqual(body['count'], 3)
+        self.assertEqual([g['description'] for g in body['results']], ['g2', 'g1'])
+
+    def test_todays_plan_for_a_client(self):
+        url = reverse('dashboard-todays-plan')
+        self.assertEqual(self.client.get(url, {'user': self.client_user.id}).status_code, status.HTTP_404_NOT_FOUND)
+        plan = Plan.objects.create(user=self.client_user, trainer=self.trainer, date=localdate(),
+                                   nutrition_plan='n', exercise_plan='e')
+        resp = self.client.get(url, {'user': self.client_user.id})
+        self.assertEqual(resp.json()['id'], plan.id)
+
+        stranger = User.objects.create_user(email='dashother@x.com', password='pw', role='client')
+        self.assertEqual(self.client.get(url, {'user': stranger.id}).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_metric_series(self):
+        Metric.objects.create(user=self.client_user, type='weight', value=80,
+                              recorded_at=datetime(2025, 3, 3, tzinfo=timezone.utc))
+        resp = self.client.get(reverse('dashboard-metric-series'), {'type': 'weight', 'user': self.client_user.id})
+        self.assertEqual(resp.json()['results'], [
+            {'bucket_start': '2025-03-03', 'count': 1, 'min_value': 80.0, 'max_value': 80.0, 'avg': 80.0},
+        ])
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.client_user = User.objects.create_user(email='etag@x.com', password='pw', role='client')
+        self.goal = Goal.objects.create(user=self.client_user, description='g', target_value='70',
+                                        target_date='2025-09-01', status='open')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.client_user)}')
+
+    def test_list_revalidates_until_data_changes(self):
+        url = reverse('goal-list')
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(1):
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.goal.status = 'done'
+        self.goal.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_deletion_changes_the_list_etag(self):
+        other = Goal.objects.create(user=self.client_user, description='h', target_value='1',
+                                    target_date='2025-09-01', status='open')
+        first = self.client.get(reverse('goal-list'))
+        Goal.objects.filter(pk=self.goal.pk).delete()  # not the newest row
+        resp = self.client.get(reverse('goal-list'), HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([g['id'] for g in resp.data['results']], [other.id])
+
+    def test_detail_if_modified_since(self):
+        url = reverse('user-detail', args=[self.client_user.id])
+        first = self.client.get(url)
+        resp = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        self.client_user = User.objects.create_user(email='exp@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='exptrn@x.com', password='pw', role='trainer')
+        plan = Plan.objects.create(user=self.client_user, trainer=self.trainer, date='2025-03-01',
+                                   nutrition_plan='oats, eggs', exercise_plan='run')
+        DailyLog.objects.create(user=self.client_user, plan=plan, date='2025-03-01', actual_nutrition='oats',
+                                actual_exercise='run', completion_percentage=75)
+        Goal.objects.create(user=self.client_user, description='lose', target_value='70',
+                            target_date='2025-09-01', status='open')
+        for day in (1, 2):
+            Metric.objects.create(user=self.client_user, type='weight', value=80 - day,
+                                  recorded_at=datetime(2025, 3, day, tzinfo=timezone.utc))
+        self.url = reverse('user-export', args=[self.client_user.id])
+
+    def read(self, resp):
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        return b''.join(resp.streaming_content).decode()
+
+    def test_ndjson_export(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.client_user)}')
+        lines = [json.loads(line) for line in self.read(self.client.get(self.url, {'format': 'ndjson'})).splitlines()]
+        self.assertEqual([line['kind'] for line in lines], ['metric', 'metric', 'daily_log', 'plan', 'goal'])
+        self.assertEqual(lines[0]['recorded_at'], '2025-03-01T00:00:00Z')
+
+    def test_csv_export(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.client_user)}')
+        resp = self.client.get(self.url, {'format': 'csv'})
+        self.assertTrue(resp['Content-Type'].startswith('text/csv'))
+        rows = list(csv.DictReader(io.StringIO(self.read(resp))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[3]['nutrition_plan'], 'oats, eggs')
+        self.assertEqual(rows[2]['completion_percentage'], '75.0')
+
+    def test_export_follows_role_scoping(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.trainer)}')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        Subscription.objects.create(client=self.client_user, trainer=self.trainer,
+                                    start_date='2025-01-01', end_date='2099-12-31', status='active')
+        self.assertEqual(len(self.read(self.client.get(self.url)).splitlines()), 5)
+
+class TrainerSearchTests(APITestCase):
+    def setUp(self):
+        def trainer(n, specialties, bio='', rating=0.0, country='Nigeria'):
+            user = User.objects.create_user(email=f'srch{n}@x.com', password='pw', role='trainer',
+                                            name=f'Trainer {n}', country=country)
+            return TrainerProfile.objects.create(user=user, specialties=specialties, bio=bio, rating=rating)
+
+        self.yoga = trainer(1, 'yoga, mobility', rating=4.0)
+        self.strength = trainer(2, 'strength', bio='Some yoga for recovery', rating=4.9)
+        self.kenya = trainer(3, 'yoga', rating=3.0, country='Kenya')
+        trainer(4, 'boxing', rating=5.0)
+        viewer = User.objects.create_user(email='srchcli@x.com', password='pw', role='client')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(viewer)}')
+
+    def ids(self, **params):
+        resp = self.client.get(reverse('trainer-search'), params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return [t['id'] for t in resp.data['results']]
+
+    def test_specialty_match_outranks_bio_mention(self):
+        self.assertEqual(self.ids(q='yoga'), [self.yoga.id, self.kenya.id, self.strength.id])
+
+    def test_filters(self):
+        self.assertEqual(self.ids(q='yoga', country='kenya'), [self.kenya.id])
+        self.assertEqual(self.ids(q='yoga', min_rating=4.5), [self.strength.id])
+        self.assertEqual(self.ids(specialty='yoga'), [self.yoga.id, self.kenya.id])
+
+    def test_without_query_orders_by_rating_across_pages(self):
+        first = self.client.get(reverse('trainer-search'), {'page_size': 2})
+        second = self.client.get(first.data['next'])
+        ratings = [t['rating'] for t in first.data['results'] + second.data['results']]
+        self.assertEqual(ratings, [5.0, 4.9, 4.0, 3.0])
+
+    def test_rejects_out_of_range_rating(self):
+        resp = self.client.get(reverse('trainer-search'), {'min_rating': 9})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+class TrainerReviewTests(APITestCase):
+    def setUp(self):
+        self.trainer = User.objects.create_user(email='revtrn@x.com', password='pw', role='trainer')
+        self.profile = TrainerProfile.objects.create(user=self.trainer)
+        self.alice = User.objects.create_user(email='reva@x.com', password='pw', role='client')
+        self.bob = User.objects.create_user(email='revb@x.com', password='pw', role='client')
+        for client in (self.alice, self.bob):
+            Subscription.objects.create(client=client, trainer=self.trainer,
+                                        start_date='2025-01-01', end_date='2025-12-31', status='active')
+
+    def review(self, client, rating):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(client)}')
+        return self.client.post(reverse('trainerreview-list'), {'trainer': self.trainer.id, 'rating': rating},
+                                format='json')
+
+    def assertRating(self, rating, total, count):
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.rating, self.profile.rating_sum, self.profile.rating_count),
+                         (rating, total, count))
+
+    def test_rating_follows_creates_updates_and_deletes(self):
+        first = self.review(self.alice, 5)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data['reviewer'], self.alice.id)
+        self.review(self.bob, 2)
+        self.assertRating(3.5, 7, 2)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.alice)}')
+        url = reverse('trainerreview-detail', args=[first.data['id']])
+        self.client.patch(url, {'rating': 3}, format='json')
+        self.assertRating(2.5, 5, 2)
+
+        self.client.delete(url)
+        self.assertRating(2.0, 2, 1)
+
+    def test_last_review_removed_resets_rating(self):
+        resp = self.review(self.alice, 4)
+        self.client.delete(reverse('trainerreview-detail', args=[resp.data['id']]))
+        self.assertRating(0.0, 0, 0)
+
+    def test_a_review_deleted_twice_is_taken_back_once(self):
+        self.review(self.bob, 2)
+        resp = self.review(self.alice, 4)
+        review = TrainerReview.objects.get(pk=resp.data['id'])
+        # Both requests of a double submit loaded the review before either deleted it.
+        ratings.delete_review(review)
+        ratings.delete_review(review)
+        self.assertRating(2.0, 2, 1)
+
+    def test_requires_a_subscription_and_one_review_per_client(self):
+        stranger = User.objects.create_user(email='revc@x.com', password='pw', role='client')
+        self.assertEqual(self.review(stranger, 5).status_code, status.HTTP_400_BAD_REQUEST)
+        self.review(self.alice, 5)
+        self.assertEqual(self.review(self.alice, 1).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertRating(5.0, 5, 1)
+
+    def test_only_the_author_can_edit(self):
+        resp = self.review(self.alice, 5)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.bob)}')
+        edit = self.client.patch(reverse('trainerreview-detail', args=[resp.data['id']]), {'rating': 1}, format='json')
+        self.assertEqual(edit.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertRating(5.0, 5, 1)
+
+@override_settings(MIDDLEWARE=['users.instrumentation.RequestMetricsMiddleware', *settings.MIDDLEWARE])
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = User.objects.create_user(email='ins@x.com', password='pw', role='client')
+        self.admin = User.objects.create_user(email='insadm@x.com', password='pw', role='admin', is_staff=True)
+        Metric.objects.create(user=self.user, type='weight', value=80, recorded_at=datetime(2025, 1, 1, tzinfo=timezone.utc))
+
+    def test_server_timing_and_prometheus_summary(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.user)}')
+        for _ in range(3):
+            resp = self.client.get(reverse('metric-list'))
+        timing = resp['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('serializer;dur=', timing)
+
+        self.assertEqual(self.client.get(reverse('api-metrics')).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.admin)}')
+        body = self.client.get(reverse('api-metrics')).content.decode()
+        self.assertIn('# TYPE vibrafit_request_duration_seconds summary', body)
+        self.assertIn('vibrafit_request_duration_seconds_count{route="metric.list",method="GET"} 3', body)
+        self.assertIn('vibrafit_sql_queries{route="metric.list",method="GET",quantile="0.99"}', body)
+
+    def test_non_viewset_routes_use_the_url_name(self):
+        self.client.post(reverse('token_obtain_pair'), {'email': 'ins@x.com', 'password': 'pw'}, format='json')
+        self.assertIn('route="token_obtain_pair",method="POST"', registry.render_prometheus())
+
+class TodaySnapshotTests(APITestCase):
+    def setUp(self):
+        self.member = User.objects.create_user(email='today@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='todaytrn@x.com', password='pw', role='trainer')
+        Subscription.objects.create(client=self.member, trainer=self.trainer,
+                                    start_date='2025-01-01', end_date='2099-12-31', status='active')
+        self.goal = Goal.objects.create(user=self.member, description='Cut', target_value='75',
+                                        target_date='2025-09-01', status='open')
+        Goal.objects.create(user=self.member, description='Old', target_value='80', target_date='2025-01-01', status='done')
+        Metric.objects.create(user=self.member, type='weight', value=81, recorded_at=datetime(2025, 1, 1, tzinfo=timezone.utc))
+        Metric.objects.create(user=self.member, type='weight', value=80, recorded_at=datetime(2025, 1, 2, tzinfo=timezone.utc))
+        self.url = reverse('me-today')
+        self.as_user(self.member)
+
+    def as_user(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(user)}')
+
+    def test_built_once_then_read_with_one_query(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual([g['id'] for g in first.data['open_goals']], [self.goal.id])
+        self.assertEqual(first.data['latest_metrics']['weight']['value'], 80)
+        self.assertEqual(first.data['plans'], [])
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).data, first.data)
+        self.assertEqual(len(queries), 1)
+
+    def test_writes_refresh_the_existing_snapshot(self):
+        self.client.get(self.url)
+        today = localdate()
+
+        self.as_user(self.trainer)
+        self.client.post(reverse('plan-list'), {'user': self.member.id, 'date': str(today),
+                                                'nutrition_plan': 'Oats', 'exercise_plan': 'Row'}, format='json')
+        self.client.post(reverse('plan-batch'), {
+            'template': {'nutrition_plan': 'Rice', 'exercise_plan': 'Swim'},
+            'users': [self.member.id], 'start_date': str(today), 'end_date': str(today + timedelta(days=2)),
+        }, format='json')
+
+        self.as_user(self.member)
+        plan_id = Plan.objects.filter(user=self.member, date=today).order_by('id').values_list('id', flat=True).first()
+        self.client.post(reverse('dailylog-bulk'), [{'plan': plan_id, 'date': str(today), 'actual_nutrition': 'Oats',
+                                                     'actual_exercise': 'Row', 'completion_percentage': 90}], format='json')
+        self.client.post(reverse('metric-bulk'), [{'type': 'weight', 'value': 79,
+                                                   'recorded_at': '2025-01-03T00:00:00Z'}], format='json')
+        self.goal.status = 'done'
+        self.goal.save()
+
+        snapshot = self.client.get(self.url).data
+        self.assertEqual(snapshot['date'], str(today))
+        self.assertEqual(sorted(p['exercise_plan'] for p in snapshot['plans']), ['Row', 'Swim'])
+        self.assertEqual([log['completion_percentage'] for log in snapshot['daily_logs']], [90])
+        self.assertEqual(snapshot['latest_metrics']['weight']['value'], 79)
+        self.assertEqual(snapshot['open_goals'], [])
+        self.assertEqual(ClientDailySnapshot.objects.filter(user=self.member).count(), 1)
+
+    def test_days_never_read_are_not_materialized(self):
+        Metric.objects.create(user=self.member, type='hr', value=60, recorded_at=datetime(2025, 1, 3, tzinfo=timezone.utc))
+        self.assertFalse(ClientDailySnapshot.objects.exists())
+
+class ListFilteringTests(APITestCase):
+    def setUp(self):
+        self.member = User.objects.create_user(email='flt@x.com', password='pw', role='client')
+        self.other = User.objects.create_user(email='flto@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='fltt@x.com', password='pw', role='trainer')
+        Subscription.objects.create(client=self.member, trainer=self.trainer,
+                                    start_date='2025-01-01', end_date='2025-12-31', status='active')
+        for day, (kind, value) in enumerate([('weight', 82), ('hr', 61), ('weight', 80), ('weight', 81)], start=1):
+            Metric.objects.create(user=self.member, type=kind, value=value,
+                                  recorded_at=datetime(2025, 1, day, tzinfo=timezone.utc))
+        Metric.objects.create(user=self.other, type='weight', value=99, recorded_at=datetime(2025, 1, 2, tzinfo=timezone.utc))
+        self.plans = [Plan.objects.create(user=self.member, trainer=self.trainer, date=f'2025-03-0{d}',
+                                          nutrition_plan='n', exercise_plan='e') for d in (1, 2, 3)]
+        for plan in self.plans:
+            DailyLog.objects.create(user=self.member, plan=plan, date=plan.date, actual_nutrition='n',
+                                    actual_exercise='e', completion_percentage=50)
+
+    def get(self, viewer, url, **params):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(viewer)}')
+        return self.client.get(url, params)
+
+    def test_metrics_are_scoped_and_filtered(self):
+        resp = self.get(self.member, reverse('metric-list'))
+        self.assertEqual(len(resp.data['results']), 4)
+
+        resp = self.get(self.member, reverse('metric-list'), type='weight', to='2025-01-03T12:00:00Z', ordering='value')
+        self.assertEqual([m['value'] for m in resp.data['results']], [80, 82])
+
+        resp = self.get(self.trainer, reverse('metric-list'), user=self.member.id, type='hr')
+        self.assertEqual([m['value'] for m in resp.data['results']], [61])
+        resp = self.get(self.trainer, reverse('metric-list'), user=self.other.id)
+        self.assertEqual(resp.data['results'], [])
+
+    def test_daily_logs_and_plans_filter_by_plan_and_date(self):
+        resp = self.get(self.member, reverse('dailylog-list'), plan=self.plans[1].id)
+        self.assertEqual([log['plan'] for log in resp.data['results']], [self.plans[1].id])
+
+        resp = self.get(self.trainer, reverse('plan-list'), **{'from': '2025-03-02', 'ordering': 'date'})
+        self.assertEqual([p['date'] for p in resp.data['results']], ['2025-03-02', '2025-03-03'])
+
+    def test_invalid_parameters_are_rejected_before_querying(self):
+        self.get(self.member, reverse('metric-list'))  # warm the auth cache
+        for params in ({'from': 'yesterday'}, {'ordering': 'user__email'}, {'user': 'me'},
+                       {'from': '2025-02-01T00:00:00Z', 'to': '2025-01-01T00:00:00Z'}):
+            with CaptureQueriesContext(connection) as queries:
+                resp = self.client.get(reverse('metric-list'), params)
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, params)
+            self.assertEqual(len(queries), 0, params)
+
+class LatestMetricViewTests(APITestCase):
+    def setUp(self):
+        self.member = User.objects.create_user(email='lmv@x.com', password='pw', role='client')
+        self.stranger = User.objects.create_user(email='lmvs@x.com', password='pw', role='client')
+        for day, kind, value in [(1, 'weight', 82), (3, 'weight', 80), (2, 'hr', 58)]:
+            Metric.objects.create(user=self.member, type=kind, value=value, recorded_at=datetime(2025, 1, day, tzinfo=timezone.utc))
+        self.url = reverse('metric-latest')
+
+    def test_latest_per_type_in_one_lookup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.member)}')
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(self.url)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([(r['type'], r['value']) for r in resp.data['results']], [('hr', 58), ('weight', 80)])
+
+        resp = self.client.get(self.url, {'type': 'weight'})
+        self.assertEqual([r['type'] for r in resp.data['results']], ['weight'])
+        Metric.objects.create(user=self.member, type='weight', value=79, recorded_at=datetime(2025, 1, 4, tzinfo=timezone.utc))
+        self.client.post(reverse('metric-bulk'), [{'type': 'hr', 'value': 57, 'recorded_at': '2025-01-05T00:00:00Z'}], format='json')
+        latest = {r['type']: r['value'] for r in self.client.get(self.url).data['results']}
+        self.assertEqual(latest, {'hr': 57, 'weight': 79})
+
+    def test_other_users_need_permission(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.stranger)}')
+        resp = self.client.get(self.url, {'user': self.member.id})
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+@override_settings(JOBS={**settings.JOBS, 'BROKER': 'users.jobs.InMemoryBroker'})
+class BackgroundJobViewTests(APITestCase):
+    def setUp(self):
+        self.member = User.objects.create_user(email='job@x.com', password='pw', role='client')
+        self.stranger = User.objects.create_user(email='jobs@x.com', password='pw', role='client')
+        Metric.objects.create(user=self.member, type='weight', value=80, recorded_at=datetime(2025, 1, 1, tzinfo=timezone.utc))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.member)}')
+
+    def test_rollup_rebuild_is_queued_and_pollable(self):
+        MetricRollup.objects.all().delete()
+        resp = self.client.post(reverse('metric-rebuild-rollups'), {'types': ['weight']}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(resp.data['status'], 'queued')
+        self.assertFalse(MetricRollup.objects.exists())
+
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertTrue(MetricRollup.objects.filter(user=self.member, type='weight').exists())
+        job = self.client.get(resp['Location']).data
+        self.assertEqual((job['status'], job['result']), ('succeeded', {'user_id': self.member.id, 'types': ['weight']}))
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.stranger)}')
+        self.assertEqual(self.client.get(resp['Location']).status_code, status.HTTP_404_NOT_FOUND)
+        resp = self.client.post(reverse('metric-rebuild-rollups'), {'user': self.member.id}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+
+class GoalProgressViewTests(APITestCase):
+    def setUp(self):
+        self.member = User.objects.create_user(email='goalprog@x.com', password='pw', role='client')
+        Metric.objects.create(user=self.member, type='weight', value=90, recorded_at=datetime(2025, 1, 1, tzinfo=timezone.utc))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.member)}')
+
+    def test_typed_goal_reports_progress_from_bulk_metrics(self):
+        goal = {'user': self.member.id, 'description': 'Cut', 'target_value': '80 kg', 'target_date': '2099-01-01',
+                'status': 'open', 'metric_type': 'weight'}
+        resp = self.client.post(reverse('goal-list'), goal, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(resp.data), {'target_numeric', 'direction'})
+
+        resp = self.client.post(reverse('goal-list'), {**goal, 'target_numeric': 80, 'direction': 'decrease'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual((resp.data['baseline_value'], resp.data['progress']), (90, 0))
+
+        tomorrow = datetime.now(timezone.utc) + timedelta(days=1)
+        self.client.post(reverse('metric-bulk'), [{'type': 'weight', 'value': 85, 'recorded_at': tomorrow.isoformat()}],
+                         format='json')
+        data = self.client.get(reverse('goal-detail', args=[resp.data['id']])).data
+        self.assertEqual((data['current_value'], data['progress']), (85, 50))
+        self.assertLess(data['trend_slope'], 0)
+
+
+class MetricArchiveViewTests(APITestCase):
+    def setUp(self):
+        self.member = User.objects.create_user(email='arch@x.com', password='pw', role='client')
+        stranger = User.objects.create_user(email='archs@x.com', password='pw', role='client')
+        for user, day, kind, value in [(self.member, 5, 'weight', 82), (self.member, 9, 'weight', 81),
+                                       (self.member, 7, 'hr', 58), (stranger, 6, 'weight', 99)]:
+            Metric.objects.create(user=user, type=kind, value=value, recorded_at=datetime(2025, 1, day, tzinfo=timezone.utc))
+        metric_archive.archive(datetime(2025, 3, 1, tzinfo=timezone.utc))
+        for day, value in [(2, 80), (3, 79)]:
+            Metric.objects.create(user=self.member, type='weight', value=value, recorded_at=datetime(2025, 3, day, tzinfo=timezone.utc))
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.member)}')
+
+    def pages(self, url, link):
+        pages = []
+        while url:
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            pages.append(resp.data)
+            url = resp.data[link]
+        return pages
+
+    def test_list_pages_through_raw_and_archived_samples(self):
+        forward = self.pages(reverse('metric-list') + '?page_size=2', 'next')
+        seen = [m for page in forward for m in page['results']]
+        self.assertEqual([(m['value'], m['id'] is None) for m in seen],
+                         [(79, False), (80, False), (81, True), (58, True), (82, True)])
+
+        backward = self.pages(forward[-1]['previous'], 'previous')
+        self.assertEqual([m for page in reversed(backward) for m in page['results']] + forward[-1]['results'], seen)
+
+    def test_filters_and_ordering_apply_to_archived_samples(self):
+        resp = self.client.get(reverse('metric-list'), {'type': 'weight', 'to': '2025-01-31T00:00:00Z'})
+        self.assertEqual([m['value'] for m in resp.data['results']], [81, 82])
+        resp = self.client.get(reverse('metric-list'), {'ordering': 'value'})
+        self.assertEqual([m['value'] for m in resp.data['results']], [58, 79, 80, 81, 82])
+
+        resp = self.client.get(reverse('metric-series'), {'type': 'weight', 'bucket': 'month'})
+        self.assertEqual([(b['bucket_start'], b['count']) for b in resp.data['results']],
+                         [('2025-01-01', 2), ('2025-03-01', 2)])
+
+    def test_export_interleaves_archived_types_by_time(self):
+        resp = self.client.get(reverse('user-export', args=[self.member.id]), {'format': 'ndjson'})
+        lines = [json.loads(line) for line in b''.join(resp.streaming_content).decode().splitlines()]
+        self.assertEqual([(line['type'], line['value']) for line in lines if line['kind'] == 'metric'],
+                         [('weight', 82), ('hr', 58), ('weight', 81), ('weight', 80), ('weight', 79)])
+
+    def test_writes_into_an_archived_month_are_rejected(self):
+        resent = {'type': 'weight', 'value': 82, 'recorded_at': '2025-01-05T00:00:00Z'}
+        resp = self.client.post(reverse('metric-bulk'), [resent, {**resent, 'type': 'steps'},
+                                                         {**resent, 'recorded_at': '2025-02-05T00:00:00Z'}], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['accepted'], 2)
+        self.assertEqual(resp.data['errors'], [{'index': 0, 'errors': {'recorded_at': ['This month is archived.']}}])
+
+        resp = self.client.post(reverse('metric-list'), {**resent, 'user': self.member.id}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('recorded_at', resp.data)
+        march = Metric.objects.get(user=self.member, value=80)
+        resp = self.client.patch(reverse('metric-detail', args=[march.id]), {'recorded_at': '2025-01-31T23:00:00Z'}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        block = MetricArchiveBlock.objects.get(user=self.member, type='weight')
+        self.assertEqual(block.samples, 2)
+
+
+class AdherenceViewTests(APITestCase):
+    def setUp(self):
+        self.member = User.objects.create_user(email='adh@x.com', password='pw', role='client')
+        self.trainer = User.objects.create_user(email='adht@x.com', password='pw', role='trainer')
+        Subscription.objects.create(client=self.member, trainer=self.trainer,
+                                    start_date='2025-01-01', end_date='2099-12-31', status='active')
+        self.today = localdate()
+        self.plans = [
+            Plan.objects.create(user=self.member, trainer=self.trainer, date=self.today - timedelta(days=ago),
+                                nutrition_plan='n', exercise_plan='e')
+            for ago in range(3)
+        ]
+        self.url = reverse('user-adherence', args=[self.member.id])
+
+    def test_bulk_logs_update_the_trainers_view(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.member)}')
+        items = [{'plan': plan.id, 'date': str(plan.date), 'actual_nutrition': 'n', 'actual_exercise': 'e',
+                  'completion_percentage': completion} for plan, completion in zip(self.plans, [100, 90, 60])]
+        self.client.post(reverse('dailylog-bulk'), items, format='json')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(self.trainer)}')
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['user'], self.member.id)
+        self.assertEqual((resp.data['mean_7'], resp.data['current_streak'], resp.data['longest_streak']),
+                         (83.33, 2, 2))
+
+    def test_only_viewers_of_the_users_data_may_read_it(self):
+        stranger = User.objects.create_user(email='adhs@x.com', password='pw', role='client')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {get_token_for_user(stranger)}')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
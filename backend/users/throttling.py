@@ -0,0 +1,152 @@
+"""
+Token-bucket throttling of the credential endpoints (login, registration).
+
+Both endpoints hash a password on every call, so a burst of attempts can
+tie up every worker. Each endpoint sets ``throttle_scope``, and its rates
+come from ``THROTTLING['RATES'][scope]``: one bucket per client IP and one
+per submitted email. A bucket holds up to N tokens and refills at N per
+period. Every request takes a token, and a request that finds its bucket
+empty is answered 429 with ``Retry-After`` before any hashing happens.
+
+Buckets live in the store named by ``THROTTLING['STORE']``:
+
+* ``LocalMemoryStore`` is per process, for tests and single-worker setups.
+* ``CacheStore`` keeps buckets in the ``THROTTLING['CACHE_ALIAS']`` cache
+  so that all workers share them, as long as that cache is itself shared
+  (the database cache of ``settings.CACHES``, not a LocMemCache). The
+  read-modify-write isn't atomic, so workers racing on one bucket can let
+  a few extra requests through.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'sec': 1, 'min': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_rate(rate):
+    """``'10/min'`` -> ``(10, 60)``: bucket capacity and the seconds it takes to refill."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period]
+
+
+def _take(bucket, capacity, period, now):
+    """Take a token from ``bucket`` (``(tokens, updated)`` or None). Returns ``(bucket, wait)``."""
+    tokens, updated = bucket or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    if tokens >= 1:
+        return (tokens - 1, now), 0.0
+    return (tokens, now), (1 - tokens) * period / capacity
+
+
+class LocalMemoryStore:
+    """Buckets in a dict of this process."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock    = threading.Lock()
+
+    def take(self, key, capacity, period):
+        with self._lock:
+            self._buckets[key], wait = _take(self._buckets.get(key), capacity, period, time.monotonic())
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheStore:
+    """Buckets in a Django cache shared between workers."""
+
+    def __init__(self, cache_alias=None):
+        self.cache = caches[cache_alias or settings.THROTTLING['CACHE_ALIAS']]
+
+    def take(self, key, capacity, period):
+        bucket, wait = _take(self.cache.get(key), capacity, period, time.time())
+        # An untouched bucket is full again after one period; let it expire then.
+        self.cache.set(key, bucket, period)
+        return wait
+
+    def clear(self):
+        self.cache.clear()
+
+
+_store = None
+
+
+def get_store():
+    global _store
+    if _store is None:
+        _store = import_string(settings.THROTTLING['STORE'])()
+    return _store
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    global _store
+    if setting == 'THROTTLING':
+        _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Base for the throttles of a view's ``throttle_scope``: subclasses name
+    their rate in ``THROTTLING['RATES'][scope]`` with ``kind`` and derive
+    the bucket from the request in ``get_ident_key``. A scope without that
+    rate, or a request without an identity, isn't throttled.
+    """
+    kind = None
+
+    def get_ident_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        scope = getattr(view, 'throttle_scope', None)
+        rate = settings.THROTTLING['RATES'].get(scope, {}).get(self.kind)
+        ident = self.get_ident_key(request, view) if rate else None
+        if ident is None:
+            return True
+        capacity, period = parse_rate(rate)
+        digest = hashlib.sha256(ident.encode()).hexdigest()[:32]
+        self.wait_seconds = get_store().take(f'throttle:{scope}:{self.kind}:{digest}', capacity, period)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPThrottle(TokenBucketThrottle):
+    """
+    One bucket per client address. ``X-Forwarded-For`` is only read when
+    DRF's ``NUM_PROXIES`` says how many of its entries come from trusted
+    proxies; otherwise a client could pick a fresh bucket per request.
+    """
+    kind = 'ip'
+
+    def get_ident_key(self, request, view):
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get('REMOTE_ADDR')
+        return self.get_ident(request)
+
+
+class EmailThrottle(TokenBucketThrottle):
+    """One bucket per submitted email, however many addresses it comes from."""
+    kind = 'email'
+
+    def get_ident_key(self, request, view):
+        email = request.data.get(get_user_model().USERNAME_FIELD) if hasattr(request.data, 'get') else None
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+CREDENTIAL_THROTTLES = [IPThrottle, EmailThrottle]
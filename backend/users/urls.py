@@ -2,8 +2,9 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
 
+from . import async_views
 from .views import (
     UserViewSet,
     SubscriptionViewSet,
@@ -11,6 +12,12 @@ from .views import (
     PlanViewSet,
     DailyLogViewSet,
     MetricViewSet,
+    TrainerViewSet,
+    TrainerReviewViewSet,
+    TodayView,
+    JobView,
+    LoginView,
+    MetricsView,
 )
 
 router = DefaultRouter()
@@ -20,6 +27,8 @@ router.register('goals',           GoalViewSet,           basename='goal')
 router.register('plans',           PlanViewSet,           basename='plan')
 router.register('daily-logs',      DailyLogViewSet,       basename='dailylog')
 router.register('metrics',         MetricViewSet,         basename='metric')
+router.register('trainers',        TrainerViewSet,        basename='trainer')
+router.register('reviews',         TrainerReviewViewSet,  basename='trainerreview')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -29,7 +38,21 @@ urlpatterns = [
         name='user-register'
     ),
     
+    # Client home screen, served from the ClientDailySnapshot read model:
+    path('me/today/', TodayView.as_view(), name='me-today'),
+
+    # Background jobs queued by endpoints that answer 202:
+    path('jobs/<int:pk>/', JobView.as_view(), name='job-detail'),
+
+    # Async read path for the dashboard (served best under an ASGI worker):
+    path('dashboard/metrics/series/', async_views.metric_series, name='dashboard-metric-series'),
+    path('dashboard/plans/today/',    async_views.todays_plan,   name='dashboard-todays-plan'),
+    path('dashboard/goals/',          async_views.goal_list,     name='dashboard-goals'),
+
     # JWT auth endpoints:
-    path('auth/login/',           TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('auth/login/',           LoginView.as_view(),            name='token_obtain_pair'),
     path('auth/token/refresh/',   TokenRefreshView.as_view(),     name='token_refresh'),
+
+    # Request instrumentation (API_METRICS_ENABLED), Prometheus text format:
+    path('_metrics', MetricsView.as_view(), name='api-metrics'),
 ]
@@ -1,21 +1,72 @@
+from django.conf import settings
+from django.db.models import F, OuterRef, Prefetch, Subquery, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
 
 # Create your views here.
 from rest_framework import viewsets, permissions, status
-from rest_framework.exceptions import PermissionDenied
-from .permissions import IsTrainer, IsClient, IsAdmin
-from .models import User, TrainerProfile, Subscription, Goal, Plan, DailyLog, Metric
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from . import rollups
+from .permissions import IsTrainer, IsClient, IsAdmin, can_view_user_data, visible_user_data
+from .models import (User, TrainerProfile, TrainerReview, Subscription, Goal, Plan, DailyLog, Metric, MetricRollup,
+                     LatestMetric, MetricArchiveBlock)
 from .serializers import (UserSerializer, UserRegistrationSerializer, SubscriptionSerializer, 
-                          GoalSerializer,  OnboardingSerializer, PlanSerializer, DailyLogSerializer, MetricSerializer
+                          GoalSerializer,  OnboardingSerializer, PlanSerializer, PlanBatchSerializer,
+                          DailyLogSerializer, MetricSerializer,
+                          MetricSeriesQuerySerializer, MetricRollupSerializer,
+                          MetricBulkItemSerializer, DailyLogBulkItemSerializer, RosterEntrySerializer,
+                          TrainerSearchQuerySerializer, TrainerSearchResultSerializer, TrainerReviewSerializer,
+                          ClientDailySnapshotSerializer, MetricFilterSerializer, DailyLogFilterSerializer,
+                          PlanFilterSerializer, LatestMetricSerializer, LatestMetricQuerySerializer,
+                          RollupRebuildSerializer, JobSerializer, AdherenceSerializer,
 )
+from . import adherence, daily_snapshots, exports, jobs, metric_archive, ratings
+from .search import search_trainers
+from .conditional import ConditionalGetMixin
+from .filters import QueryParamFilterBackend, StrictOrderingFilter
+from .instrumentation import InstrumentedViewMixin, registry
+from .replicas import ReplicaReadMixin
+from .throttling import CREDENTIAL_THROTTLES
+from .parsers import NDJSONParser
+from .renderers import CSVRenderer, NDJSONRenderer
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.views import TokenObtainPairView
 
-class UserViewSet(viewsets.ModelViewSet):
+
+class BulkIngestMixin:
+    """
+    Adds ``POST .../bulk/`` accepting a JSON array or NDJSON stream of items
+    for the requesting user, upserted through ``bulk_serializer_class``.
+    """
+    bulk_serializer_class = None
+
+    @action(detail=False, methods=['post'], url_path='bulk', parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        serializer = self.bulk_serializer_class(
+            data=request.data,
+            many=True,
+            max_length=settings.BULK_INGEST_MAX_ITEMS,
+            context=self.get_serializer_context(),
+        )
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data:
+            return Response({'accepted': 0, 'errors': serializer.item_errors}, status=status.HTTP_400_BAD_REQUEST)
+        saved = serializer.save()
+        return Response({'accepted': len(saved), 'errors': serializer.item_errors}, status=status.HTTP_200_OK)
+
+class UserViewSet(InstrumentedViewMixin, ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset         = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    ordering         = ('-created_at', '-id')
+    throttle_scope   = 'register'
 
     def get_serializer_class(self):
         if self.action == 'register':
@@ -29,6 +80,12 @@ class UserViewSet(viewsets.ModelViewSet):
             return [permissions.AllowAny()] if self.action == 'register' else [permissions.IsAuthenticated()]
         return super().get_permissions()
 
+    def get_throttles(self):
+        # Registration hashes a password; keep bursts off the workers.
+        if self.action == 'register':
+            return [throttle() for throttle in CREDENTIAL_THROTTLES]
+        return super().get_throttles()
+
     @action(detail=False, methods=['post'], url_path='register')
     def register(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -56,16 +113,47 @@ class UserViewSet(viewsets.ModelViewSet):
         if not new_url:
             return Response({"error": "No profilePictureUrl provided"}, status=400)
         user.profilePictureUrl = new_url
-        user.save()
+        # request.user is a partial snapshot; only write what changed.
+        user.save(update_fields=['profilePictureUrl', 'updated_at'])
         return Response({"success": True, "profilePictureUrl": new_url})
-class SubscriptionViewSet(viewsets.ModelViewSet):    
+
+    @action(detail=True, methods=['get'], url_path='export', renderer_classes=[NDJSONRenderer, CSVRenderer])
+    def export(self, request, pk=None):
+        """
+        GET /api/users/{id}/export/?format=ndjson|csv
+        Streams every metric, daily log, plan and goal of the user.
+        """
+        user = self.get_object()
+        if not can_view_user_data(request.user, user.pk):
+            raise PermissionDenied("You cannot export this user's data.")
+
+        renderer = request.accepted_renderer
+        rows = exports.stream_csv(user.pk) if renderer.format == 'csv' else exports.stream_ndjson(user.pk)
+        response = StreamingHttpResponse(rows, content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="vibrafit-user-{user.pk}.{renderer.format}"'
+        return response
+
+    @action(detail=True, methods=['get'], url_path='adherence')
+    def adherence(self, request, pk=None):
+        """
+        GET /api/users/{id}/adherence/
+        Mean plan completion over the last 7/30/90 days and the current and
+        longest streaks, read from the user's AdherenceStats.
+        """
+        user = self.get_object()
+        if not can_view_user_data(request.user, user.pk):
+            raise PermissionDenied("You cannot view this user's adherence.")
+        stats = adherence.get_or_build(user.pk)
+        return Response({'user': user.pk, **AdherenceSerializer(stats).data})
+class SubscriptionViewSet(InstrumentedViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):    
     queryset = Subscription.objects.all()
     serializer_class = SubscriptionSerializer
+    ordering = ('-start_date', '-id')
     
     def get_queryset(self):
         user = self.request.user
 
-        if user.role == 'user':
+        if user.role == 'client':
             return Subscription.objects.filter(client=user)
 
         if user.role == 'trainer':
@@ -83,16 +171,17 @@ class SubscriptionViewSet(viewsets.ModelViewSet):
             return [IsAuthenticated()]
         return [IsAdminUser()]
     
-class GoalViewSet(viewsets.ModelViewSet):
+class GoalViewSet(InstrumentedViewMixin, ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Goal.objects.all()
     serializer_class = GoalSerializer
+    ordering = ('-created_at', '-id')
 
     def get_queryset(self):
         user = self.request.user
         if user.role == 'client':
             return Goal.objects.filter(user=user)
         if user.role == 'trainer':            
-            client_ids = user.client_subscriptions.values_list('client', flat=True)
+            client_ids = user.trainer_subscriptions.filter(status='active').values_list('client', flat=True)
             return Goal.objects.filter(user__in=client_ids)
         return Goal.objects.none()
 
@@ -101,9 +190,13 @@ class GoalViewSet(viewsets.ModelViewSet):
             return [IsClient()]
         return [IsAuthenticated()]
 
-class PlanViewSet(viewsets.ModelViewSet):
+class PlanViewSet(InstrumentedViewMixin, ReplicaReadMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Plan.objects.all()
     serializer_class = PlanSerializer
+    filter_backends = [QueryParamFilterBackend, StrictOrderingFilter]
+    filter_serializer_class = PlanFilterSerializer
+    ordering_fields = ['date', 'created_at']
+    ordering = ('-date', '-id')
     
     def get_queryset(self):
         user = self.request.user
@@ -113,11 +206,6 @@ class PlanViewSet(viewsets.ModelViewSet):
             return Plan.objects.filter(trainer=user)
         return Plan.objects.none()
 
-    def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
-            return [IsTrainer()]
-        return [IsAuthenticated()]
-
     def perform_create(self, serializer):
         client = serializer.validated_data['user']
         trainer = self.request.user
@@ -125,17 +213,25 @@ class PlanViewSet(viewsets.ModelViewSet):
             raise PermissionDenied("Trainer is not subscribed to this client")
         serializer.save(trainer=trainer)
 
-        if not Subscription.objects.filter(
-            trainer=trainer,
-            client=client,
-            status='active'
-        ).exists():
-            raise PermissionDenied("You can only create plans for your active clients.")
-
-        serializer.save(trainer=trainer)
+    @action(detail=False, methods=['post'], url_path='batch')
+    def batch(self, request):
+        """
+        POST /api/plans/batch/
+        Creates many plans at once from ``entries`` or a ``template`` over a
+        date range; entries for non-clients are reported, not created.
+        """
+        serializer = PlanBatchSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        if not serializer.validated_data['entries']:
+            return Response({'created': [], 'rejected': serializer.rejected}, status=status.HTTP_400_BAD_REQUEST)
+        plans = serializer.save()
+        return Response(
+            {'created': PlanSerializer(plans, many=True).data, 'rejected': serializer.rejected},
+            status=status.HTTP_201_CREATED,
+        )
 
     def get_permissions(self):
-        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+        if self.action in ['create', 'update', 'partial_update', 'destroy', 'batch']:
             return [IsTrainer()]
 
         if self.action in ['list', 'retrieve']:
@@ -144,10 +240,258 @@ class PlanViewSet(viewsets.ModelViewSet):
         
         return [IsAdminUser()]
 
-class DailyLogViewSet(viewsets.ModelViewSet):
+class DailyLogViewSet(InstrumentedViewMixin, ReplicaReadMixin, BulkIngestMixin, viewsets.ModelViewSet):
     queryset = DailyLog.objects.all()
     serializer_class = DailyLogSerializer
+    bulk_serializer_class = DailyLogBulkItemSerializer
+    filter_backends = [QueryParamFilterBackend, StrictOrderingFilter]
+    filter_serializer_class = DailyLogFilterSerializer
+    ordering_fields = ['date', 'completion_percentage']
+    ordering = ('-date', '-id')
 
-class MetricViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        # Anyone whose data the caller may see; only their own is writable.
+        if self.action in ['update', 'partial_update', 'destroy']:
+            return DailyLog.objects.filter(user=self.request.user)
+        return DailyLog.objects.filter(visible_user_data(self.request.user))
+
+class MetricViewSet(InstrumentedViewMixin, ReplicaReadMixin, BulkIngestMixin, viewsets.ModelViewSet):
     queryset = Metric.objects.all()
-    serializer_class = MetricSerializer
\ No newline at end of file
+    serializer_class = MetricSerializer
+    bulk_serializer_class = MetricBulkItemSerializer
+    filter_backends = [QueryParamFilterBackend, StrictOrderingFilter]
+    filter_serializer_class = MetricFilterSerializer
+    ordering_fields = ['recorded_at', 'value']
+    ordering = ('-recorded_at', '-id')
+
+    def get_queryset(self):
+        if self.action in ['update', 'partial_update', 'destroy']:
+            return Metric.objects.filter(user=self.request.user)
+        return Metric.objects.filter(visible_user_data(self.request.user))
+
+    def paginate_queryset(self, queryset):
+        # The list also pages through archived samples (users.metric_archive).
+        if self.action == 'list':
+            params = self.filter_serializer_class(data=self.request.query_params)
+            params.is_valid(raise_exception=True)
+            filters = params.validated_data
+            blocks = MetricArchiveBlock.objects.filter(visible_user_data(self.request.user))
+            if 'type' in filters:
+                blocks = blocks.filter(type=filters['type'])
+            if 'user' in filters:
+                blocks = blocks.filter(user_id=filters['user'])
+            queryset = metric_archive.MergedMetrics(queryset, blocks, filters.get('from'), filters.get('to'))
+        return super().paginate_queryset(queryset)
+
+    @action(detail=False, methods=['get'], url_path='latest')
+    def latest(self, request):
+        """
+        GET /api/metrics/latest/?user=&type=
+        The newest value of each metric type, read from LatestMetric.
+        """
+        query = LatestMetricQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        user_id = params.get('user', request.user.pk)
+        if not can_view_user_data(request.user, user_id):
+            raise PermissionDenied("You cannot view this user's metrics.")
+
+        latest = LatestMetric.objects.filter(user_id=user_id).order_by('type')
+        if 'type' in params:
+            latest = latest.filter(type__in=params['type'])
+        return Response({'user': user_id, 'results': LatestMetricSerializer(latest, many=True).data})
+
+    @action(detail=False, methods=['post'], url_path='rollups/rebuild')
+    def rebuild_rollups(self, request):
+        """
+        POST /api/metrics/rollups/rebuild/ {"user": id, "types": [...]}
+        Queues a rebuild of the user's rollups (default: the caller's) and
+        answers 202 with the job; poll GET /api/jobs/{id}/ for the outcome.
+        """
+        serializer = RollupRebuildSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        user_id = params.get('user', request.user.pk)
+        if not can_view_user_data(request.user, user_id):
+            raise PermissionDenied("You cannot rebuild this user's metrics.")
+
+        job = jobs.enqueue('rollups.rebuild', {'user_id': user_id, 'types': params.get('types')},
+                           created_by=request.user)
+        return Response(
+            JobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': reverse('job-detail', args=[job.pk])},
+        )
+
+    @action(detail=False, methods=['get'], url_path='series')
+    def series(self, request):
+        """
+        GET /api/metrics/series/?type=weight&bucket=day|week|month&from=&to=&user=
+        Returns min/max/avg/count per bucket, read from the precomputed rollups.
+        """
+        query = MetricSeriesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        user_id = params.get('user', request.user.pk)
+        if not can_view_user_data(request.user, user_id):
+            raise PermissionDenied("You cannot view this user's metrics.")
+
+        buckets = MetricRollup.objects.filter(user_id=user_id, type=params['type'], bucket=params['bucket'])
+        if 'from' in params:
+            buckets = buckets.filter(bucket_start__gte=rollups.bucket_start(params['from'], params['bucket']))
+        if 'to' in params:
+            buckets = buckets.filter(bucket_start__lte=params['to'])
+
+        return Response({
+            'type':    params['type'],
+            'bucket':  params['bucket'],
+            'results': MetricRollupSerializer(buckets.order_by('bucket_start'), many=True).data,
+        })
+
+
+class TrainerViewSet(InstrumentedViewMixin, ReplicaReadMixin, viewsets.GenericViewSet):
+    queryset = TrainerProfile.objects.all()
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """
+        GET /api/trainers/search/?q=&specialty=&country=&min_rating=
+        Trainers ranked by text relevance, then rating; cursor-paginated.
+        """
+        query = TrainerSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        trainers = search_trainers(**params)
+        # Without a text query every relevance is 0, so page on rating alone.
+        self.ordering = ('-relevance', '-rating', '-id') if params['q'] else ('-rating', '-id')
+        page = self.paginate_queryset(trainers)
+        return self.get_paginated_response(TrainerSearchResultSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='me/roster', permission_classes=[IsTrainer])
+    def roster(self, request):
+        """
+        GET /api/trainers/me/roster/
+        Every active client with their latest goal, today's plan, last daily
+        log completion, latest weight and adherence. The query count is
+        fixed: one for the subscriptions (adherence joined, latest log/weight
+        as correlated subqueries), one per prefetch.
+        """
+        trainer = request.user
+        latest_log = DailyLog.objects.filter(user=OuterRef('client')).order_by('-date', '-id')
+        latest_weight = LatestMetric.objects.filter(user=OuterRef('client'), type='weight')
+        latest_goals = Goal.objects.annotate(
+            rank=Window(RowNumber(), partition_by=F('user_id'), order_by=[F('created_at').desc(), F('id').desc()]),
+        ).filter(rank=1)
+
+        subscriptions = (
+            Subscription.objects.filter(trainer=trainer, status='active')
+            .select_related('client', 'client__adherence')
+            .annotate(
+                last_completion=Subquery(latest_log.values('completion_percentage')[:1]),
+                last_log_date=Subquery(latest_log.values('date')[:1]),
+                latest_weight=Subquery(latest_weight.values('value')[:1]),
+                latest_weight_at=Subquery(latest_weight.values('recorded_at')[:1]),
+            )
+            .prefetch_related(
+                Prefetch('client__goal_set', queryset=latest_goals, to_attr='latest_goals'),
+                Prefetch(
+                    'client__user_plans',
+                    queryset=Plan.objects.filter(trainer=trainer, date=timezone.localdate()).order_by('-id'),
+                    to_attr='todays_plans',
+                ),
+            )
+            .order_by('client__name', 'client_id', '-start_date')
+        )
+
+        # A client may hold more than one active subscription; list them once.
+        entries, seen = [], set()
+        for subscription in subscriptions:
+            if subscription.client_id not in seen:
+                seen.add(subscription.client_id)
+                entries.append(subscription)
+        return Response(RosterEntrySerializer(entries, many=True).data)
+
+
+class TrainerReviewViewSet(InstrumentedViewMixin, ReplicaReadMixin, viewsets.ModelViewSet):
+    queryset = TrainerReview.objects.all()
+    serializer_class = TrainerReviewSerializer
+    ordering = ('-created_at', '-id')
+
+    def get_queryset(self):
+        reviews = TrainerReview.objects.all()
+        trainer = self.request.query_params.get('trainer')
+        if self.action == 'list' and trainer is not None:
+            if not trainer.isdigit():
+                raise ValidationError({'trainer': ["A valid integer is required."]})
+            reviews = reviews.filter(trainer_id=trainer)
+        if self.action in ['update', 'partial_update', 'destroy']:
+            reviews = reviews.filter(client=self.request.user)
+        return reviews
+
+    def get_permissions(self):
+        if self.action in ['create', 'update', 'partial_update', 'destroy']:
+            return [IsClient()]
+        return [IsAuthenticated()]
+
+    def perform_create(self, serializer):
+        ratings.create_review(serializer)
+
+    def perform_update(self, serializer):
+        ratings.update_review(serializer)
+
+    def perform_destroy(self, instance):
+        ratings.delete_review(instance)
+
+
+class TodayView(InstrumentedViewMixin, APIView):
+    """
+    GET /api/me/today/
+    The caller's home screen for today (plans, daily logs, open goals and
+    latest metrics) from their ClientDailySnapshot.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        snapshot = daily_snapshots.get_or_build(request.user.pk)
+        return Response(ClientDailySnapshotSerializer(snapshot).data)
+
+
+class JobView(InstrumentedViewMixin, ReplicaReadMixin, APIView):
+    """
+    GET /api/jobs/{id}/
+    Status and result of a background job queued by the caller.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        job = jobs.get_broker().get(pk)
+        if job is None or not (job.created_by_id == request.user.pk or request.user.is_staff):
+            raise NotFound("No such job.")
+        return Response(JobSerializer(job).data)
+
+
+class LoginView(TokenObtainPairView):
+    """
+    POST /api/auth/login/
+    simplejwt's token pair view, throttled per IP and per email before the
+    password is checked.
+    """
+    throttle_classes = CREDENTIAL_THROTTLES
+    throttle_scope   = 'login'
+
+
+class MetricsView(APIView):
+    """
+    GET /api/_metrics
+    Per-route latency, query count, SQL and serializer time in the Prometheus
+    text format. Empty unless API_METRICS_ENABLED is set.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(registry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -58,6 +58,14 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
 ]
 
+# Per-request timing, query counts and the staff-only /api/_metrics endpoint
+# (users.instrumentation). Off by default; the window is the number of recent
+# requests per route the reported quantiles cover.
+API_METRICS_ENABLED = os.environ.get('API_METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+API_METRICS_WINDOW  = int(os.environ.get('API_METRICS_WINDOW', 1000))
+if API_METRICS_ENABLED:
+    MIDDLEWARE.insert(0, 'users.instrumentation.RequestMetricsMiddleware')
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
@@ -85,8 +93,79 @@ WSGI_APPLICATION = 'vibrafit_app.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 
+# Connections are kept open between requests (DB_CONN_MAX_AGE seconds) and
+# health-checked before reuse. DB_CONN_POOL=1 switches PostgreSQL to
+# psycopg's connection pool instead; Django requires CONN_MAX_AGE=0 then.
+DB_CONN_POOL = os.environ.get('DB_CONN_POOL', '').lower() in ('1', 'true', 'yes')
+
 DATABASES = {
-    'default': dj_database_url.config(default=os.environ.get('DATABASE_URL'))
+    'default': dj_database_url.config(
+        default=os.environ.get('DATABASE_URL'),
+        conn_max_age=0 if DB_CONN_POOL else int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        conn_health_checks=True,
+    )
+}
+
+if DB_CONN_POOL and DATABASES['default'].get('ENGINE') == 'django.db.backends.postgresql':
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+        'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        'timeout':  int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    }
+
+# Cache shared by all workers and processes: throttle buckets, replica read
+# pins and (with JWT_USER_CACHE['CACHE_ALIAS']) user snapshots live in it.
+# The default keeps entries in the CACHE_LOCATION table of the database,
+# created by `manage.py createcachetable` at deploy. CACHE_BACKEND can name
+# another shared backend, e.g. django.core.cache.backends.redis.RedisCache
+# with a redis:// CACHE_LOCATION. A per-process backend such as LocMemCache
+# gives every worker its own buckets and pins.
+CACHES = {
+    'default': {
+        'BACKEND':  os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'django_cache'),
+    }
+}
+
+# Read replicas: DATABASE_REPLICA_URLS is a comma-separated list of URLs,
+# added as replica_1, replica_2, ... and used by users.replicas.ReplicaRouter
+# for safe-method API reads. After a write the user reads from the primary
+# for PIN_SECONDS; pins are kept in the CACHE_ALIAS cache, which must be
+# shared between workers.
+DATABASE_REPLICAS = []
+for n, url in enumerate(filter(None, map(str.strip, os.environ.get('DATABASE_REPLICA_URLS', '').split(','))), 1):
+    DATABASES[f'replica_{n}'] = {
+        **dj_database_url.parse(url, conn_max_age=DATABASES['default']['CONN_MAX_AGE'], conn_health_checks=True),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{n}')
+
+DATABASE_ROUTERS = ['users.replicas.ReplicaRouter']
+
+READ_REPLICAS = {
+    'PIN_SECONDS': int(os.environ.get('DB_REPLICA_PIN_SECONDS', 10)),
+    'CACHE_ALIAS': os.environ.get('DB_REPLICA_PIN_CACHE_ALIAS', 'default'),
+}
+
+
+# Throttling of the credential endpoints (users.throttling): token buckets
+# per client IP and per submitted email, as 'N/period' (s, min, hour, day).
+# STORE is the dotted path of the bucket store; CacheStore keeps buckets in
+# the CACHE_ALIAS cache (shared between workers with the CACHES above),
+# LocalMemoryStore keeps them per process.
+THROTTLING = {
+    'STORE':       os.environ.get('THROTTLE_STORE', 'users.throttling.CacheStore'),
+    'CACHE_ALIAS': os.environ.get('THROTTLE_CACHE_ALIAS', 'default'),
+    'RATES': {
+        'login': {
+            'ip':    os.environ.get('THROTTLE_LOGIN_IP_RATE', '30/min'),
+            'email': os.environ.get('THROTTLE_LOGIN_EMAIL_RATE', '10/min'),
+        },
+        'register': {
+            'ip':    os.environ.get('THROTTLE_REGISTER_IP_RATE', '20/hour'),
+            'email': os.environ.get('THROTTLE_REGISTER_EMAIL_RATE', '5/hour'),
+        },
+    },
 }
 
 
@@ -110,11 +189,76 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'users.pagination.TimeCursorPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 50)),
+    # Proxies in front of the app that append to X-Forwarded-For (1 behind
+    # Render's). The client address is taken that many entries from the end;
+    # with 0 the header is ignored and REMOTE_ADDR is used.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
+}
+
+# Upper bound for the ?page_size= query parameter on list endpoints.
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 500))
+
+# Snapshot of the authenticated user (id, role, is_active, is_staff) kept by
+# users.authentication.CachedJWTAuthentication. CACHE_ALIAS names an entry in
+# CACHES shared between workers; leave unset for the in-process LRU only.
+JWT_USER_CACHE = {
+    'MAXSIZE':     int(os.environ.get('JWT_USER_CACHE_MAXSIZE', 1024)),
+    'TTL':         int(os.environ.get('JWT_USER_CACHE_TTL', 60)),
+    'CACHE_ALIAS': os.environ.get('JWT_USER_CACHE_ALIAS') or None,
+}
+
+# Rows fetched per round trip by the streaming export (GET /api/users/{id}/export/).
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+# Bulk ingestion (POST /api/metrics/bulk/, /api/daily-logs/bulk/): items
+# accepted per request and rows written per INSERT.
+BULK_INGEST_MAX_ITEMS  = int(os.environ.get('BULK_INGEST_MAX_ITEMS', 10000))
+BULK_INGEST_CHUNK_SIZE = int(os.environ.get('BULK_INGEST_CHUNK_SIZE', 1000))
+
+# Monthly partitions of Metric and DailyLog on PostgreSQL (users.partitions),
+# kept by `manage.py manage_partitions`: MONTHS_AHEAD months are created in
+# advance, and partitions older than RETENTION_MONTHS (per model; 0 keeps
+# everything) are detached.
+PARTITIONS = {
+    'MONTHS_AHEAD': int(os.environ.get('PARTITION_MONTHS_AHEAD', 3)),
+    'RETENTION_MONTHS': {
+        'metric':   int(os.environ.get('METRIC_RETENTION_MONTHS', 0)),
+        'dailylog': int(os.environ.get('DAILYLOG_RETENTION_MONTHS', 0)),
+    },
+}
+
+# Archive of old raw metrics (users.metric_archive), run by
+# `manage.py archive_metrics`: whole months older than AFTER_DAYS are
+# downsampled to one point per RESOLUTION seconds and packed into blocks.
+METRIC_ARCHIVE = {
+    'AFTER_DAYS': int(os.environ.get('METRIC_ARCHIVE_AFTER_DAYS', 90)),
+    'RESOLUTION': int(os.environ.get('METRIC_ARCHIVE_RESOLUTION', 3600)),
+}
+
+# Adherence stats (users.adherence): a day with at least STREAK_MIN_COMPLETION
+# percent of its plans completed keeps a client's streak going.
+ADHERENCE = {
+    'STREAK_MIN_COMPLETION': float(os.environ.get('ADHERENCE_STREAK_MIN_COMPLETION', 80)),
+}
+
+# Background jobs (users.jobs), run by `manage.py run_worker`. BROKER is the
+# dotted path of the queue backend; failed jobs are retried up to
+# MAX_ATTEMPTS times, BACKOFF * 2**(attempt - 1) seconds apart. A running job
+# whose worker hasn't finished it within LEASE seconds is handed out again,
+# or failed once it has used up its attempts.
+JOBS = {
+    'BROKER':        os.environ.get('JOBS_BROKER', 'users.jobs.DatabaseBroker'),
+    'POLL_INTERVAL': float(os.environ.get('JOBS_POLL_INTERVAL', 1.0)),
+    'MAX_ATTEMPTS':  int(os.environ.get('JOBS_MAX_ATTEMPTS', 3)),
+    'BACKOFF':       int(os.environ.get('JOBS_BACKOFF', 30)),
+    'LEASE':         int(os.environ.get('JOBS_LEASE', 600)),
 }
 
 